@@ -0,0 +1,321 @@
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import urllib.request
+import urllib.error
+from abc import ABC, abstractmethod
+from projectfiles import CodeFile, ProjectFiles
+from gisting_prompts import read_code_file, build_gisting_prompt, extract_file_summary, system_prompt, default_excerpt_tokens
+
+
+def _http(method: str, url: str, headers: dict = None, body=None, data: bytes = None) -> bytes:
+    if body is not None:
+        data = json.dumps(body).encode("utf-8")
+        headers = {**(headers or {}), "content-type": "application/json"}
+    request = urllib.request.Request(url, data=data, headers=headers or {}, method=method)
+    try:
+        with urllib.request.urlopen(request, timeout=300) as response:
+            return response.read()
+    except urllib.error.HTTPError as e:
+        raise Exception(f"{method} {url} failed with {e.code}: {e.read().decode('utf-8', errors='ignore')}") from e
+
+
+def _jsonl(data: bytes) -> list[dict]:
+    return [json.loads(line) for line in data.decode("utf-8").splitlines() if line.strip()]
+
+
+class BatchClient(ABC):
+    """
+    submit many prompts as one provider batch job, at batch pricing and without holding the rate limit of the synchronous API
+    """
+    provider = None
+    max_requests_per_batch = 10000
+
+    def __init__(self, api_key: str, model: str, system_prompt: str, base_url: str, max_tokens: int = 2048, temperature: float = 0.0):
+        self.api_key = api_key
+        self.model = model
+        self.system_prompt = system_prompt
+        self.base_url = base_url.rstrip("/")
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+
+    @abstractmethod
+    def submit(self, requests: list[tuple[str, str]]) -> str:
+        """
+        submit (custom id, user prompt) pairs, return the batch id
+        """
+        pass
+
+    @abstractmethod
+    def status(self, batch_id: str) -> tuple[bool, str]:
+        """
+        (whether the batch has ended, the provider status)
+        """
+        pass
+
+    @abstractmethod
+    def results(self, batch_id: str) -> dict[str, str]:
+        """
+        the response text by custom id, None for the failed requests
+        """
+        pass
+
+
+class AnthropicBatchClient(BatchClient):
+    """
+    the message batches API, https://docs.anthropic.com/en/api/creating-message-batches
+    """
+    provider = "anthropic"
+    default_base_url = "https://api.anthropic.com"
+
+    def _headers(self) -> dict:
+        return {"x-api-key": self.api_key, "anthropic-version": "2023-06-01"}
+
+    def submit(self, requests: list[tuple[str, str]]) -> str:
+        batch = {"requests": [{
+            "custom_id": custom_id,
+            "params": {
+                "model": self.model,
+                "max_tokens": self.max_tokens,
+                "temperature": self.temperature,
+                "system": self.system_prompt,
+                "messages": [{"role": "user", "content": prompt}],
+            }} for custom_id, prompt in requests]}
+        response = json.loads(_http("POST", f"{self.base_url}/v1/messages/batches", self._headers(), body=batch))
+        return response["id"]
+
+    def _batch(self, batch_id: str) -> dict:
+        return json.loads(_http("GET", f"{self.base_url}/v1/messages/batches/{batch_id}", self._headers()))
+
+    def status(self, batch_id: str) -> tuple[bool, str]:
+        status = self._batch(batch_id)["processing_status"]
+        return status == "ended", status
+
+    def results(self, batch_id: str) -> dict[str, str]:
+        results_url = self._batch(batch_id)["results_url"]
+        results = {}
+        for line in _jsonl(_http("GET", results_url, self._headers())):
+            result = line["result"]
+            if result["type"] == "succeeded":
+                results[line["custom_id"]] = "".join(block.get("text", "") for block in result["message"]["content"])
+            else:
+                results[line["custom_id"]] = None
+        return results
+
+
+class OpenAIBatchClient(BatchClient):
+    """
+    the batch API with an uploaded jsonl file of chat completions, https://platform.openai.com/docs/guides/batch
+    """
+    provider = "openai"
+    default_base_url = "https://api.openai.com"
+
+    def _headers(self) -> dict:
+        return {"authorization": f"Bearer {self.api_key}"}
+
+    def _upload(self, content: bytes) -> str:
+        boundary = uuid.uuid4().hex
+        data = (f"--{boundary}\r\ncontent-disposition: form-data; name=\"purpose\"\r\n\r\nbatch\r\n"
+                f"--{boundary}\r\ncontent-disposition: form-data; name=\"file\"; filename=\"batch.jsonl\"\r\n"
+                f"content-type: application/jsonl\r\n\r\n").encode("utf-8") + content + f"\r\n--{boundary}--\r\n".encode("utf-8")
+        headers = {**self._headers(), "content-type": f"multipart/form-data; boundary={boundary}"}
+        return json.loads(_http("POST", f"{self.base_url}/v1/files", headers, data=data))["id"]
+
+    def submit(self, requests: list[tuple[str, str]]) -> str:
+        lines = [json.dumps({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": self.model,
+                "max_tokens": self.max_tokens,
+                "temperature": self.temperature,
+                "messages": [{"role": "system", "content": self.system_prompt}, {"role": "user", "content": prompt}],
+            }}) for custom_id, prompt in requests]
+        input_file_id = self._upload("\n".join(lines).encode("utf-8"))
+        batch = {"input_file_id": input_file_id, "endpoint": "/v1/chat/completions", "completion_window": "24h"}
+        return json.loads(_http("POST", f"{self.base_url}/v1/batches", self._headers(), body=batch))["id"]
+
+    def _batch(self, batch_id: str) -> dict:
+        return json.loads(_http("GET", f"{self.base_url}/v1/batches/{batch_id}", self._headers()))
+
+    def status(self, batch_id: str) -> tuple[bool, str]:
+        status = self._batch(batch_id)["status"]
+        return status in ("completed", "failed", "expired", "cancelled"), status
+
+    def results(self, batch_id: str) -> dict[str, str]:
+        batch = self._batch(batch_id)
+        results = {}
+        for file_id in [batch.get("output_file_id"), batch.get("error_file_id")]:
+            if not file_id:
+                continue
+            for line in _jsonl(_http("GET", f"{self.base_url}/v1/files/{file_id}/content", self._headers())):
+                response = line.get("response") or {}
+                if response.get("status_code") == 200 and not line.get("error"):
+                    results[line["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+                else:
+                    results[line["custom_id"]] = None
+        return results
+
+
+def batch_client_from_env(tier: str = "tier2", system_prompt: str = system_prompt) -> BatchClient:
+    """
+    the batch client of the LLM in use (llm.use in application.yml), the base url can be set by anthropic.base_url or openai.base_url
+    """
+    use_llm = os.environ.get("LLM_USE")
+    if use_llm == "anthropic":
+        return AnthropicBatchClient(os.environ.get("ANTHROPIC_API_KEY"), os.environ.get(f"ANTHROPIC_MODEL_{tier.upper()}_NAME"), system_prompt,
+                                    os.environ.get("ANTHROPIC_BASE_URL", AnthropicBatchClient.default_base_url))
+    elif use_llm == "openai":
+        return OpenAIBatchClient(os.environ.get("OPENAI_API_KEY"), os.environ.get(f"OPENAI_MODEL_{tier.upper()}_NAME"), system_prompt,
+                                 os.environ.get("OPENAI_BASE_URL", OpenAIBatchClient.default_base_url))
+    raise ValueError(f"batch gisting is supported with anthropic and openai, not {use_llm}")
+
+
+class BatchGisting:
+    """
+    gist code files with provider batch jobs. the submitted batches (batch id, and the path of the file of each request)
+    are kept in .gist/batches.json, so the results can be collected by a later run, e.g. the next morning.
+    """
+    default_state_file = "batches.json"
+
+    def __init__(self, client: BatchClient, root_path: str, state_path: str = None):
+        self.client = client
+        self.root_path = root_path
+        self.state_path = state_path or os.path.join(root_path, ProjectFiles.default_gist_foler, self.default_state_file)
+
+    def load_state(self) -> list[dict]:
+        if not os.path.exists(self.state_path):
+            return []
+        with open(self.state_path, "r") as f:
+            return json.load(f)
+
+    def save_state(self, batches: list[dict]):
+        folder = os.path.dirname(self.state_path)
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        if not batches:
+            if os.path.exists(self.state_path):
+                os.remove(self.state_path)
+            return
+        temp_path = self.state_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(batches, f, indent=2)
+        os.replace(temp_path, self.state_path)
+
+    def submit(self, files: list[CodeFile], content_mode: str = "full", excerpt_tokens: int = default_excerpt_tokens) -> list[str]:
+        """
+        submit the gisting prompts of the files, in batches of at most max_requests_per_batch, return the batch ids
+        """
+        requests = []
+        # the fingerprint of the content sent, the file may change before the results are collected
+        fingerprints = {}
+        for file in files:
+            content = read_code_file(self.root_path, file, fingerprints)
+            if content is not None:
+                prompt = build_gisting_prompt(self.root_path, file, content, content_mode=content_mode, excerpt_tokens=excerpt_tokens)
+                requests.append((file.path, prompt))
+        batches = self.load_state()
+        batch_ids = []
+        size = self.client.max_requests_per_batch
+        for start in range(0, len(requests), size):
+            chunk = requests[start:start + size]
+            # custom ids are limited to 64 characters of [a-zA-Z0-9_-], the paths are kept in the state instead
+            paths = {f"file-{start + i}": path for i, (path, _) in enumerate(chunk)}
+            batch_id = self.client.submit([(custom_id, prompt) for custom_id, (_, prompt) in zip(paths, chunk)])
+            print(f"Submitted batch {batch_id} with {len(chunk)} files")
+            batches.append({"provider": self.client.provider, "batch_id": batch_id, "paths": paths,
+                            "fingerprints": {custom_id: fingerprints[path] for custom_id, path in paths.items()},
+                            "submitted_at": time.time()})
+            # saved after each batch, a failure later does not lose the submitted ones
+            self.save_state(batches)
+            batch_ids.append(batch_id)
+        return batch_ids
+
+    def wait(self, poll_interval: float = 60, timeout: float = None) -> bool:
+        """
+        poll the pending batches until they all ended, return False on timeout
+        """
+        started = time.monotonic()
+        while True:
+            pending = []
+            for batch in self.load_state():
+                ended, status = self.client.status(batch["batch_id"])
+                if not ended:
+                    pending.append(f"{batch['batch_id']} ({status})")
+            if not pending:
+                return True
+            if timeout is not None and time.monotonic() - started >= timeout:
+                return False
+            print(f"Waiting for batches: {', '.join(pending)}")
+            time.sleep(poll_interval)
+
+    def collect(self, project_files: list[ProjectFiles]) -> tuple[list[CodeFile], list[str]]:
+        """
+        merge the results of the ended batches into the files of the projects (e.g. one per module), by path.
+        returns the gisted files and the paths of the failed requests, the collected batches are dropped from the state.
+        """
+        gisted, failed = [], []
+        remaining = []
+        for batch in self.load_state():
+            ended, _ = self.client.status(batch["batch_id"])
+            if not ended:
+                remaining.append(batch)
+                continue
+            results = self.client.results(batch["batch_id"])
+            for custom_id, path in batch["paths"].items():
+                response = results.get(custom_id)
+                found = next(((pf, f) for pf in project_files for f in [pf.find_codefile_by_path(path)] if f), None)
+                if not response or found is None:
+                    failed.append(path)
+                    continue
+                pf, file = found
+                file.set_summary(extract_file_summary(response))
+                fingerprint = batch.get("fingerprints", {}).get(custom_id)
+                if fingerprint:
+                    file.set_fingerprint(*fingerprint)
+                else:
+                    # submitted without the fingerprints
+                    pf.refresh_fingerprint(file)
+                gisted.append(file)
+        self.save_state(remaining)
+        return gisted, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Collect the results of the gisting batches submitted by gist_files.py --batch")
+    parser.add_argument("project_root", type=str, help="Path to the project root")
+    parser.add_argument("--wait", action="store_true", help="Wait until all the batches ended")
+    parser.add_argument("--poll-interval", type=int, default=60, help="Seconds between two status checks when waiting, default 60")
+    parser.add_argument("--skip-ignored", action="store_true",
+                        help="Skip the files ignored by the .gitignore files and the build output folders, as gist_files.py --skip-ignored")
+    args = parser.parse_args()
+
+    from config_utils import load_config_to_env
+    load_config_to_env()
+    from project_modules import ProjectModules
+    from project_scanner import ProjectScanner
+
+    root_path = os.path.abspath(args.project_root)
+    if not os.path.exists(root_path):
+        print(f"Error: {root_path} does not exist")
+        sys.exit(1)
+
+    batch_gisting = BatchGisting(batch_client_from_env(), root_path)
+    if not batch_gisting.load_state():
+        print("No pending batches.")
+        sys.exit(0)
+    if args.wait:
+        batch_gisting.wait(poll_interval=args.poll_interval)
+
+    module_project_files = ProjectModules(root_path, prefix_list=["src/main/java", "src/main/resources"]).from_project(
+        suffix_list=[".java"], resource_suffix_list=['.properties', '.yaml', '.yml', '.xml'],
+        scanner=ProjectScanner(root_path) if args.skip_ignored else None)
+    project_files = [pf for _, pf in module_project_files]
+    gisted, failed = batch_gisting.collect(project_files)
+    print(f"Collected {len(gisted)} summaries, {len(failed)} failed, {len(batch_gisting.load_state())} batches still pending.")
+    for pf in project_files:
+        print(f"Gist file is persisted to {pf.persist_code_files()}")
@@ -0,0 +1,69 @@
+"""
+Memory benchmark of CodeFile on a synthetic project tree.
+
+    python benchmarks/bench_codefile_memory.py --files 100000
+
+It builds the CodeFile objects the same way ProjectFiles.get_files_from_folder does (a new package and path string
+per file), and reports the memory per file of the current CodeFile against the previous plain __dict__ class.
+"""
+import os
+import sys
+import gc
+import argparse
+import tracemalloc
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from projectfiles import CodeFile
+
+
+class DictCodeFile:
+    # the CodeFile before slots and interning, kept here for comparison
+    def __init__(self, filename, path, package):
+        self.filename = filename
+        self.path = path
+        self.package = package
+        self.summary = ""
+        self.content_hash = ""
+        self.mtime_ns = 0
+        self.size = 0
+        self.package_gisting_func = None
+
+
+def synthetic_tree(num_files: int, files_per_package: int = 40):
+    """
+    yield (filename, relative path, package) like a maven project with nested packages
+    """
+    domains = ["controller", "service", "repository", "model", "dto", "mapper", "config", "exception", "util", "client"]
+    for i in range(num_files):
+        package_index = i // files_per_package
+        parts = ["com", "example", f"module{package_index // 200}", domains[package_index % len(domains)], f"feature{package_index}"]
+        filename = f"Feature{package_index}{domains[package_index % len(domains)].title()}{i % files_per_package}.java"
+        folder = "src/main/java/" + "/".join(parts)
+        # built per file, as in get_files_from_folder
+        package = folder[len("src/main/java/"):].replace("/", ".")
+        yield filename, folder + "/" + filename, package
+
+
+def measure(cls, num_files: int) -> tuple[int, float]:
+    gc.collect()
+    tracemalloc.start()
+    files = [cls(filename, path, package) for filename, path, package in synthetic_tree(num_files)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(files) == num_files
+    return current, current / num_files
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory per CodeFile on a synthetic project tree")
+    parser.add_argument("--files", type=int, default=100_000, help="number of files in the synthetic tree (default 100000)")
+    args = parser.parse_args()
+
+    print(f"Synthetic tree of {args.files} files")
+    print(f"{'class':<14}{'total MB':>12}{'bytes/file':>14}")
+    results = {}
+    for name, cls in [("dict", DictCodeFile), ("CodeFile", CodeFile)]:
+        total, per_file = measure(cls, args.files)
+        results[name] = per_file
+        print(f"{name:<14}{total / 1_000_000:>12.1f}{per_file:>14.0f}")
+    print(f"CodeFile uses {results['CodeFile'] / results['dict']:.0%} of the memory of the dict based class")
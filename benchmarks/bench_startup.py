@@ -0,0 +1,82 @@
+"""
+Startup time of the commands: the time to import each entry point in a new interpreter, and the heavy packages it loads.
+
+    python benchmarks/bench_startup.py --repeat 5
+    python benchmarks/bench_startup.py --module tell_me_about --importtime
+
+Importing a command should neither load the configuration nor the tracing nor any LLM SDK, the SDK of the LLM in use
+is imported on the first query. A module which fails to import (e.g. a missing dependency) is reported, not timed.
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+entry_points = ["gist_files", "gist_packages", "batch_gisting", "tell_me_about", "grooming_task", "summarize_api",
+                "trace_api_request", "rewrite_question", "conversation_reviewer"]
+# loaded on the first query only, or by tiktoken when tokens are counted
+heavy_modules = ["openai", "anthropic", "vertexai", "langfuse", "tiktoken"]
+
+import_script = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy} if m in sys.modules]}}))
+"""
+
+
+def import_once(module: str) -> dict:
+    """
+    the import time of module and the heavy modules it loaded, in a new interpreter without the LLM environment variables
+    """
+    env = {k: v for k, v in os.environ.items() if not k.startswith(("LLM_", "LANGFUSE_"))}
+    result = subprocess.run([sys.executable, "-c", import_script.format(module=module, heavy=heavy_modules)],
+                            cwd=repo_root, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()
+        return {"error": error[-1] if error else f"exit code {result.returncode}"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def top_imports(module: str, count: int = 15) -> list[tuple[int, str]]:
+    """
+    the imports with the largest cumulative time in microseconds, from python -X importtime
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=repo_root, capture_output=True, text=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        imports.append((int(cumulative), name.rstrip()))
+    return sorted(imports, reverse=True)[:count]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import time of the entry points, each in a new interpreter")
+    parser.add_argument("--module", type=str, action="append", default=None,
+                        help="entry point to measure, can be repeated (default all)")
+    parser.add_argument("--repeat", type=int, default=5, help="imports per entry point, the median is reported (default 5)")
+    parser.add_argument("--importtime", action="store_true", help="also list the slowest imports of each entry point")
+    args = parser.parse_args()
+
+    modules = args.module or entry_points
+    print(f"{'entry point':<24}{'median ms':>12}{'min ms':>10}  heavy modules loaded")
+    for module in modules:
+        runs = [import_once(module) for _ in range(args.repeat)]
+        if "error" in runs[0]:
+            print(f"{module:<24}{'-':>12}{'-':>10}  import failed: {runs[0]['error']}")
+            continue
+        seconds = [run["seconds"] for run in runs]
+        loaded = ", ".join(runs[0]["loaded"]) or "none"
+        print(f"{module:<24}{statistics.median(seconds) * 1000:>12.1f}{min(seconds) * 1000:>10.1f}  {loaded}")
+        if args.importtime:
+            for cumulative, name in top_imports(module):
+                print(f"{'':<4}{cumulative / 1000:>10.1f} ms  {name}")
@@ -2,7 +2,11 @@ import os
 import yaml
 from pathlib import Path
 
+# the configuration file loaded into the environment variables, None until one is
+_loaded_config_path = None
+
 def load_config_to_env(config_path=None):
+    global _loaded_config_path
     if config_path is None:
         config_path = Path('application.yml')
     else:
@@ -26,5 +30,18 @@ def load_config_to_env(config_path=None):
     
     flattened_config = flatten_dict(config)
     os.environ.update(flattened_config)
+    _loaded_config_path = config_path
+
+def ensure_config_loaded(config_path=None):
+    """
+    load the configuration into the environment variables on first use (the LLMs, the tracing) instead of at import.
+    nothing is done if a configuration was loaded already, e.g. by the main of a script or by a test with its own file,
+    or if there is no configuration file, the environment variables may be set otherwise.
+    """
+    if _loaded_config_path is not None:
+        return
+    if not Path(config_path or 'application.yml').exists():
+        return
+    load_config_to_env(config_path)
 
 # You can add other config-related utility functions here if needed
\ No newline at end of file
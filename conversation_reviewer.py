@@ -1,11 +1,7 @@
 from typing import Tuple, List, Optional
 import logging
 
-# the order of the following imports is important
-# since the initialization of langfuse depends on the os environment variables
-# which are loaded in the config_utils module
 from config_utils import load_config_to_env
-load_config_to_env()
 from llm_client import LLMQueryManager, langfuse_context, observe
 
 # Set up logging
@@ -187,6 +183,7 @@ class ConversationReviewer:
 
 
 if __name__ == "__main__":
+    load_config_to_env()
     # test the conversation reviewer in a simple way but real way
     reviewer = ConversationReviewer(query_manager=LLMQueryManager(use_llm="anthropic", tier="tier2", system_prompt="You are an AI assistant to review the conversation between a human and an AI about a Java project analysis."))
     reviewer.add_conversation("What is the main purpose of this project?", "The main purpose of this project is to analyze Java projects.")
@@ -76,27 +76,32 @@ def read_files(pf, file_names) -> Tuple[str, List[str], List[str]]:
                 additional_reading += f"\nFile name=\"{file_name}\"\n"
                 additional_reading += f"Expected file name with relative path, starting with src/main/java or src/test/java, but got {file_name}\n"
                 continue
-            # it is a file name with path, it could be src/main/java/com/iky/travel/config/TravelBeApplication.java ...
-            file_path, file_name = os.path.split(file_name)
-            # let's find the "src/main/java" in the file_path, then we can get the package name
-            if "src/main/java" in file_path:
-                file_path = file_path.replace("src/main/java/", "")
-            elif "src/test/java" in file_path:
-                file_path = file_path.replace("src/test/java/", "")
-            elif "src/main/resources" in file_path:
-                # FIXME: we need to handle the resources folder differently, since it is not a java file
-                print("resources file:", file_path)
-                file_path = file_path.replace("src/main/resources", "")
+            # if it is exactly the relative path of a known file, look it up directly
+            code_file = pf.find_codefile_by_path(file_name)
+            if code_file:
+                filename,filesummary, filepath, filecontent = get_code_file(pf, code_file)
             else:
-                print(f"!!!File {file_name} does not meet expectations we are looking for src/main/java or src/test/java in the path!")
-                additional_reading += f"\nFile name=\"{file_name}\"\n"
-                additional_reading += f"Expected file name with relative path, starting with src/main/java or src/test/java, but got {file_name}\n"
-                continue
-            package = file_path.replace("/", ".")
-            # if package is empty, then use None
-            if package == "":
-                package = None
-            filename,filesummary, filepath, filecontent = get_file(pf, file_name, package=package)
+                # it is a file name with path, it could be src/main/java/com/iky/travel/config/TravelBeApplication.java ...
+                file_path, file_name = os.path.split(file_name)
+                # let's find the "src/main/java" in the file_path, then we can get the package name
+                if "src/main/java" in file_path:
+                    file_path = file_path.replace("src/main/java/", "")
+                elif "src/test/java" in file_path:
+                    file_path = file_path.replace("src/test/java/", "")
+                elif "src/main/resources" in file_path:
+                    # FIXME: we need to handle the resources folder differently, since it is not a java file
+                    print("resources file:", file_path)
+                    file_path = file_path.replace("src/main/resources", "")
+                else:
+                    print(f"!!!File {file_name} does not meet expectations we are looking for src/main/java or src/test/java in the path!")
+                    additional_reading += f"\nFile name=\"{file_name}\"\n"
+                    additional_reading += f"Expected file name with relative path, starting with src/main/java or src/test/java, but got {file_name}\n"
+                    continue
+                package = file_path.replace("/", ".")
+                # if package is empty, then use None
+                if package == "":
+                    package = None
+                filename,filesummary, filepath, filecontent = get_file(pf, file_name, package=package)
         else:
             # it is a single file name, then we look up in the code_files to find the path and summary, then read the file
             filename,filesummary, filepath, filecontent = get_file(pf, file_name, package=None)
@@ -216,13 +221,19 @@ def get_file(pf, file_name, package=None) -> Tuple[str, str, str, str]:
     logger.info(f"attempting to find file: {file_name} package: {package}")
     file = pf.find_codefile_by_name(file_name, package)
     if file:
-        # now let's get the file content, since we have the path
-        full_path = os.path.join(pf.root_path, file.path)
-        with open(full_path, "r") as f:
-            file_content = f.read()
-        return file.filename, file.summary, file.path, file_content
+        return get_code_file(pf, file)
     else:
         return None, None, None, None
+
+def get_code_file(pf, file) -> Tuple[str, str, str, str]:
+    """
+    given a code file of the project, return the file name, summary, path, and content of the file
+    """
+    # now let's get the file content, since we have the path
+    full_path = os.path.join(pf.root_path, file.path)
+    with open(full_path, "r") as f:
+        file_content = f.read()
+    return file.filename, file.summary, file.path, file_content
     
 def get_files(pf, file_names) -> Tuple[Tuple[str, str, str, str]]:
     files = []
@@ -2,239 +2,116 @@ import os
 import sys
 import argparse
 from projectfiles import ProjectFiles
+from project_modules import ProjectModules
+from project_scanner import ProjectScanner
+from gist_journal import GistJournal
+from gisting_engine import GistingEngine
+from gisting_scheduler import rank_files, GistingBudget, ProgressivePersister
+from java_structure import estimate_code_tokens, split_java_source
+from gisting_prompts import (system_prompt, chunk_prompt_template, reduce_prompt_template, packed_prompt_template, source_template,
+                             content_modes, default_excerpt_tokens, default_small_file_tokens, default_pack_tokens,
+                             default_chunk_threshold, read_code_file, get_file_type, get_cached_instructions, prompt_instructions,
+                             can_cache_instructions, build_gisting_prompt, extract_file_summary, split_file_summaries, pack_small_files)
+from near_duplicates import find_near_duplicates, share_gists
+from stop_conditions import stop_after
+from keyword_index import build_keyword_index
+from contextlib import ExitStack
 import re
 import time
 
 
-system_prompt = """
-You are a world-class developer, and you have been tasked with analyzing a Java project. Your goal is to understand the project structure, key functionalities, and important methods to help your team maintain and improve the codebase.
-"""
-
-instructions_java = """
-When analyzing the given file, provide a detailed summary focusing on the following aspects:
-
-- The overall purpose of the file/class
-- Key functionalities and their implementations
-- Important methods: their signatures, parameters, return types, and detailed description of what they do
-- Interactions with other parts of the system (e.g., database calls, API interactions)
-- Any complex algorithms or business logic including how data is processed
-- Use of important libraries or frameworks
-
-Only use below format to provide the summary:
-<File Name="{filename}" Package="{package}">
-
-<Dependencies>
-    <Dependency>...</Dependency>
-    <Dependency>...</Dependency>
-    ...
-</Dependencies>
-
-<Purpose>
-...
-</Purpose>
-
-<Functionalities>
-    <Function name="...">
-        ...
-    </Function>
-</Functionalities>
-</File>
-
-Now, please analyze the given Java file based on the guidelines provided above.
-
-<File Name="{filename}" Package="{package}">
-
-"""
-
-instructions_test = """
-For test files:
-- The class or functionality being tested
-- Key test scenarios covered
-- Any notable testing frameworks or techniques used
-- Mock objects or test data setup
-
-Only use below format to provide the summary:
-
-<File Name="{filename}"  Path="{path}">
-<TestScenarios>
-    <Scenario>...</Scenario>
-    <Scenario>...</Scenario>
-    ...
-</TestScenarios>
-</File>
-
-Now, please analyze the given test file based on the guidelines provided above.
-
-<File Name="{filename}"  Path="{path}">
-"""
-
-instructions_config = """
-For configuration files (properties, YAML, XML):
-- The overall purpose of the configuration file
-- Key configurations and their significance
-- Any environment-specific settings
-- Hierarchical structures and their importance
-- References to other configuration files or properties
-- Any sensitive information (noting its presence, not the actual values)
-
-Only use below format to provide the summary:
-<File Name="{filename}" Path="{path}">
-
-<Purpose>
-...
-</Purpose>
-
-<Configurations>
-    <Configuration name="..." significance="...">
-    <Configuration name="..." significance="...">
-    ...
-</Configurations>
-</File>
-
-Now, please analyze the given configuration file based on the guidelines provided above.
-
-<File Name="{filename}" Path="{path}">
-"""
-
-instructions = """
-
-When analyzing the given file, provide a detailed summary focusing on the following aspects:
-
-For Java files:
-- The overall purpose of the file/class
-- Key functionalities and their implementations
-- Important methods: their signatures, parameters, return types, and a brief description of what they do
-- Any notable design patterns or architectural choices
-- Interactions with other parts of the system (e.g., database calls, API interactions)
-- Exception handling and error management strategies
-- Any complex algorithms or business logic
-- Use of important libraries or frameworks
-
-Only use below format to provide the summary:
-<File Name="{filename}" Package="{package}">
-
-<Dependencies>
-    <Dependency>...</Dependency>
-    <Dependency>...</Dependency>
-    ...
-</Dependencies>
-
-<Purpose>
-...
-</Purpose>
-
-<Functionalities>
-    <Function name="...">
-        ...
-    </Function>
-</Functionalities>
-</File>
-
-For configuration files (properties, YAML, XML):
-- The overall purpose of the configuration file
-- Key configurations and their significance
-- Any environment-specific settings
-- Hierarchical structures and their importance
-- References to other configuration files or properties
-- Any sensitive information (noting its presence, not the actual values)
-
-Only use below format to provide the summary:
-<File Name="{filename}" Path="{path}">
-
-<Purpose>
-...
-</Purpose>
-
-<Configurations>
-    <Configuration name="..." significance="...">
-    <Configuration name="..." significance="...">
-    ...
-</Configurations>
-</File>
-
-For test files:
-- The class or functionality being tested
-- Key test scenarios covered
-- Any notable testing frameworks or techniques used
-- Mock objects or test data setup
-
-Only use below format to provide the summary:
-
-<File Name="{filename}"  Path="{path}">
-<TestScenarios>
-    <Scenario>...</Scenario>
-    <Scenario>...</Scenario>
-    ...
-</TestScenarios>
-</File>
-
-"""
-
-user_prompt_template = """
-
-Given below full file content:
-
-{content}
-
-Please analyze this file based on the guidelines provided next, focusing on key functionalities, important methods, design patterns, and other crucial details.
-
-{instructions}
-
-"""
-
-def get_file_type(filename):
-    _, ext = os.path.splitext(filename)
-    return ext.lower()
-
-def code_gisting(query_manager, project_root, code_file, verbose=True) -> str:
-    full_path = os.path.join(project_root, code_file.path)
-    if not os.path.exists(full_path):
-        print(f"Error: {full_path} does not exist")
-        return ""
-    with open(full_path, 'r') as file:
-        content = file.read()
-    
-    file_type = get_file_type(code_file.filename)
-    
-    # Extract additional context
-    #imports = extract_imports(content)
-    #functions = extract_functions(content, file_type)
-    #todo_comments = extract_todo_comments(content)
-    if file_type == '.java':
-        if code_file.path.startswith("src/main/java"):
-            instructions = instructions_java
-        elif code_file.path.startswith("src/test/java"):
-            instructions = instructions_test
-        else:
-            instructions = instructions
-    elif file_type in ['.properties', '.yaml', '.yml', '.xml']:
-            instructions = instructions_config
-    else:
-        instructions = instructions
+class CachedInstructionsQueryManager:
+    """
+    query with the guidelines of all the file types (get_cached_instructions) as the cached prompt of the LLM, a prefix
+    cached by the provider after the system prompt, instead of sending the instructions again in each prompt.
+    the prompt of a file only names its guidelines, so all the files share the same cached prefix.
+    """
+    def __init__(self, query_manager, cached_instructions: str = None):
+        self.query_manager = query_manager
+        self.cached_instructions = cached_instructions or get_cached_instructions()
+
+    def query(self, prompt: str, stop_condition=None) -> str:
+        return self.query_manager.query(prompt, cached_prompt=self.cached_instructions, stop_condition=stop_condition)
+
+
+def chunked_code_gisting(query_manager, code_file, content, max_chunk_tokens, max_concurrency=4, verbose=True, cached_instructions=False) -> str:
+    """
+    map-reduce gisting of a large Java file: the chunks split along its class and method boundaries are summarized
+    concurrently, then the partial summaries are combined into the <File> summary of the whole file
+    """
+    chunks = split_java_source(content, max_chunk_tokens)
+    prompts = [chunk_prompt_template.format(part=i + 1, parts=len(chunks), filename=code_file.filename,
+                                            package=code_file.package, content=chunk)
+               for i, chunk in enumerate(chunks)]
+    engine = GistingEngine(query_manager.query, max_concurrency=max_concurrency, initial_concurrency=max_concurrency)
+    partial_summaries = engine.run(prompts)
+    if engine.errors:
+        # the file is not summarized from some of its parts only
+        raise next(iter(engine.errors.values()))
+    if verbose:
+        print(f"Gisted {len(chunks)} parts of the file {code_file.filename}")
 
-    prompt = user_prompt_template.format(
+    prompt = reduce_prompt_template.format(
+        parts=len(chunks),
         filename=code_file.filename,
-        filetype=file_type,
         package=code_file.package,
-        path=code_file.path,
-        content=content,
-        instructions=instructions,
-        #imports=imports,
-        #functions=functions,
-        #todo_comments=todo_comments
+        partial_summaries="\n\n".join(f'<Part number="{i + 1}">\n{summary}\n</Part>' for i, summary in enumerate(partial_summaries)),
+        instructions=prompt_instructions(code_file, cached_instructions),
     )
-    
-    summary = query_manager.query(prompt)
+    return query_manager.query(prompt, stop_condition=stop_after("</File>"))
+
+def packed_code_gisting(query_manager, project_root, code_files, verbose=True, cached_instructions=False, fingerprints=None) -> list[str]:
+    """
+    gist small files of the same type in a single prompt, the summaries are in the order of the files.
+    the files missing from the reply (e.g. cut by the output limit) are gisted alone.
+    """
+    contents = [read_code_file(project_root, code_file, fingerprints) for code_file in code_files]
+    sources = [source_template.format(filename=f.filename, package=f.package, path=f.path, content=content)
+               for f, content in zip(code_files, contents) if content is not None]
+    summaries = {}
+    if sources:
+        prompt = packed_prompt_template.format(count=len(sources), sources="\n\n".join(sources),
+                                               instructions=prompt_instructions(code_files[0], cached_instructions))
+        pack_query_manager = CachedInstructionsQueryManager(query_manager) if cached_instructions else query_manager
+        # the reply is streamed until the summary of the last file is closed
+        summaries = split_file_summaries(pack_query_manager.query(prompt, stop_condition=stop_after("</File>", len(sources))))
+    results = []
+    for code_file, content in zip(code_files, contents):
+        summary = summaries.get(code_file.filename, "")
+        if content is not None and not summary.strip():
+            if verbose:
+                print(f"No summary of {code_file.filename} in the reply, gisting it alone")
+            summary = code_gisting(query_manager, project_root, code_file, verbose=False, cached_instructions=cached_instructions,
+                                   fingerprints=fingerprints)
+        results.append(summary if content is not None else "")
+    return results
+
+def code_gisting(query_manager, project_root, code_file, verbose=True, chunk_threshold=default_chunk_threshold,
+                 content_mode="full", excerpt_tokens=default_excerpt_tokens, cached_instructions=False, fingerprints=None) -> str:
+    """
+    gist the code file, a Java file estimated above chunk_threshold tokens is gisted in chunks of half that size (0 to disable).
+    see build_gisting_prompt for the content_mode, the skeleton of a large file is not chunked.
+    with cached_instructions, the instructions of the file type are sent as the cached prompt of the query manager.
+    with fingerprints, the fingerprint of the content sent is set in it by path, see read_code_file.
+    """
+    content = read_code_file(project_root, code_file, fingerprints)
+    if content is None:
+        return ""
+    if cached_instructions:
+        query_manager = CachedInstructionsQueryManager(query_manager)
+
+    if (content_mode == "full" and chunk_threshold and get_file_type(code_file.filename) == '.java'
+            and estimate_code_tokens(content) > chunk_threshold):
+        summary = chunked_code_gisting(query_manager, code_file, content, max(1, chunk_threshold // 2), verbose=verbose,
+                                       cached_instructions=cached_instructions)
+    else:
+        # only the <File> summary is kept, the reply is streamed until it is closed
+        summary = query_manager.query(build_gisting_prompt(project_root, code_file, content, content_mode, excerpt_tokens, cached_instructions),
+                                      stop_condition=stop_after("</File>"))
     if verbose:
         print(f"Summary of the file {code_file.filename}: {summary}")
 
-    # Extract the content between <File> tags, if present
-    match = re.search(r'<File Name=".*?" Package=".*?">(.*?)</File>', summary, re.DOTALL)
-    if match:
-        summary = match.group(1)  # Extract the content inside the <File> tags
-    else:
-        # If no <File> tags are found, return the whole summary
-        summary = summary.split('</File>', 1)[0]  # Return content up to the first </File> tag if present
+    summary = extract_file_summary(summary)
     if verbose:
         print(f"Extracted summary: {summary}")
     return summary
@@ -263,8 +140,55 @@ def code_gisting(query_manager, project_root, code_file, verbose=True) -> str:
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Gisting the code files using LLM")
     parser.add_argument("project_root", type=str, help="Path to the project root")
-    
+    parser.add_argument("--mode", type=str, choices=["update", "new", "incremental"], default=None,
+                        help="update: gist files without summary; new: gist all files; incremental: gist new and changed files only. Ask if not set")
+    parser.add_argument("--module", type=str, action="append", default=None,
+                        help="Only gist this module of a multi-module Maven or Gradle project, can be repeated. All modules if not set")
+    parser.add_argument("--skip-ignored", action="store_true",
+                        help="Skip the files ignored by the .gitignore files and the build output folders, e.g. generated sources")
+    parser.add_argument("--resume", action="store_true",
+                        help="Resume an interrupted run from its journal, the files already gisted are skipped. Use the same --mode as the interrupted run")
+    parser.add_argument("--discard-journal", action="store_true",
+                        help="Discard the journal of an interrupted run and its summaries, instead of resuming it with --resume")
+    parser.add_argument("--concurrency", type=int, default=8,
+                        help="Maximum number of files gisted at the same time, lowered automatically when the LLM is rate limited. Default 8")
+    parser.add_argument("--chunk-threshold", type=int, default=default_chunk_threshold,
+                        help=f"Java files estimated above this number of tokens are split along their class and method boundaries, gisted in parts and combined, 0 to disable. Default {default_chunk_threshold}")
+    parser.add_argument("--content", type=str, choices=content_modes, default="full",
+                        help="What is sent of the Java files: the full content; their skeleton (package, imports, fields, signatures and Javadoc first sentences), "
+                             "which takes much fewer tokens; or their skeleton and the first part of their content. Default full")
+    parser.add_argument("--excerpt-tokens", type=int, default=default_excerpt_tokens,
+                        help=f"Size of the first part of the content sent with --content skeleton-excerpt, default {default_excerpt_tokens}")
+    parser.add_argument("--order", type=str, choices=["importance", "path"], default="importance",
+                        help="importance: gist the most referenced files, controllers and services first, DTOs and tests last; path: in the order of the files. Default importance")
+    parser.add_argument("--max-tokens", type=int, default=None,
+                        help="Stop sending files once their estimated input tokens reach this budget, the most important files are gisted first")
+    parser.add_argument("--max-minutes", type=float, default=None, help="Stop sending files after this many minutes")
+    parser.add_argument("--persist-interval", type=int, default=60,
+                        help="Seconds between two saves of the gist files while gisting, so the summaries can be used before the end. Default 60")
+    parser.add_argument("--dedupe", action="store_true",
+                        help="Gist a single file of each cluster of near-duplicate Java files, the others get its gist with the names replaced")
+    parser.add_argument("--dedupe-threshold", type=float, default=0.85,
+                        help="Minimum similarity of the sources (without comments and names) of near-duplicate files, default 0.85")
+    parser.add_argument("--pack", action="store_true",
+                        help="Gist the small files of the same type (exceptions, enums, records...) several in one prompt")
+    parser.add_argument("--small-file-tokens", type=int, default=default_small_file_tokens,
+                        help=f"With --pack, the files estimated at most this number of tokens are packed, default {default_small_file_tokens}")
+    parser.add_argument("--pack-tokens", type=int, default=default_pack_tokens,
+                        help=f"With --pack, the maximum estimated tokens of the files of a prompt, default {default_pack_tokens}")
+    parser.add_argument("--cache-instructions", action="store_true",
+                        help="Send the guidelines of all the file types once as a prompt cached by the LLM, instead of the instructions in the prompt of each file. "
+                             "The providers only cache a prefix from 1024 tokens (anthropic, openai; 2048 for the Haiku models, 32768 for gemini), "
+                             "the option is ignored with a warning if the prefix is smaller")
+    parser.add_argument("--batch", action="store_true",
+                        help="Gist with the batch API of the LLM (anthropic or openai), cheaper but the results may take up to 24 hours")
+    parser.add_argument("--poll-interval", type=int, default=60, help="Seconds between two status checks of the batches, default 60")
+    parser.add_argument("--plan", action="store_true", help="Only show the estimated tokens, cost and duration of the run, do not gist")
+    parser.add_argument("-y", "--yes", action="store_true", help="Do not ask for confirmation before gisting, e.g. for nightly runs")
+
     args = parser.parse_args()
+    if args.resume and args.discard_journal:
+        parser.error("--resume and --discard-journal cannot be used together")
 
     # the order of the following imports is important
     # since the initialization of langfuse depends on the os environment variables
@@ -272,57 +196,216 @@ if __name__ == "__main__":
     from config_utils import load_config_to_env
     load_config_to_env()
     from llm_client import LLMQueryManager
-    from llm_interaction import initiate_llm_query_manager
+    from llm_interaction import initiate_llm_query_manager, query_manager_limits
+
+    if args.cache_instructions:
+        from token_estimation_utils import estimate_tokens
+        use_llm = os.environ.get("LLM_USE")
+        model_name = os.environ.get(f"{'GCP' if use_llm == 'gemini' else (use_llm or '').upper()}_MODEL_TIER2_NAME")
+        cacheable, prefix_tokens, minimum = can_cache_instructions(use_llm, model_name, count_tokens=estimate_tokens)
+        if not cacheable:
+            # a prefix below the minimum is never cached, the instructions are sent in the prompts as without the option
+            print(f"Warning: --cache-instructions is ignored, the cached prefix of {prefix_tokens} tokens is below the "
+                  f"minimum of {minimum} tokens cached by {use_llm} {model_name or ''}".rstrip())
+            args.cache_instructions = False
 
     root_path = os.path.abspath(args.project_root)
     if not os.path.exists(root_path):
         print(f"Error: {root_path} does not exist")
         sys.exit(1)
 
-    pf = ProjectFiles(
-        repo_root_path=root_path,
-        prefix_list=["src/main/java", "src/main/resources"],
-        suffix_list=[".java"],
-        resource_suffix_list=['.properties', '.yaml', '.yml', '.xml']
-    )
+    project_modules = ProjectModules(root_path, prefix_list=["src/main/java", "src/main/resources"])
+    if project_modules.is_multi_module():
+        print(f"Modules: {', '.join(m.name for m in project_modules.modules)}")
 
     print("Initializing ProjectFiles...")
-    pf.from_project()
-
-    print(f"\nJava files to process: {len(pf.files)}")
-    print(f"Resource files to process: {len(pf.resource_files)}")
-
-    all_files = pf.files + pf.resource_files
-    total_files = len(all_files)
-
-    print(f"\nTotal files to process: {total_files}")
-
-    if pf.gist_file_path and os.path.exists(pf.gist_file_path):
-        print(f"Gist files already exist at {pf.gist_file_path}")
-        print("Do you want to update existing gists or create new ones?")
-        choice = input("Enter 'update' to update existing gists, or 'new' to create new ones: ").lower()
-        if choice == 'update':
-            all_files = [f for f in all_files if not f.summary]
-            print(f"Updating {len(all_files)} files without existing summaries.")
-        elif choice != 'new':
-            print("Invalid choice. Exiting.")
-            sys.exit(1)
-
-    input(f"Press Enter to start gisting {len(all_files)} files...")
-    query_manager = initiate_llm_query_manager(pf=pf, system_prompt=system_prompt, reused_prompt_template=None, tier="tier2")
-    for index, file in enumerate(all_files, start=1):
-        print(f"Processing file {index}/{total_files}: {file.filename} ({file.package})")
-        notes = code_gisting(query_manager=query_manager, project_root=root_path, code_file=file)
-        file.set_summary(notes)
-        # sleep for a short duration to avoid rate limiting
-        time.sleep(3)
-
-    gist_file_path = pf.persist_code_files(all_files)
-    print(f"Gist file is persisted to {gist_file_path}")
+    # one ProjectFiles (and gist shard) per module, the modules are scanned concurrently
+    module_project_files = project_modules.from_project(
+        args.module,
+        suffix_list=[".java"],
+        resource_suffix_list=['.properties', '.yaml', '.yml', '.xml'],
+        scanner=ProjectScanner(root_path) if args.skip_ignored else None
+    )
+    if not module_project_files:
+        print(f"No module to gist in {root_path}. Exiting.")
+        sys.exit(0)
+
+    choice = args.mode
+    files_to_gist = []
+    for module, pf in module_project_files:
+        all_files = pf.files + pf.resource_files
+        total_files = len(all_files)
+        print(f"\nModule {module.name}: Java files: {len(pf.files)}, Resource files: {len(pf.resource_files)}, Total files: {total_files}")
+
+        if pf.loaded_gist_file_path:
+            print(f"Gist files already exist at {pf.loaded_gist_file_path}")
+            if choice is None:
+                print("Do you want to update existing gists or create new ones?")
+                choice = input("Enter 'update' to update existing gists, 'incremental' to update new and changed files, or 'new' to create new ones: ").lower()
+            if choice == 'update':
+                all_files = [f for f in all_files if not f.summary]
+                print(f"Updating {len(all_files)} files without existing summaries.")
+            elif choice == 'incremental':
+                # the deleted files are already dropped by from_project
+                all_files = pf.find_files_to_gist(all_files)
+                print(f"Updating {len(all_files)} new or changed files, {total_files - len(all_files)} unchanged, {len(pf.removed_files)} removed.")
+            elif choice != 'new':
+                print("Invalid choice. Exiting.")
+                sys.exit(1)
+        journal = GistJournal.of_gist_file(pf.gist_file_path)
+        if args.resume:
+            # the summaries of the interrupted run are kept unless the file changed since
+            resumed = [f for f in journal.apply(pf.files + pf.resource_files) if not pf.is_code_file_changed(f)]
+            resumed_paths = {f.path for f in resumed}
+            all_files = [f for f in all_files if f.path not in resumed_paths]
+            print(f"Resuming from {journal.journal_path}: {len(resumed)} files already gisted, {len(all_files)} to go.")
+        elif journal.exists():
+            if not args.discard_journal:
+                # its summaries would be lost, they were paid for
+                print(f"Found the journal of an interrupted run at {journal.journal_path}. "
+                      f"Use --resume to continue that run, or --discard-journal to start over without its summaries.")
+                sys.exit(1)
+            print(f"Discarding the journal of an interrupted run at {journal.journal_path}.")
+            journal.remove()
+        files_to_gist.append((pf, all_files, journal))
+
+    # the fingerprint of the content each summary is made from, by path, taken when the file is read for its prompt
+    read_fingerprints = {}
+    clusters = []
+    # the module and journal of each file to gist, the near-duplicates are not gisted but still updated
+    owners = {id(file): (pf, journal) for pf, all_files, journal in files_to_gist for file in all_files}
+    if args.dedupe:
+        clusters = find_near_duplicates(root_path, [file for _, all_files, _ in files_to_gist for file in all_files],
+                                        threshold=args.dedupe_threshold, fingerprints=read_fingerprints)
+        duplicates = {id(member) for cluster in clusters for member in cluster[1:]}
+        files_to_gist = [(pf, [f for f in all_files if id(f) not in duplicates], journal) for pf, all_files, journal in files_to_gist]
+        print(f"Near-duplicates: {len(clusters)} clusters, {len(duplicates)} files will get the gist of their cluster instead of being gisted.")
+
+    def share_near_duplicate_gists(gisted, record=True):
+        # only the representatives gisted by this run, see share_gists
+        def on_derived(file):
+            pf, journal = owners[id(file)]
+            file.set_fingerprint(*read_fingerprints[file.path])
+            if record:
+                journal.record(file)
+        derived = share_gists(clusters, gisted, on_derived)
+        if clusters:
+            print(f"Shared gists: {len(derived)} near-duplicate files got a derived gist, {len(derived)} LLM calls saved.")
+
+    # the files of all the modules are gisted concurrently, the summaries are set and journaled by on_progress.
+    # the units are planned as they are sent
+    items = [(pf, file, journal) for pf, all_files, journal in files_to_gist for file in all_files]
+    if not items:
+        print("\nNothing to gist, the gists are up to date.")
+        for pf, _, journal in files_to_gist:
+            # the removed files and the summaries of a resumed run are still persisted
+            print(f"Gist file is persisted to {pf.persist_code_files(pf.files + pf.resource_files)}")
+            journal.remove()
+        build_keyword_index(root_path)
+        sys.exit(0)
+    item_of_file = {id(item[1]): item for item in items}
+    code_files = [item[1] for item in items]
+    if args.order == "importance":
+        # ranked over all the modules, the files of a module are referenced from the others
+        code_files = rank_files(root_path, code_files)
+    # a unit is a single file, or a pack of small files of the same type gisted in one prompt
+    if args.pack and not args.batch:
+        units = pack_small_files(root_path, code_files, small_file_tokens=args.small_file_tokens, max_pack_tokens=args.pack_tokens)
+        print(f"Packed {len(code_files)} files into {len(units)} prompts.")
+    else:
+        units = [[code_file] for code_file in code_files]
+    units = [[item_of_file[id(code_file)] for code_file in unit] for unit in units]
+
+    from gisting_planner import plan_gisting, cache_read_price_ratios, default_cache_read_price_ratio
+    # the batch requests are single files with their instructions, see batch_gisting.py
+    cached_instructions = args.cache_instructions and not args.batch
+    plan = plan_gisting(root_path, code_files, system_prompt=system_prompt,
+                        content_mode=args.content, excerpt_tokens=args.excerpt_tokens, chunk_threshold=args.chunk_threshold,
+                        concurrency=args.concurrency, batch=args.batch, units=[[file for _, file, _ in unit] for unit in units],
+                        cached_prompt=get_cached_instructions() if cached_instructions else None,
+                        cache_read_price_ratio=cache_read_price_ratios.get(os.environ.get("LLM_USE"), default_cache_read_price_ratio),
+                        **query_manager_limits)
+    print(plan.report())
+    if args.plan:
+        sys.exit(0)
+
+    if not args.yes:
+        input(f"Press Enter to start gisting {sum(len(files) for _, files, _ in files_to_gist)} files...")
+
+    if args.batch:
+        # submitted as provider batch jobs at batch pricing, the results are merged when the batches ended
+        from batch_gisting import BatchGisting, batch_client_from_env
+        batch_gisting = BatchGisting(batch_client_from_env(tier="tier2", system_prompt=system_prompt), root_path)
+        batch_gisting.submit([file for _, all_files, _ in files_to_gist for file in all_files],
+                             content_mode=args.content, excerpt_tokens=args.excerpt_tokens)
+        print(f"The batches are saved to {batch_gisting.state_path}, if this run is stopped, collect them later with batch_gisting.py")
+        batch_gisting.wait(poll_interval=args.poll_interval)
+        gisted, failed = batch_gisting.collect([pf for pf, _, _ in files_to_gist])
+        print(f"Collected {len(gisted)} summaries, {len(failed)} failed.")
+        # the batches of this run ended, so the near-duplicates of the collected files can be derived
+        share_near_duplicate_gists({file.path for file in gisted}, record=False)
+        for pf, _, _ in files_to_gist:
+            print(f"Gist file is persisted to {pf.persist_code_files(pf.files + pf.resource_files)}")
+        build_keyword_index(root_path)
+        sys.exit(0)
+    query_manager = initiate_llm_query_manager(pf=module_project_files[0][1], system_prompt=system_prompt, reused_prompt_template=None, tier="tier2")
+
+    persister = ProgressivePersister([pf for pf, _, _ in files_to_gist], interval=args.persist_interval)
+    gisted_paths = set()
+
+    def on_progress(completed, total, index, unit, notes_list, error):
+        for position, (pf, file, journal) in enumerate(unit):
+            if error is not None:
+                print(f"Failed file {completed}/{total}: {file.filename} ({file.package}): {error}")
+                continue
+            notes = notes_list[position]
+            print(f"Processed file {completed}/{total}: {file.filename} ({file.package})")
+            file.set_summary(notes)
+            if notes:
+                file.set_fingerprint(*read_fingerprints[file.path])
+                gisted_paths.add(file.path)
+                # journaled as soon as it is returned, so an interrupted run can be resumed
+                journal.record(file)
+                persister.file_gisted(pf)
+
+    budget = GistingBudget(max_tokens=args.max_tokens, max_seconds=args.max_minutes * 60 if args.max_minutes else None)
+
+    def gist_unit(unit):
+        if len(unit) > 1:
+            return packed_code_gisting(query_manager, root_path, [file for _, file, _ in unit], verbose=False,
+                                       cached_instructions=args.cache_instructions, fingerprints=read_fingerprints)
+        return [code_gisting(query_manager=query_manager, project_root=root_path, code_file=unit[0][1], verbose=False,
+                             chunk_threshold=args.chunk_threshold, content_mode=args.content, excerpt_tokens=args.excerpt_tokens,
+                             cached_instructions=args.cache_instructions, fingerprints=read_fingerprints)]
+
+    engine = GistingEngine(gist_unit, max_concurrency=args.concurrency, progress_callback=on_progress,
+                           admit=lambda unit: budget.admit_files(root_path, [file for _, file, _ in unit]))
+    with ExitStack() as stack:
+        for _, _, journal in files_to_gist:
+            stack.enter_context(journal)
+        engine.run(units)
+        share_near_duplicate_gists(gisted_paths)
+    print(query_manager.get_cache_usage().report())
+    if engine.errors:
+        print(f"{sum(len(units[index]) for index in engine.errors)} files failed, run again with --resume to gist them.")
+    if engine.not_run:
+        print(f"The budget is spent after {budget.tokens} estimated input tokens in {budget.elapsed() / 60:.1f} minutes, "
+              f"{sum(len(units[index]) for index in engine.not_run)} less important files are not gisted, run again with --mode incremental to gist them.")
+
+    gist_file_path = None
+    for pf, all_files, journal in files_to_gist:
+        # persist all the files of the module, including the ones not gisted in this run, which compacts the journal
+        gist_file_path = pf.persist_code_files(pf.files + pf.resource_files)
+        journal.remove()
+        print(f"Gist file is persisted to {gist_file_path}")
+
+    # the keywords requested by the LLM in the Q&A loop are looked up in this index instead of reading every file
+    build_keyword_index(root_path)
 
     # Optionally, you can print out the first few lines of the gist file to verify its contents
-    print("\nFirst few lines of the gist file:")
-    with open(gist_file_path, 'r') as f:
-        print(f.read(500))  # Print first 500 characters
+    if gist_file_path and gist_file_path.endswith(".txt"):
+        print("\nFirst few lines of the gist file:")
+        with open(gist_file_path, 'r') as f:
+            print(f.read(500))  # Print first 500 characters
 
-    print("\nGisting process completed.")
\ No newline at end of file
+    print("\nGisting process completed.")
@@ -0,0 +1,105 @@
+import os
+import json
+import time
+from projectfiles import CodeFile
+
+
+class GistJournal:
+    """
+    append-only journal of the file summaries of a gisting run, one json line per gisted file, next to the gist file.
+    a summary is written as soon as it is returned by the LLM, so an interrupted run can be resumed without paying for it again.
+    fsync is batched, every fsync_every records or fsync_interval seconds, a crash loses at most the records since the last fsync.
+    the journal is compacted into the gist store at the end of the run and then removed.
+    """
+    default_journal_file = "code_files.journal"
+
+    def __init__(self, journal_path: str, fsync_every: int = 20, fsync_interval: float = 5.0):
+        self.journal_path = journal_path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._file = None
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    @staticmethod
+    def of_gist_file(gist_file_path: str, **kwargs) -> "GistJournal":
+        return GistJournal(os.path.join(os.path.dirname(gist_file_path), GistJournal.default_journal_file), **kwargs)
+
+    def exists(self) -> bool:
+        return os.path.exists(self.journal_path) and os.path.getsize(self.journal_path) > 0
+
+    def open(self) -> "GistJournal":
+        folder = os.path.dirname(self.journal_path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        self._file = open(self.journal_path, "a", encoding="utf-8")
+        self._last_sync = time.monotonic()
+        return self
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def record(self, file: CodeFile):
+        entry = {"path": file.path, "filename": file.filename, "package": file.package, "summary": file.summary,
+                 "content_hash": file.content_hash, "mtime_ns": file.mtime_ns, "size": file.size}
+        self._file.write(json.dumps(entry) + "\n")
+        # flushed to the OS right away so it survives the process, fsync'ed in batches so it survives the machine
+        self._file.flush()
+        self._pending += 1
+        if self._pending >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        if self._file is None or not self._pending:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def replay(self) -> dict[str, dict]:
+        """
+        the journaled entries by normalized path, the last entry of a path wins.
+        a torn last line (the process died while writing it) is ignored.
+        """
+        entries = {}
+        if not os.path.exists(self.journal_path):
+            return entries
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"Skipping an incomplete journal entry in {self.journal_path}")
+                    continue
+                entries[os.path.normpath(entry["path"])] = entry
+        return entries
+
+    def apply(self, files: list[CodeFile]) -> list[CodeFile]:
+        """
+        set the journaled summaries and fingerprints to the files, return the files which got one
+        """
+        entries = self.replay()
+        applied = []
+        for file in files:
+            entry = entries.get(os.path.normpath(file.path))
+            if entry and entry["filename"] == file.filename and entry["summary"]:
+                file.set_summary(entry["summary"])
+                if entry["content_hash"]:
+                    file.set_fingerprint(entry["content_hash"], entry["mtime_ns"], entry["size"])
+                applied.append(file)
+        return applied
+
+    def remove(self):
+        self.close()
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
@@ -2,7 +2,11 @@ import os
 import sys
 
 import argparse
+import threading
+from config_utils import load_config_to_env
 from projectfiles import ProjectFiles
+from project_modules import ProjectModules
+from package_gisting import gist_packages_concurrently, default_max_input_tokens, default_max_notes_tokens
 
 
 system_prompt = """
@@ -31,34 +35,73 @@ Notes of Sub Packages:
 Notes of Direct Child Files: 
 {file_notes}
 
-Please provide a comprehensive summary of this package based on the information above.
+Please provide a comprehensive summary of this package based on the information above, in at most about {max_words} words.
 """
 
-# the order of the following imports is important
-# since the initialization of langfuse depends on the os environment variables
-# which are loaded in the config_utils module
-from config_utils import load_config_to_env
-load_config_to_env()
-from llm_client import LLMQueryManager
-from llm_interaction import initiate_llm_query_manager
+reduce_prompt_template = """
+Package Name: {package_name}
+
+The package is too large to be analyzed at once, its sub packages and files were split into parts. Notes of the Parts:
+{partial_notes}
+
+Please combine the notes of the parts into one comprehensive summary of this package, in at most about {max_words} words.
+"""
 
-query_manager = initiate_llm_query_manager(pf=None, system_prompt=system_prompt, reused_prompt_template=None, tier="tier2")
+# created on the first package, so importing this module neither loads the configuration nor the LLM SDK
+query_manager = None
+_query_manager_lock = threading.Lock()
+# the length asked for the notes, within the cap of --max-notes-tokens (about 0.75 word per token)
+max_words = default_max_notes_tokens * 3 // 4
+
+def get_query_manager():
+    global query_manager
+    # the packages are gisted from several threads, a single manager keeps the rate limits
+    with _query_manager_lock:
+        if query_manager is None:
+            from llm_interaction import initiate_llm_query_manager
+            query_manager = initiate_llm_query_manager(pf=None, system_prompt=system_prompt, reused_prompt_template=None, tier="tier2")
+    return query_manager
 
 def real_package_gisting(package, subpackage_notes, filenotes):
     print(f"\n\nAnalyzing package: {package}")
     prompt = user_prompt_template.format(
         package_name=package,
         subpackage_notes=subpackage_notes,
-        file_notes=filenotes
+        file_notes=filenotes,
+        max_words=max_words
     )
-    notes = query_manager.query(prompt)
+    notes = get_query_manager().query(prompt)
     return notes
 
+def real_package_reduce(package, partial_notes):
+    print(f"\n\nCombining the parts of package: {package}")
+    prompt = reduce_prompt_template.format(
+        package_name=package,
+        partial_notes=partial_notes,
+        max_words=max_words
+    )
+    return get_query_manager().query(prompt)
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Gisting the Packages using LLM")
     parser.add_argument("project_root", type=str, help="Path to the project root")
+    parser.add_argument("--module", type=str, action="append", default=None,
+                        help="Only gist the packages of this module of a multi-module project, can be repeated. All modules if not set")
+    parser.add_argument("--concurrency", type=int, default=8,
+                        help="Maximum number of packages gisted at the same time, a package is gisted once its sub packages are. Default 8")
+    parser.add_argument("--persist-interval", type=int, default=60,
+                        help="Seconds between two saves of the package notes while gisting. Default 60")
+    parser.add_argument("--mode", type=str, choices=["new", "incremental"], default="new",
+                        help="new: gist all packages; incremental: gist the packages whose file summaries or sub package notes changed only. Default new")
+    parser.add_argument("--max-input-tokens", type=int, default=default_max_input_tokens,
+                        help=f"A package whose notes of files and sub packages are estimated above this number of tokens is gisted in parts, which are combined, 0 to disable. Default {default_max_input_tokens}")
+    parser.add_argument("--max-notes-tokens", type=int, default=default_max_notes_tokens,
+                        help=f"Cap of the notes of a package in estimated tokens, so the notes higher in the tree stay bounded, 0 to disable. Default {default_max_notes_tokens}")
     
     args = parser.parse_args()
+    load_config_to_env()
+    if args.max_notes_tokens:
+        max_words = args.max_notes_tokens * 3 // 4
 
 
 
@@ -67,34 +110,41 @@ if __name__ == "__main__":
         print(f"Error: {root_path} does not exist")
         sys.exit(1)
 
-    pf = ProjectFiles(
-        repo_root_path=root_path,
-    )
+    project_modules = ProjectModules(root_path)
+    modules = project_modules.select(args.module)
+    if project_modules.is_multi_module() and not any(project_modules.is_gisted(m) for m in modules):
+        # gisted as a whole before the project was split into module shards
+        modules = [None]
 
-    # Load existing gist files and create package structure
-    pf.from_gist_files()
+    for module in modules:
+        if module is None:
+            pf = ProjectFiles(repo_root_path=root_path)
+            # Load existing gist files and create package structure
+            pf.from_gist_files()
+        else:
+            pf = project_modules.project_files(module)
+            pf.from_gist_files(pf.gist_file_path)
 
-    if not pf.files and not pf.resource_files:
-        print("No gist files found. Please run gist_files.py first.")
-        sys.exit(1)
+        if not pf.files and not pf.resource_files:
+            print("No gist files found. Please run gist_files.py first.")
+            sys.exit(1)
 
-    print("\n" + "-" * 50)
-    print("Traversing Bottom-Up to generate package summaries:")
-    print("-" * 50)
+        print("\n" + "-" * 50)
+        print(f"Traversing Bottom-Up to generate package summaries{f' of module {module.name}' if module and project_modules.is_multi_module() else ''}:")
+        print("-" * 50)
 
 
-    pf.package_gisting_func = real_package_gisting
+        pf.package_gisting_func = real_package_gisting
 
-    # Traverse the package structure to generate summaries
-    pf.package_structure_traverse(
-        packages=None,
-        action_file_func=pf.check_code_file_exists,
-        action_package_func=pf.gist_package,
-        is_bottom_up=True
-    )
+        # Gist the packages bottom-up, the independent sub trees at the same time
+        engine = gist_packages_concurrently(pf, max_concurrency=args.concurrency, persist_interval=args.persist_interval,
+                                            incremental=args.mode == "incremental", max_input_tokens=args.max_input_tokens or None,
+                                            max_notes_tokens=args.max_notes_tokens or None, reduce_func=real_package_reduce)
+        if engine.errors:
+            print(f"\n{len(engine.errors)} packages failed, {len(engine.blocked)} packages above them were not gisted")
 
-    # Persist the package notes
-    package_notes_file = pf.persist_package_notes()
-    print(f"\nPackage summaries have been persisted to: {package_notes_file}")
+        # Persist the package notes, next to the gist file of the module
+        package_notes_file = pf.persist_package_notes()
+        print(f"\nPackage summaries have been persisted to: {package_notes_file}")
 
-    print("\nPackage gisting complete!")
\ No newline at end of file
+    print("\nPackage gisting complete!")
@@ -0,0 +1,170 @@
+import time
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+
+def is_rate_limit_error(e: Exception) -> bool:
+    """
+    whether the error is a 429 / rate limit error of one of the LLM clients (anthropic, openai, vertexai)
+    """
+    if getattr(e, "status_code", None) == 429 or getattr(e, "code", None) == 429:
+        return True
+    name = type(e).__name__
+    if "RateLimit" in name or "ResourceExhausted" in name or "TooManyRequests" in name:
+        return True
+    message = str(e).lower()
+    return "429" in message or "rate limit" in message
+
+
+class GistingEngine:
+    """
+    run gist_func over many items (e.g. code files) with several calls in flight on a bounded thread pool.
+
+    the number of calls in flight adapts to the LLM (AIMD): it grows by one per round of successful calls, and is cut
+    when a call is rate limited (429), which is retried after a backoff, or when the latency grows well above the best seen.
+    the token and call limits are still enforced by the LLMQueryManager used in gist_func, which is safe to share between threads.
+
+    progress_callback(completed, total, index, item, result, error) is called for each finished item, in the thread calling run,
+    so it can update the files and journal them without locking. the results are returned in the order of the items.
+
+    admit(item), if set, is asked before an item is sent the first time, e.g. to keep to a budget: once it refuses an item,
+    no more items are sent, the ones in flight are finished, and the indexes of the items not sent are kept in not_run.
+
+    run(items, dependencies) can also order the items as a DAG, e.g. a package after its sub-packages: an item is sent as soon as
+    the items it depends on are done, the items depending on a failed one are not sent and their indexes are kept in blocked.
+
+    skip(item), if set, is asked in the thread calling run when an item is about to be sent: if it returns a result (not None),
+    the item is done with it without a call, e.g. a package whose inputs did not change, and its index is kept in skipped.
+    """
+    def __init__(self, gist_func, max_concurrency: int = 8, min_concurrency: int = 1, initial_concurrency: int = None,
+                 max_retries: int = 5, base_delay: float = 2.0, latency_tolerance: float = 2.5, progress_callback=None, admit=None,
+                 skip=None):
+        self.gist_func = gist_func
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.concurrency = float(initial_concurrency or max(self.min_concurrency, self.max_concurrency // 2))
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.latency_tolerance = latency_tolerance
+        self.progress_callback = progress_callback
+        self.admit = admit
+        self.skip = skip
+        self.best_latency = None
+        self.rate_limited_count = 0
+        self.errors = {}  # index -> exception of the items which failed
+        self.not_run = []  # indexes of the items not sent since admit refused them
+        self.blocked = []  # indexes of the items not sent since an item they depend on failed
+        self.skipped = []  # indexes of the items done by skip without a call
+        self._backoff_until = 0.0
+        self._last_decrease = 0.0
+
+    def _on_success(self, latency: float):
+        if self.best_latency is None or latency < self.best_latency:
+            self.best_latency = latency
+        if latency > self.best_latency * self.latency_tolerance:
+            self._decrease(latency)
+        else:
+            # additive increase, about one more call in flight per round of calls
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+
+    def _decrease(self, latency: float):
+        # at most once per round, the calls already in flight saw the same conditions
+        now = time.monotonic()
+        if now - self._last_decrease < latency:
+            return
+        self._last_decrease = now
+        self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+        logger.info(f"Gisting concurrency decreased to {int(self.concurrency)}")
+
+    def _on_rate_limited(self, attempt: int, latency: float):
+        self.rate_limited_count += 1
+        self._decrease(latency)
+        self._backoff_until = max(self._backoff_until, time.monotonic() + self.base_delay * (2 ** attempt))
+
+    def _release_dependents(self, index: int, waiting: dict, dependents: dict, pending: deque, items: list):
+        for dependent in dependents.get(index, ()):
+            waiting[dependent].discard(index)
+            if not waiting[dependent]:
+                del waiting[dependent]
+                pending.append((dependent, items[dependent], 0))
+
+    def _block_dependents(self, index: int, waiting: dict, dependents: dict):
+        stack = list(dependents.get(index, ()))
+        while stack:
+            dependent = stack.pop()
+            if waiting.pop(dependent, None) is not None:
+                self.blocked.append(dependent)
+                stack.extend(dependents.get(dependent, ()))
+
+    def run(self, items: list, dependencies: dict = None) -> list:
+        """
+        dependencies, if set, maps the index of an item to the indexes of the items it depends on
+        """
+        total = len(items)
+        results = [None] * total
+        completed = 0
+        waiting = {index: set(needed) for index, needed in (dependencies or {}).items() if needed}
+        dependents = {}
+        for index, needed in waiting.items():
+            for needed_index in needed:
+                dependents.setdefault(needed_index, []).append(index)
+        pending = deque((index, item, 0) for index, item in enumerate(items) if index not in waiting)
+        in_flight = {}  # future -> (index, item, attempt, start time)
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            while pending or in_flight:
+                now = time.monotonic()
+                while pending and now >= self._backoff_until:
+                    index, item, attempt = pending[0]
+                    if attempt == 0 and self.skip is not None:
+                        # not timed, a skipped item would make the calls look slow
+                        result = self.skip(item)
+                        if result is not None:
+                            pending.popleft()
+                            results[index] = result
+                            self.skipped.append(index)
+                            self._release_dependents(index, waiting, dependents, pending, items)
+                            completed += 1
+                            if self.progress_callback:
+                                self.progress_callback(completed, total, index, item, result, None)
+                            continue
+                    if len(in_flight) >= int(self.concurrency):
+                        break
+                    if attempt == 0 and self.admit is not None and not self.admit(item):
+                        # the retried items are at the front of the queue, only the items never sent are dropped
+                        self.not_run.extend(i for i, _, _ in pending)
+                        self.not_run.extend(waiting)
+                        pending.clear()
+                        waiting.clear()
+                        break
+                    pending.popleft()
+                    in_flight[executor.submit(self.gist_func, item)] = (index, item, attempt, now)
+                if not in_flight:
+                    time.sleep(max(0.0, self._backoff_until - now))
+                    continue
+                timeout = max(0.05, self._backoff_until - now) if pending and now < self._backoff_until else None
+                done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, item, attempt, start = in_flight.pop(future)
+                    latency = time.monotonic() - start
+                    error = future.exception()
+                    if error is None:
+                        results[index] = future.result()
+                        self._on_success(latency)
+                        self._release_dependents(index, waiting, dependents, pending, items)
+                    elif is_rate_limit_error(error) and attempt < self.max_retries:
+                        logger.info(f"Rate limited, retrying item {index} later: {error}")
+                        self._on_rate_limited(attempt, latency)
+                        # retried first, to keep the progress close to the order of the items
+                        pending.appendleft((index, item, attempt + 1))
+                        continue
+                    else:
+                        logger.error(f"Error gisting item {index}: {error}")
+                        self.errors[index] = error
+                        self._block_dependents(index, waiting, dependents)
+                    completed += 1
+                    if self.progress_callback:
+                        self.progress_callback(completed, total, index, item, results[index], error)
+        return results
@@ -0,0 +1,177 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from projectfiles import CodeFile
+from java_structure import estimate_code_tokens, split_java_source
+from gisting_prompts import (read_code_file, get_file_type, get_file_instructions, prompt_instructions, build_gisting_prompt,
+                             chunk_prompt_template, reduce_prompt_template, packed_prompt_template, source_template,
+                             instructions_java, instructions_test, instructions_config, default_chunk_threshold, default_excerpt_tokens)
+
+# the expected size of a summary by the instructions of the file, the summaries of the main Java files are the longest
+java_output_tokens = 700
+test_output_tokens = 400
+config_output_tokens = 400
+other_output_tokens = 500
+# a partial summary of a part of a large file, see gist_files.chunked_code_gisting
+chunk_output_tokens = 400
+# the time of a call: the latency before the first token, and the generation of the output
+call_latency = 2.0
+seconds_per_output_token = 0.02
+# pricing per million tokens (in USD), as in LLMQueryManager, and the discount of the batch APIs
+default_input_token_price = 3.00
+default_output_token_price = 15.00
+batch_discount = 0.5
+# the price of the input tokens read from the prompt cache, relative to the input price
+cache_read_price_ratios = {"anthropic": 0.1, "openai": 0.5}
+default_cache_read_price_ratio = 0.1
+# below this number of files, the tokens are counted in this process
+min_files_per_pool = 64
+
+
+def expected_output_tokens(code_file: CodeFile) -> int:
+    file_instructions = get_file_instructions(code_file)
+    if file_instructions is instructions_java:
+        return java_output_tokens
+    if file_instructions is instructions_test:
+        return test_output_tokens
+    if file_instructions is instructions_config:
+        return config_output_tokens
+    return other_output_tokens
+
+def plan_file(args) -> tuple[int, int, int]:
+    """
+    the input tokens, output tokens and number of calls to gist a file, with the prompts gist_files.code_gisting would send.
+    args is a tuple (project_root, (filename, path, package), content_mode, excerpt_tokens, chunk_threshold, count_tokens,
+    cached_instructions) so it can be sent to a pool of processes.
+    """
+    project_root, (filename, path, package), content_mode, excerpt_tokens, chunk_threshold, count_tokens, cached_instructions = args
+    code_file = CodeFile(filename, path, package)
+    content = read_code_file(project_root, code_file)
+    if content is None:
+        return 0, 0, 0
+    output_tokens = expected_output_tokens(code_file)
+    if (content_mode == "full" and chunk_threshold and get_file_type(filename) == '.java'
+            and estimate_code_tokens(content) > chunk_threshold):
+        chunks = split_java_source(content, max(1, chunk_threshold // 2))
+        input_tokens = sum(count_tokens(chunk_prompt_template.format(part=i + 1, parts=len(chunks), filename=filename,
+                                                                     package=package, content=chunk))
+                           for i, chunk in enumerate(chunks))
+        partial_tokens = chunk_output_tokens * len(chunks)
+        reduce_prompt = reduce_prompt_template.format(parts=len(chunks), filename=filename, package=package, partial_summaries="",
+                                                      instructions=prompt_instructions(code_file, cached_instructions))
+        return input_tokens + count_tokens(reduce_prompt) + partial_tokens, partial_tokens + output_tokens, len(chunks) + 1
+    prompt = build_gisting_prompt(project_root, code_file, content, content_mode, excerpt_tokens, cached_instructions)
+    return count_tokens(prompt), output_tokens, 1
+
+def plan_pack(args) -> tuple[int, int, int]:
+    """
+    the input tokens, output tokens and number of calls to gist small files in one prompt, as gist_files.packed_code_gisting.
+    args is a tuple (project_root, [(filename, path, package)], count_tokens, cached_instructions)
+    """
+    project_root, files, count_tokens, cached_instructions = args
+    code_files = [CodeFile(filename, path, package) for filename, path, package in files]
+    contents = [read_code_file(project_root, code_file) for code_file in code_files]
+    sources = [source_template.format(filename=f.filename, package=f.package, path=f.path, content=content)
+               for f, content in zip(code_files, contents) if content is not None]
+    if not sources:
+        return 0, 0, 0
+    prompt = packed_prompt_template.format(count=len(sources), sources="\n\n".join(sources),
+                                           instructions=prompt_instructions(code_files[0], cached_instructions))
+    output_tokens = sum(expected_output_tokens(f) for f, content in zip(code_files, contents) if content is not None)
+    return count_tokens(prompt), output_tokens, 1
+
+def plan_unit(args) -> tuple[int, int, int]:
+    """
+    plan_file for a single file, plan_pack for a pack of small files.
+    args is a tuple (project_root, [(filename, path, package)], content_mode, excerpt_tokens, chunk_threshold, count_tokens,
+    cached_instructions)
+    """
+    project_root, files, content_mode, excerpt_tokens, chunk_threshold, count_tokens, cached_instructions = args
+    if len(files) == 1:
+        return plan_file((project_root, files[0], content_mode, excerpt_tokens, chunk_threshold, count_tokens, cached_instructions))
+    return plan_pack((project_root, files, count_tokens, cached_instructions))
+
+
+class GistingPlan:
+    """
+    the estimated tokens, cost and duration of a gisting run
+    """
+    def __init__(self, files: int, calls: int, input_tokens: int, output_tokens: int, cost: float, seconds: float, bound: str,
+                 input_token_price: float, output_token_price: float, days: int = 1, cached_tokens: int = 0):
+        self.files = files
+        self.calls = calls
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.cost = cost
+        self.seconds = seconds  # None for a batch run, which ends within 24 hours
+        self.bound = bound
+        self.input_token_price = input_token_price
+        self.output_token_price = output_token_price
+        self.days = days
+        self.cached_tokens = cached_tokens  # input tokens read from the prompt cache
+
+    def report(self) -> str:
+        lines = [f"Gisting plan for {self.files} files in {self.calls} calls:",
+                 f"  Input tokens: {self.input_tokens:,} (system prompt included"
+                 f"{f', {self.cached_tokens:,} read from the prompt cache' if self.cached_tokens else ''})",
+                 f"  Output tokens: {self.output_tokens:,} (estimated)",
+                 f"  Cost: ${self.cost:.2f} (${self.input_token_price:.2f} / ${self.output_token_price:.2f} per million input / output tokens)"]
+        if self.seconds is None:
+            lines.append(f"  Duration: up to 24 hours, {self.bound}")
+        else:
+            lines.append(f"  Duration: about {self.seconds / 60:.1f} minutes, bound by {self.bound}")
+        if self.days > 1:
+            lines.append(f"  The tokens exceed the daily limit, the run takes {self.days} days")
+        return "\n".join(lines)
+
+
+def plan_gisting(project_root: str, files: list[CodeFile], system_prompt: str = "", content_mode: str = "full",
+                 excerpt_tokens: int = default_excerpt_tokens, chunk_threshold: int = default_chunk_threshold,
+                 concurrency: int = 8, max_calls: int = 1000, period: int = 60, max_tokens_per_min: int = 80000,
+                 max_tokens_per_day: int = 2500000, input_token_price: float = default_input_token_price,
+                 output_token_price: float = default_output_token_price, batch: bool = False,
+                 count_tokens=None, max_workers: int = None, units: list[list[CodeFile]] = None, cached_prompt: str = None,
+                 cache_read_price_ratio: float = default_cache_read_price_ratio) -> GistingPlan:
+    """
+    estimate a gisting run of the files (the ones left after the skipped ones), before it starts.
+    units are the files as they are sent, a single file or a pack of small files in one prompt (gist_files.pack_small_files),
+    one file per unit if not set.
+    with cached_prompt (e.g. the guidelines of --cache-instructions), the prompts only name the instructions and the prefix of
+    each call after the first one, the system prompt and the cached prompt, is priced at cache_read_price_ratio of the input price.
+    count_tokens(text) defaults to tiktoken with a cached encoding, the files are counted in a pool of processes.
+    the duration is the longest of: the calls at the concurrency, the calls at the call rate limit, the tokens at the token rate limit.
+    """
+    if count_tokens is None:
+        from token_estimation_utils import estimate_tokens as count_tokens
+    if units is None:
+        units = [[f] for f in files]
+    cached_instructions = cached_prompt is not None
+    tasks = [(project_root, [(f.filename, f.path, f.package) for f in unit], content_mode, excerpt_tokens, chunk_threshold,
+              count_tokens, cached_instructions) for unit in units]
+    if len(tasks) < min_files_per_pool:
+        results = [plan_unit(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(plan_unit, tasks, chunksize=16))
+
+    calls = sum(c for _, _, c in results)
+    prefix_tokens = count_tokens(system_prompt + "\n" + cached_prompt) if cached_instructions else count_tokens(system_prompt)
+    input_tokens = sum(i for i, _, _ in results) + calls * prefix_tokens
+    # the first call writes the prefix to the cache, the others read it
+    cached_tokens = max(0, calls - 1) * prefix_tokens if cached_instructions else 0
+    output_tokens = sum(o for _, o, _ in results)
+    cost = ((input_tokens - cached_tokens) * input_token_price + cached_tokens * input_token_price * cache_read_price_ratio
+            + output_tokens * output_token_price) / 1_000_000
+    planned_files = sum(len(unit) for unit in units)
+    if batch:
+        return GistingPlan(planned_files, calls, input_tokens, output_tokens, cost * batch_discount, None,
+                           f"at {int(batch_discount * 100)}% of the price with the batch API",
+                           input_token_price * batch_discount, output_token_price * batch_discount, cached_tokens=cached_tokens)
+
+    latency = call_latency + seconds_per_output_token * output_tokens / max(1, calls)
+    bounds = [(calls * latency / max(1, concurrency), f"{concurrency} calls at the same time of about {latency:.0f} seconds"),
+              (calls / max_calls * period, f"the {max_calls} calls per {period} seconds limit"),
+              ((input_tokens + output_tokens) / max_tokens_per_min * 60, f"the {max_tokens_per_min:,} tokens per minute limit")]
+    seconds, bound = max(bounds, key=lambda b: b[0])
+    days = -(-(input_tokens + output_tokens) // max_tokens_per_day) if max_tokens_per_day else 1
+    return GistingPlan(planned_files, calls, input_tokens, output_tokens, cost, seconds, bound, input_token_price, output_token_price,
+                       days=max(1, days), cached_tokens=cached_tokens)
@@ -0,0 +1,504 @@
+import os
+import re
+from java_structure import estimate_code_tokens, extract_java_skeleton
+from projectfiles import read_file_with_fingerprint
+
+# the prompts of the gisting of the code files, shared by gist_files.py (the LLM calls), gisting_planner.py (the estimate
+# of a run) and batch_gisting.py (the batch requests)
+
+system_prompt = """
+You are a world-class developer, and you have been tasked with analyzing a Java project. Your goal is to understand the project structure, key functionalities, and important methods to help your team maintain and improve the codebase.
+"""
+
+instructions_java = """
+When analyzing the given file, provide a detailed summary focusing on the following aspects:
+
+- The overall purpose of the file/class
+- Key functionalities and their implementations
+- Important methods: their signatures, parameters, return types, and detailed description of what they do
+- Interactions with other parts of the system (e.g., database calls, API interactions)
+- Any complex algorithms or business logic including how data is processed
+- Use of important libraries or frameworks
+
+Only use below format to provide the summary:
+<File Name="{filename}" Package="{package}">
+
+<Dependencies>
+    <Dependency>...</Dependency>
+    <Dependency>...</Dependency>
+    ...
+</Dependencies>
+
+<Purpose>
+...
+</Purpose>
+
+<Functionalities>
+    <Function name="...">
+        ...
+    </Function>
+</Functionalities>
+</File>
+
+Now, please analyze the given Java file based on the guidelines provided above.
+
+<File Name="{filename}" Package="{package}">
+
+"""
+
+instructions_test = """
+For test files:
+- The class or functionality being tested
+- Key test scenarios covered
+- Any notable testing frameworks or techniques used
+- Mock objects or test data setup
+
+Only use below format to provide the summary:
+
+<File Name="{filename}"  Path="{path}">
+<TestScenarios>
+    <Scenario>...</Scenario>
+    <Scenario>...</Scenario>
+    ...
+</TestScenarios>
+</File>
+
+Now, please analyze the given test file based on the guidelines provided above.
+
+<File Name="{filename}"  Path="{path}">
+"""
+
+instructions_config = """
+For configuration files (properties, YAML, XML):
+- The overall purpose of the configuration file
+- Key configurations and their significance
+- Any environment-specific settings
+- Hierarchical structures and their importance
+- References to other configuration files or properties
+- Any sensitive information (noting its presence, not the actual values)
+
+Only use below format to provide the summary:
+<File Name="{filename}" Path="{path}">
+
+<Purpose>
+...
+</Purpose>
+
+<Configurations>
+    <Configuration name="..." significance="...">
+    <Configuration name="..." significance="...">
+    ...
+</Configurations>
+</File>
+
+Now, please analyze the given configuration file based on the guidelines provided above.
+
+<File Name="{filename}" Path="{path}">
+"""
+
+instructions = """
+
+When analyzing the given file, provide a detailed summary focusing on the following aspects:
+
+For Java files:
+- The overall purpose of the file/class
+- Key functionalities and their implementations
+- Important methods: their signatures, parameters, return types, and a brief description of what they do
+- Any notable design patterns or architectural choices
+- Interactions with other parts of the system (e.g., database calls, API interactions)
+- Exception handling and error management strategies
+- Any complex algorithms or business logic
+- Use of important libraries or frameworks
+
+Only use below format to provide the summary:
+<File Name="{filename}" Package="{package}">
+
+<Dependencies>
+    <Dependency>...</Dependency>
+    <Dependency>...</Dependency>
+    ...
+</Dependencies>
+
+<Purpose>
+...
+</Purpose>
+
+<Functionalities>
+    <Function name="...">
+        ...
+    </Function>
+</Functionalities>
+</File>
+
+For configuration files (properties, YAML, XML):
+- The overall purpose of the configuration file
+- Key configurations and their significance
+- Any environment-specific settings
+- Hierarchical structures and their importance
+- References to other configuration files or properties
+- Any sensitive information (noting its presence, not the actual values)
+
+Only use below format to provide the summary:
+<File Name="{filename}" Path="{path}">
+
+<Purpose>
+...
+</Purpose>
+
+<Configurations>
+    <Configuration name="..." significance="...">
+    <Configuration name="..." significance="...">
+    ...
+</Configurations>
+</File>
+
+For test files:
+- The class or functionality being tested
+- Key test scenarios covered
+- Any notable testing frameworks or techniques used
+- Mock objects or test data setup
+
+Only use below format to provide the summary:
+
+<File Name="{filename}"  Path="{path}">
+<TestScenarios>
+    <Scenario>...</Scenario>
+    <Scenario>...</Scenario>
+    ...
+</TestScenarios>
+</File>
+
+"""
+
+user_prompt_template = """
+
+Given below full file content:
+
+{content}
+
+Please analyze this file based on the guidelines provided next, focusing on key functionalities, important methods, design patterns, and other crucial details.
+
+{instructions}
+
+"""
+
+chunk_prompt_template = """
+
+Given below part {part} of {parts} of the Java file {filename} (package {package}), which is too large to be analyzed at once. It was split along its class and method boundaries, the comment lines starting with "// in" tell which class the code is in:
+
+{content}
+
+Summarize this part only:
+- The purpose of the class(es), as far as this part shows it
+- Important methods: their signatures, parameters, return types, and detailed description of what they do
+- Dependencies, interactions with other parts of the system (e.g., database calls, API interactions)
+- Any complex algorithms or business logic
+
+Be concise, the summaries of all the parts are combined into one summary of the file afterwards.
+
+"""
+
+reduce_prompt_template = """
+
+Given below the summaries of the {parts} parts of the Java file {filename} (package {package}), which was too large to be analyzed at once:
+
+{partial_summaries}
+
+Combine them into a single summary of the whole file, based on the guidelines provided next.
+
+{instructions}
+
+"""
+
+skeleton_prompt_template = """
+
+Given below the skeleton of the file, its package, imports, fields, and the class and method signatures with their annotations and the first sentence of their Javadoc, the method bodies are left out:
+
+{skeleton}
+{excerpt}
+Please analyze this file based on the guidelines provided next, focusing on key functionalities, important methods, design patterns, and other crucial details.
+
+{instructions}
+
+"""
+
+excerpt_template = """
+And the first part of the full file content, cut after about {excerpt_tokens} tokens:
+
+{excerpt}
+"""
+
+# what is sent of a Java file: the full content, the skeleton, or the skeleton and the first part of the content
+content_modes = ["full", "skeleton", "skeleton-excerpt"]
+default_excerpt_tokens = 1500
+
+packed_prompt_template = """
+
+Given below the full content of {count} files, each one between its <Source Name="..." Package="..." Path="..."> and </Source> tags:
+
+{sources}
+
+Please analyze each of these files separately based on the guidelines provided next. Give one summary per file, in the order of the files, each in its own <File> block with the Name of the file.
+
+{instructions}
+
+"""
+
+source_template = """<Source Name="{filename}" Package="{package}" Path="{path}">
+{content}
+</Source>"""
+
+# the guidelines of all the file types, sent once after the system prompt as the prompt cached by the LLM, see
+# gist_files.CachedInstructionsQueryManager. the guidelines of a single file type are too short to be cached by the providers,
+# together with the examples they are above the minimum prefix of most models, see can_cache_instructions
+cached_instructions_template = """
+Below are the guidelines to summarize each type of file. The prompt of each file tells which guidelines to follow,
+the placeholders in braces stand for the values of the file.
+
+## Guidelines for main Java files
+{instructions_java}
+
+## Guidelines for test Java files
+{instructions_test}
+
+## Guidelines for configuration files
+{instructions_config}
+
+## Guidelines for other files
+{instructions}
+
+## Example of the summary of a main Java file
+
+<File Name="OrderService.java" Package="com.example.order.service">
+
+<Dependencies>
+    <Dependency>com.example.order.repository.OrderRepository</Dependency>
+    <Dependency>com.example.payment.client.PaymentClient</Dependency>
+    <Dependency>org.springframework.transaction.annotation.Transactional</Dependency>
+</Dependencies>
+
+<Purpose>
+Spring service implementing the order lifecycle: it validates and stores new orders, charges them through the payment
+service and publishes the status changes. It is the only writer of the orders table.
+</Purpose>
+
+<Functionalities>
+    <Function name="Order placeOrder(OrderRequest request)">
+        Validates the items and the customer, computes the total with the active discounts, saves the order as PENDING
+        and calls PaymentClient.charge in the same transaction; a declined payment marks the order as REJECTED.
+    </Function>
+    <Function name="Optional<Order> findById(Long id)">
+        Reads an order with its items from OrderRepository, used by OrderController.getOrder.
+    </Function>
+    <Function name="void cancel(Long id)">
+        Cancels a PENDING or PAID order, refunds a paid one and publishes an OrderCancelled event; throws
+        OrderNotFoundException for an unknown id and IllegalStateException for a shipped order.
+    </Function>
+</Functionalities>
+</File>
+
+## Example of the summary of a configuration file
+
+<File Name="application.yml" Path="src/main/resources/application.yml">
+
+<Purpose>
+Spring Boot configuration of the order service for the default profile, with overrides for the test profile.
+</Purpose>
+
+<Configurations>
+    <Configuration name="spring.datasource" significance="PostgreSQL connection of the orders database, credentials from environment variables">
+    <Configuration name="payment.client.base-url" significance="base URL of the payment service used by PaymentClient">
+    <Configuration name="server.port" significance="HTTP port 8080 of the REST endpoints">
+</Configurations>
+</File>
+"""
+
+# with the instructions in the cached prompt of the LLM, see gist_files.CachedInstructionsQueryManager
+cached_instructions_reference = """
+The guidelines and the format of the summary are the {guidelines} given in the system prompt.
+"""
+
+# the minimum size in tokens of a prompt prefix cached by the LLM, a shorter prefix is sent at the full price every time.
+# anthropic caches from 1024 tokens (2048 for the Haiku models), openai from 1024, the explicit context cache of gemini from 32768
+min_cached_prefix_tokens = {"anthropic": 1024, "openai": 1024, "gemini": 32768}
+min_cached_prefix_tokens_haiku = 2048
+
+# small files of the same type are gisted together, see pack_small_files
+default_small_file_tokens = 400
+default_pack_tokens = 4000
+max_files_per_pack = 6
+
+# files estimated above this number of tokens are gisted in chunks, see gist_files.chunked_code_gisting
+default_chunk_threshold = 12000
+
+def get_file_type(filename):
+    _, ext = os.path.splitext(filename)
+    return ext.lower()
+
+def read_code_file(project_root, code_file, fingerprints: dict = None) -> str:
+    """
+    the content of the code file, None if the file does not exist.
+    the fingerprint of the content read is set in fingerprints by path, it is the one of the summary made from it
+    """
+    full_path = os.path.join(project_root, code_file.path)
+    if not os.path.exists(full_path):
+        print(f"Error: {full_path} does not exist")
+        return None
+    if fingerprints is None:
+        with open(full_path, 'r') as file:
+            return file.read()
+    content, fingerprints[code_file.path] = read_file_with_fingerprint(full_path)
+    return content
+
+def get_file_instructions(code_file) -> str:
+    file_type = get_file_type(code_file.filename)
+    if file_type == '.java':
+        # the source roots of a module are under the module folder, e.g. service/src/main/java
+        source_path = "/" + code_file.path.replace(os.sep, "/")
+        if "/src/main/java/" in source_path:
+            return instructions_java
+        elif "/src/test/java/" in source_path:
+            return instructions_test
+    elif file_type in ['.properties', '.yaml', '.yml', '.xml']:
+        return instructions_config
+    return instructions
+
+def get_cached_instructions() -> str:
+    """
+    the guidelines of all the file types, the cached prompt of CachedInstructionsQueryManager
+    """
+    return cached_instructions_template.format(instructions_java=instructions_java, instructions_test=instructions_test,
+                                               instructions_config=instructions_config, instructions=instructions)
+
+def cached_guidelines_name(code_file) -> str:
+    """
+    the name of the guidelines of the file in the cached prompt
+    """
+    file_instructions = get_file_instructions(code_file)
+    if file_instructions is instructions_java:
+        return "Guidelines for main Java files"
+    if file_instructions is instructions_test:
+        return "Guidelines for test Java files"
+    if file_instructions is instructions_config:
+        return "Guidelines for configuration files"
+    return "Guidelines for other files"
+
+def prompt_instructions(code_file, cached_instructions=False) -> str:
+    """
+    the instructions to put in the prompt of the file, only a reference to them if they are in the cached prompt
+    """
+    if cached_instructions:
+        return cached_instructions_reference.format(guidelines=cached_guidelines_name(code_file))
+    return get_file_instructions(code_file)
+
+def cached_instructions_prefix_tokens(count_tokens=estimate_code_tokens) -> int:
+    """
+    the tokens of the prefix cached with --cache-instructions, the system prompt and the guidelines of all the file types
+    """
+    return count_tokens(system_prompt + "\n" + get_cached_instructions())
+
+def min_cached_prefix(use_llm: str, model_name: str = None) -> int:
+    """
+    the minimum tokens of a prefix cached by the LLM, None if the LLM is unknown
+    """
+    if use_llm == "anthropic" and model_name and "haiku" in model_name.lower():
+        return min_cached_prefix_tokens_haiku
+    return min_cached_prefix_tokens.get(use_llm)
+
+def can_cache_instructions(use_llm: str, model_name: str = None, count_tokens=estimate_code_tokens) -> tuple[bool, int, int]:
+    """
+    whether the prefix of --cache-instructions is large enough to be cached by the LLM, with its tokens and the minimum
+    """
+    minimum = min_cached_prefix(use_llm, model_name)
+    tokens = cached_instructions_prefix_tokens(count_tokens)
+    return minimum is not None and tokens >= minimum, tokens, minimum
+
+def build_skeleton_prompt(code_file, content, excerpt_tokens=None, cached_instructions=False) -> str:
+    """
+    the prompt to gist a Java file from its skeleton, with the first excerpt_tokens of its content if set
+    """
+    excerpt = ""
+    if excerpt_tokens:
+        # cut at a line end, the estimate is about 4 characters per token
+        cut = content.rfind("\n", 0, excerpt_tokens * 4)
+        excerpt = excerpt_template.format(excerpt_tokens=excerpt_tokens, excerpt=content[:cut if cut > 0 else excerpt_tokens * 4])
+    return skeleton_prompt_template.format(
+        skeleton=extract_java_skeleton(content),
+        excerpt=excerpt,
+        instructions=prompt_instructions(code_file, cached_instructions),
+    )
+
+def build_gisting_prompt(project_root, code_file, content=None, content_mode="full", excerpt_tokens=default_excerpt_tokens,
+                         cached_instructions=False) -> str:
+    """
+    the prompt to gist the code file, None if the file does not exist.
+    with the content_mode "skeleton" or "skeleton-excerpt", a Java file is sent as its skeleton (see extract_java_skeleton),
+    with the first excerpt_tokens of its content for "skeleton-excerpt".
+    with cached_instructions, the instructions are left to the cached prompt, see gist_files.CachedInstructionsQueryManager
+    """
+    if content is None:
+        content = read_code_file(project_root, code_file)
+        if content is None:
+            return None
+    
+    file_type = get_file_type(code_file.filename)
+    if file_type == '.java' and content_mode != "full":
+        return build_skeleton_prompt(code_file, content, excerpt_tokens if content_mode == "skeleton-excerpt" else None, cached_instructions)
+    
+    # Extract additional context
+    #imports = extract_imports(content)
+    #functions = extract_functions(content, file_type)
+    #todo_comments = extract_todo_comments(content)
+    file_instructions = prompt_instructions(code_file, cached_instructions)
+
+    return user_prompt_template.format(
+        filename=code_file.filename,
+        filetype=file_type,
+        package=code_file.package,
+        path=code_file.path,
+        content=content,
+        instructions=file_instructions,
+        #imports=imports,
+        #functions=functions,
+        #todo_comments=todo_comments
+    )
+
+def extract_file_summary(response: str) -> str:
+    # Extract the content between <File> tags, if present
+    match = re.search(r'<File Name=".*?" Package=".*?">(.*?)</File>', response, re.DOTALL)
+    if match:
+        return match.group(1)  # Extract the content inside the <File> tags
+    # If no <File> tags are found, return the whole summary
+    return response.split('</File>', 1)[0]  # Return content up to the first </File> tag if present
+
+def split_file_summaries(response: str) -> dict:
+    """
+    the summaries of the <File Name="..."> blocks of a reply by file name
+    """
+    return {name: summary for name, summary in re.findall(r'<File Name="([^"]*)"[^>]*>(.*?)</File>', response, re.DOTALL)}
+
+def pack_small_files(project_root, code_files, small_file_tokens=default_small_file_tokens, max_pack_tokens=default_pack_tokens) -> list[list]:
+    """
+    group the small files (estimated at most small_file_tokens, from their size) which have the same instructions into packs
+    of at most max_pack_tokens and max_files_per_pack files, without two files of the same name. the other files are alone.
+    the order of the files is kept, a pack takes the place of its first file.
+    """
+    units = []
+    open_packs = {}  # id of the instructions -> (pack, tokens)
+    for code_file in code_files:
+        try:
+            tokens = (os.path.getsize(os.path.join(project_root, code_file.path)) + 3) // 4
+        except OSError:
+            tokens = 0
+        if tokens > small_file_tokens:
+            units.append([code_file])
+            continue
+        key = id(get_file_instructions(code_file))
+        pack, pack_tokens = open_packs.get(key, (None, 0))
+        if (pack is None or len(pack) >= max_files_per_pack or pack_tokens + tokens > max_pack_tokens
+                or any(f.filename == code_file.filename for f in pack)):
+            pack, pack_tokens = [], 0
+            units.append(pack)
+        pack.append(code_file)
+        open_packs[key] = (pack, pack_tokens + tokens)
+    return units
@@ -0,0 +1,154 @@
+import os
+import re
+import math
+import time
+import logging
+from collections import defaultdict
+from projectfiles import CodeFile
+
+logger = logging.getLogger(__name__)
+
+_IMPORT = re.compile(r'^\s*import\s+(?:static\s+)?([\w.]+)\s*;', re.MULTILINE)
+_TYPE_NAME = re.compile(r'\b[A-Z]\w*\b')
+
+# weight of a file by the role its name tells, the first matching suffix wins
+role_weights = [
+    (("Controller", "Resource", "Endpoint", "Handler", "Listener", "Consumer", "Application"), 3.0),
+    (("Service", "ServiceImpl", "Manager", "Facade", "Processor", "Scheduler", "Job"), 2.5),
+    (("Repository", "Dao", "DAO", "Client", "Gateway", "Adapter", "Mapper", "Converter"), 2.0),
+    (("Config", "Configuration", "Properties", "Filter", "Interceptor", "Security"), 1.5),
+    (("Dto", "DTO", "Request", "Response", "Entity", "Model", "Exception", "Constants", "Constant", "Enum"), 0.5),
+]
+default_role_weight = 1.0
+test_weight = 0.3
+# application.yml and the like are read to answer most questions about the setup, the other resources much less
+main_config_weight = 1.5
+resource_weight = 0.5
+
+
+def role_weight(code_file: CodeFile) -> float:
+    path = "/" + code_file.path.replace(os.sep, "/")
+    if "/src/test/" in path:
+        return test_weight
+    stem, ext = os.path.splitext(code_file.filename)
+    if ext != ".java":
+        return main_config_weight if stem.startswith(("application", "bootstrap")) else resource_weight
+    for suffixes, weight in role_weights:
+        if stem.endswith(suffixes):
+            return weight
+    return default_role_weight
+
+def reference_counts(project_root: str, files: list[CodeFile]) -> tuple[dict, dict]:
+    """
+    how often each Java file is referenced by the others: imported, or named by a file of the same package (which needs no import).
+    returns {path: number of referencing files} and {package: number of other packages importing from it}.
+    """
+    by_name = {}
+    by_package = defaultdict(dict)
+    for file in files:
+        if file.filename.endswith(".java") and file.package:
+            name = file.filename[:-len(".java")]
+            by_name[f"{file.package}.{name}"] = file
+            by_package[file.package][name] = file
+
+    referenced = defaultdict(int)
+    importing_packages = defaultdict(set)
+    for file in by_name.values():
+        try:
+            with open(os.path.join(project_root, file.path), "r", errors="replace") as f:
+                content = f.read()
+        except OSError:
+            continue
+        references = set()
+        for imported in _IMPORT.findall(content):
+            target = by_name.get(imported)
+            if target is None:
+                # a static import names a member of the class
+                target = by_name.get(imported.rsplit(".", 1)[0])
+            if target is not None:
+                references.add(target.path)
+                if target.package != file.package:
+                    importing_packages[target.package].add(file.package)
+        neighbours = by_package[file.package]
+        for name in set(_TYPE_NAME.findall(content)) & neighbours.keys():
+            references.add(neighbours[name].path)
+        references.discard(file.path)
+        for path in references:
+            referenced[path] += 1
+    return dict(referenced), {package: len(packages) for package, packages in importing_packages.items()}
+
+def rank_files(project_root: str, files: list[CodeFile]) -> list[CodeFile]:
+    """
+    the files from the most to the least important to gist first: the weight of their role (controllers and services before
+    DTOs and tests), times how often they are referenced, times how many packages depend on their package.
+    the order of the files is kept between files of the same importance.
+    """
+    referenced, package_dependents = reference_counts(project_root, files)
+    max_dependents = max(package_dependents.values(), default=0) or 1
+
+    def importance(file: CodeFile) -> float:
+        centrality = package_dependents.get(file.package, 0) / max_dependents
+        return role_weight(file) * (1 + math.log1p(referenced.get(file.path, 0))) * (1 + centrality)
+
+    return sorted(files, key=importance, reverse=True)
+
+
+class GistingBudget:
+    """
+    a cap on the estimated input tokens and on the wall-clock time of a gisting run, both optional.
+    admit(tokens) is asked before each file is sent: once the budget is spent the run stops, the files already sent are finished.
+    """
+    def __init__(self, max_tokens: int = None, max_seconds: float = None):
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
+        self.tokens = 0
+        self.start_time = time.monotonic()
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start_time
+
+    def admit(self, tokens: int) -> bool:
+        if self.max_seconds is not None and self.elapsed() >= self.max_seconds:
+            return False
+        if self.max_tokens is not None and self.tokens + tokens > self.max_tokens:
+            return False
+        self.tokens += tokens
+        return True
+
+    def admit_files(self, project_root: str, code_files: list[CodeFile]) -> bool:
+        """
+        admit the files gisted together by the estimate of their size in tokens, a file gone counts for nothing (and is skipped when gisted)
+        """
+        size = 0
+        for code_file in code_files:
+            try:
+                size += os.path.getsize(os.path.join(project_root, code_file.path))
+            except OSError:
+                pass
+        # about 4 bytes per token, as java_structure.estimate_code_tokens, without reading the files
+        return self.admit((size + 3) // 4)
+
+
+class ProgressivePersister:
+    """
+    persist the gist files every interval seconds while they are gisted, so the summaries already made can be used
+    (e.g. by tell_me_about.py) before the run ends
+    """
+    def __init__(self, project_files_list: list, interval: float = 60):
+        self.project_files_list = project_files_list
+        self.interval = interval
+        self.last_persist = time.monotonic()
+        self.changed = set()
+
+    def file_gisted(self, pf):
+        self.changed.add(id(pf))
+        if self.interval is not None and time.monotonic() - self.last_persist >= self.interval:
+            self.persist()
+
+    def persist(self):
+        for pf in self.project_files_list:
+            if id(pf) in self.changed:
+                pf.persist_code_files(pf.files + pf.resource_files)
+        logger.info(f"Persisted the summaries of {len(self.changed)} modules")
+        self.changed.clear()
+        self.last_persist = time.monotonic()
@@ -11,11 +11,7 @@ from functions import read_files, read_packages, read_all_packages, read_from_hu
 from functions import function_prompt
 import logging
 
-# the order of the following imports is important
-# since the initialization of langfuse depends on the os environment variables
-# which are loaded in the config_utils module
 from config_utils import load_config_to_env
-load_config_to_env()
 
 from llm_client import LLMQueryManager, langfuse_context, observe
 from conversation_reviewer import ConversationReviewer
@@ -215,6 +211,8 @@ if __name__ == "__main__":
     parser.add_argument("--jira", type=str, default="", help="URL of the Jira ticket")
     parser.add_argument("--max-rounds", type=int, default=8, help="Maximum rounds of conversation with LLM before stopping the conversation (default: 8)")
     args = parser.parse_args()
+    # the configuration is loaded by the commands, importing the modules has no side effect
+    load_config_to_env()
     print(args)
 
         
@@ -225,8 +223,8 @@ if __name__ == "__main__":
         sys.exit(1)
 
     pf = ProjectFiles(repo_root_path=root_path)
-    # load the files and package gists from persistence.
-    pf.from_gist_files()
+    # load the files and package gists from persistence, the file summaries are read only when needed.
+    pf.from_gist_files(lazy=True)
 
     task = args.task
     jira = args.jira
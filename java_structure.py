@@ -0,0 +1,220 @@
+import re
+import argparse
+
+# comments, text blocks, strings and char literals, which may contain braces and semicolons
+_COMMENT_OR_LITERAL = re.compile(r'//[^\n]*|/\*.*?(?:\*/|\Z)|"""(?:\\.|.)*?(?:"""|\Z)|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'', re.DOTALL)
+_TYPE_DECLARATION = re.compile(r'\b(class|interface|enum|record)\s+\w+')
+_BLANK = re.compile(r'[^\n]')
+_JAVADOC = re.compile(r'/\*\*(.*?)\*/', re.DOTALL)
+_MAX_STATEMENT_LENGTH = 200
+
+
+def estimate_code_tokens(text: str) -> int:
+    """
+    rough token count of source code (about 4 characters per token), cheap enough to decide how to gist a file
+    """
+    return (len(text) + 3) // 4
+
+def mask_comments_and_literals(source: str) -> str:
+    """
+    a copy of the source of the same length, with the comments and the string and char literals blanked out (keeping the newlines),
+    so the braces and semicolons left are the ones of the code
+    """
+    return _COMMENT_OR_LITERAL.sub(lambda m: _BLANK.sub(" ", m.group(0)), source)
+
+def strip_comments(source: str) -> str:
+    """
+    the source with the comments blanked out, the string and char literals are kept
+    """
+    return _COMMENT_OR_LITERAL.sub(lambda m: _BLANK.sub(" ", m.group(0)) if m.group(0).startswith("/") else m.group(0), source)
+
+def split_members(masked: str, start: int, end: int) -> list:
+    """
+    the (start, end) spans of the members between start and end of the masked source: the statements ended by a ';' and the
+    blocks (types, methods, initializers) ended by their closing brace. the comments and blank lines before a member belong to it.
+    """
+    members = []
+    depth = 0
+    parens = 0
+    member_start = start
+    i = start
+    while i < end:
+        c = masked[i]
+        if c == '(':
+            parens += 1
+        elif c == ')':
+            parens -= 1
+        elif c == '{':
+            depth += 1
+        elif c == '}':
+            depth -= 1
+            if depth == 0 and parens == 0:
+                # a block ending an expression, e.g. an array initializer or an anonymous class, goes on to the ';'
+                following = masked[i + 1:end].lstrip()
+                if not following or following[0] not in ';,).':
+                    members.append((member_start, i + 1))
+                    member_start = i + 1
+        elif c == ';' and depth == 0 and parens == 0:
+            members.append((member_start, i + 1))
+            member_start = i + 1
+        i += 1
+    if masked[member_start:end].strip():
+        members.append((member_start, end))
+    elif members:
+        # the trailing blank lines stay with the last member, so the members cover the whole range
+        members[-1] = (members[-1][0], end)
+    return members
+
+def _body_open(masked: str, start: int, end: int) -> int:
+    """
+    the index of the opening brace of the body of the member, -1 if it has no body
+    """
+    parens = 0
+    for i in range(start, end):
+        c = masked[i]
+        if c == '(':
+            parens += 1
+        elif c == ')':
+            parens -= 1
+        elif c == '{' and parens == 0:
+            return i
+    return -1
+
+def _split_lines(text: str, max_tokens: int) -> list:
+    parts = []
+    current = []
+    current_tokens = 0
+    for line in text.splitlines(keepends=True):
+        line_tokens = estimate_code_tokens(line)
+        if current and current_tokens + line_tokens > max_tokens:
+            parts.append("".join(current))
+            current = []
+            current_tokens = 0
+        current.append(line)
+        current_tokens += line_tokens
+    if current:
+        parts.append("".join(current))
+    return parts
+
+def _collect_pieces(source: str, masked: str, start: int, end: int, context: tuple, max_tokens: int, pieces: list):
+    for member_start, member_end in split_members(masked, start, end):
+        text = source[member_start:member_end]
+        if estimate_code_tokens(text) <= max_tokens:
+            pieces.append((context, text))
+            continue
+        open_brace = _body_open(masked, member_start, member_end)
+        close_brace = masked.rfind('}', member_start, member_end)
+        if open_brace >= 0 and _TYPE_DECLARATION.search(masked, member_start, open_brace):
+            # a class too large for a chunk is split along its members, the chunks name the class they are in
+            declaration = source[member_start:open_brace + 1]
+            pieces.append((context, declaration))
+            declaration = " ".join(masked[member_start:open_brace].split())
+            _collect_pieces(source, masked, open_brace + 1, close_brace, context + (declaration,), max_tokens, pieces)
+            pieces.append((context, source[close_brace:member_end]))
+        else:
+            # a method too large for a chunk, only split along its lines
+            for part in _split_lines(text, max_tokens):
+                pieces.append((context, part))
+
+def split_java_source(source: str, max_chunk_tokens: int = 6000) -> list:
+    """
+    split a Java source along its class, inner class and method boundaries into chunks of about max_chunk_tokens at most,
+    the imports stay in the first chunk. when a chunk starts inside a class, or moves to another one, a comment line
+    "// in <class declaration> > <inner class declaration>" tells where the code is.
+    the source is returned as a single chunk if it fits.
+    """
+    if estimate_code_tokens(source) <= max_chunk_tokens:
+        return [source]
+    masked = mask_comments_and_literals(source)
+    pieces = []
+    _collect_pieces(source, masked, 0, len(source), (), max_chunk_tokens, pieces)
+
+    chunks = []
+    current = []
+    current_tokens = 0
+    current_context = None
+    for context, text in pieces:
+        header = f"\n// in {' > '.join(context)}\n" if context and context != current_context else ""
+        tokens = estimate_code_tokens(header + text)
+        if current and current_tokens + tokens > max_chunk_tokens:
+            chunks.append("".join(current))
+            current = []
+            current_tokens = 0
+            header = f"// in {' > '.join(context)}\n" if context else ""
+            tokens = estimate_code_tokens(header + text)
+        current.append(header + text)
+        current_tokens += tokens
+        current_context = context
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+def javadoc_first_sentence(text: str) -> str:
+    """
+    the first sentence of the last Javadoc comment in the text, "" if there is none
+    """
+    docs = _JAVADOC.findall(text)
+    if not docs:
+        return ""
+    lines = []
+    for line in docs[-1].splitlines():
+        line = line.strip().lstrip("*").strip()
+        if line.startswith("@"):
+            break
+        if not line:
+            if lines:
+                break
+            continue
+        lines.append(line)
+    doc = " ".join(lines)
+    match = re.search(r'\.(\s|$)', doc)
+    return doc[:match.start() + 1] if match else doc
+
+def _skeleton_lines(source: str, masked: str, code: str, start: int, end: int, indent: str, lines: list):
+    for member_start, member_end in split_members(masked, start, end):
+        declaration_start = member_start + len(masked[member_start:member_end]) - len(masked[member_start:member_end].lstrip())
+        doc = javadoc_first_sentence(source[member_start:declaration_start])
+        if doc:
+            lines.append(f"{indent}/** {doc} */")
+        open_brace = _body_open(masked, declaration_start, member_end)
+        if masked[member_end - 1] == ';' or open_brace < 0:
+            # package, imports, fields, abstract methods and enum constants are kept as they are, long initializers are cut
+            statement = " ".join(code[declaration_start:member_end].split())
+            if len(statement) > _MAX_STATEMENT_LENGTH:
+                statement = statement[:_MAX_STATEMENT_LENGTH] + " ..."
+            lines.append(indent + statement)
+            continue
+        declaration = " ".join(code[declaration_start:open_brace].split())
+        if _TYPE_DECLARATION.search(masked, declaration_start, open_brace):
+            lines.append(f"{indent}{declaration} {{")
+            _skeleton_lines(source, masked, code, open_brace + 1, masked.rfind('}', declaration_start, member_end), indent + "    ", lines)
+            lines.append(indent + "}")
+        elif declaration in ("static", ""):
+            # initializer blocks
+            lines.append(f"{indent}{declaration + ' ' if declaration else ''}{{ ... }}")
+        else:
+            # the body of the methods and constructors is left out
+            lines.append(f"{indent}{declaration};")
+
+def extract_java_skeleton(source: str) -> str:
+    """
+    a compact skeleton of a Java source: the package, the imports, the fields, the class and method signatures with their
+    annotations, and the first sentence of their Javadoc. the method bodies and the other comments are left out.
+    """
+    masked = mask_comments_and_literals(source)
+    code = strip_comments(source)
+    lines = []
+    _skeleton_lines(source, masked, code, 0, len(source), "", lines)
+    return "\n".join(lines) + "\n"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print the skeleton of a Java file, as sent by gist_files.py --content skeleton")
+    parser.add_argument("java_file", type=str, help="Path to the Java file")
+    args = parser.parse_args()
+
+    with open(args.java_file, "r") as f:
+        source = f.read()
+    skeleton = extract_java_skeleton(source)
+    print(skeleton)
+    print(f"Estimated tokens: {estimate_code_tokens(skeleton)} of {estimate_code_tokens(source)} for the full file")
@@ -0,0 +1,231 @@
+import os
+import re
+import json
+import logging
+from projectfiles import hash_file_content
+from project_scanner import ProjectScanner
+
+logger = logging.getLogger(__name__)
+
+# the files searched by the Q&A loop, see extract_and_process_next_steps in llm_interaction.py
+default_file_extensions = [".java", ".xml", ".yml", ".yaml", ".properties", ".sql", ".json"]
+# larger files are not searched, as in functions.efficient_file_search
+default_max_file_size = 1_000_000
+
+_TOKEN = re.compile(r"[a-z0-9_]+")
+
+
+def tokenize(text: str) -> set[str]:
+    """
+    the lowercased identifier-like tokens of the text, e.g. OrderService.findById -> {"orderservice", "findbyid"}
+    """
+    return set(_TOKEN.findall(text.lower()))
+
+
+class KeywordIndex:
+    """
+    the inverted index of the tokens of the project files, persisted in .gist/keyword_index.json, so the keywords requested
+    by the LLM are found without reading every file of the project again.
+
+    a search gives the same files as efficient_file_search (a case insensitive substring of the content): a keyword of one
+    token is a substring of one of the tokens of the file, which is found in the vocabulary of the index. a keyword with
+    other characters (e.g. a path or a dotted name) narrows the files down to the ones with all its tokens, which are read.
+
+    update() indexes the new and changed files only, a file is read again if its mtime or size changed and tokenized
+    again if its content hash changed, the removed files are dropped.
+    """
+    default_index_file = "keyword_index.json"
+    version = 1
+
+    def __init__(self, root_path: str, index_path: str = None, file_extensions: list[str] = None,
+                 max_file_size: int = default_max_file_size):
+        self.root_path = root_path
+        self.index_path = index_path or os.path.join(root_path, ".gist", self.default_index_file)
+        self.file_extensions = list(file_extensions or default_file_extensions)
+        self.max_file_size = max_file_size
+        self.files = {}     # relative path -> {"id": file id, "content_hash", "mtime_ns", "size"}
+        self.postings = {}  # token -> list of file ids, set while updating
+        self.paths = {}     # file id -> relative path
+        self._next_id = 0
+
+    def exists(self) -> bool:
+        return os.path.exists(self.index_path)
+
+    def load(self) -> "KeywordIndex":
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != self.version or data.get("file_extensions") != self.file_extensions:
+            # another layout or other files, built again by the next update
+            logger.info(f"Keyword index {self.index_path} is outdated, it will be rebuilt")
+            return self
+        self.files = data["files"]
+        self.postings = data["postings"]
+        self.paths = {entry["id"]: path for path, entry in self.files.items()}
+        self._next_id = max(self.paths, default=-1) + 1
+        return self
+
+    def save(self) -> str:
+        folder = os.path.dirname(self.index_path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        # the ids are renumbered, so the ids of the removed files are not kept forever
+        new_ids = {old_id: new_id for new_id, old_id in enumerate(sorted(self.paths))}
+        files = {path: dict(entry, id=new_ids[entry["id"]]) for path, entry in self.files.items()}
+        postings = {token: sorted(new_ids[file_id] for file_id in ids) for token, ids in self.postings.items()}
+        data = {"version": self.version, "file_extensions": self.file_extensions, "files": files, "postings": postings}
+        # written next to it and renamed, a crash while saving leaves the previous index
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(temp_path, self.index_path)
+        self.files, self.postings = files, postings
+        self.paths = {entry["id"]: path for path, entry in files.items()}
+        self._next_id = len(self.paths)
+        return self.index_path
+
+    def _project_files(self) -> list[str]:
+        scanner = ProjectScanner(self.root_path)
+        return scanner.find_files(self.root_path, tuple(self.file_extensions))
+
+    def _read(self, path: str) -> str:
+        with open(os.path.join(self.root_path, path), "r", encoding="utf-8", errors="ignore") as f:
+            return f.read()
+
+    def update(self) -> tuple[int, int]:
+        """
+        index the new and changed files and drop the removed ones, returns (files tokenized, files removed)
+        """
+        found = set()
+        changed = {}  # file id -> tokens
+        for path in self._project_files():
+            try:
+                stat = os.stat(os.path.join(self.root_path, path))
+            except OSError:
+                continue
+            if stat.st_size > self.max_file_size:
+                continue
+            found.add(path)
+            entry = self.files.get(path)
+            if entry is not None and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+                continue
+            content_hash = hash_file_content(os.path.join(self.root_path, path))
+            if entry is not None and entry["content_hash"] == content_hash:
+                # touched but not changed
+                entry["mtime_ns"], entry["size"] = stat.st_mtime_ns, stat.st_size
+                continue
+            if entry is None:
+                entry = self.files[path] = {"id": self._next_id}
+                self.paths[self._next_id] = path
+                self._next_id += 1
+            entry.update(content_hash=content_hash, mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+            changed[entry["id"]] = tokenize(self._read(path))
+
+        removed = [path for path in self.files if path not in found]
+        stale = set(changed) | {self.files[path]["id"] for path in removed}
+        for path in removed:
+            del self.paths[self.files.pop(path)["id"]]
+        if stale:
+            # one pass over the postings drops the tokens of the changed and removed files
+            for token in list(self.postings):
+                ids = [file_id for file_id in self.postings[token] if file_id not in stale]
+                if ids:
+                    self.postings[token] = ids
+                else:
+                    del self.postings[token]
+        for file_id, tokens in changed.items():
+            for token in tokens:
+                self.postings.setdefault(token, []).append(file_id)
+        return len(changed), len(removed)
+
+    def _token_files(self, token: str, left_open: bool, right_open: bool) -> set[int]:
+        """
+        the files with a token which is the given token, or ends with it (left_open), or starts with it (right_open)
+        """
+        if not left_open and not right_open:
+            return set(self.postings.get(token, ()))
+        if left_open and right_open:
+            matches = [t for t in self.postings if token in t]
+        elif left_open:
+            matches = [t for t in self.postings if t.endswith(token)]
+        else:
+            matches = [t for t in self.postings if t.startswith(token)]
+        return {file_id for t in matches for file_id in self.postings[t]}
+
+    def search(self, keyword: str, file_extensions: list[str] = None):
+        """
+        the relative paths of the files whose content contains the keyword, ignoring the case, sorted.
+        None if the index cannot answer, i.e. the keyword has no token or the extensions are not all indexed.
+        """
+        if file_extensions and not {ext.lower() for ext in file_extensions} <= {ext.lower() for ext in self.file_extensions}:
+            return None
+        lowered = keyword.lower()
+        tokens = _TOKEN.findall(lowered)
+        if not tokens:
+            return None
+        candidates = None
+        for i, token in enumerate(tokens):
+            # the first token may be the end of a token of the file, the last one its start
+            left_open = i == 0 and lowered.startswith(token)
+            right_open = i == len(tokens) - 1 and lowered.endswith(token)
+            token_files = self._token_files(token, left_open, right_open)
+            candidates = token_files if candidates is None else candidates & token_files
+            if not candidates:
+                return []
+        paths = sorted(self.paths[file_id] for file_id in candidates)
+        if file_extensions:
+            suffixes = tuple(ext.lower() for ext in file_extensions)
+            paths = [path for path in paths if path.lower().endswith(suffixes)]
+        if len(tokens) == 1 and len(tokens[0]) == len(lowered):
+            # a single token is found in the vocabulary exactly
+            return paths
+        matching = []
+        for path in paths:
+            try:
+                if lowered in self._read(path).lower():
+                    matching.append(path)
+            except OSError as e:
+                logger.error(f"Error reading {path}: {e}")
+        return matching
+
+
+# the index of each project searched by this process, None if the project has no index
+_project_indexes = {}
+
+def project_keyword_index(root_path: str):
+    """
+    the keyword index of the project, loaded once per process and brought up to date with the files changed since it
+    was built by gist_files.py. None if the project has no index, the keywords are then searched in the files.
+    """
+    if root_path not in _project_indexes:
+        index = KeywordIndex(root_path)
+        if not index.exists():
+            _project_indexes[root_path] = None
+            return None
+        try:
+            index.load()
+            tokenized, removed = index.update()
+            if tokenized or removed:
+                index.save()
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Keyword index {index.index_path} cannot be used: {e}")
+            index = None
+        _project_indexes[root_path] = index
+    return _project_indexes[root_path]
+
+def build_keyword_index(root_path: str, verbose: bool = True) -> KeywordIndex:
+    """
+    build or update the keyword index of the project and save it, at the end of gist_files.py
+    """
+    index = KeywordIndex(root_path)
+    if index.exists():
+        try:
+            index.load()
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Keyword index {index.index_path} cannot be loaded, it is rebuilt: {e}")
+            index = KeywordIndex(root_path)
+    tokenized, removed = index.update()
+    index_path = index.save()
+    if verbose:
+        print(f"Keyword index of {len(index.files)} files ({tokenized} indexed, {removed} removed) is persisted to {index_path}")
+    _project_indexes[root_path] = index
+    return index
@@ -1,13 +1,28 @@
 # llm_client/__init__.py
 
-from .langfuse_setup import initialize_langfuse
+import importlib
 #
-# make sure the os environment variables are set before importing the llm classes
-# since the initialization of langfuse depends on the os environment variables
+# the tracing is initialized on first use, once the os environment variables are loaded,
+# and the llm classes are imported on first access: only the SDK of the LLM in use is loaded
 #
-observe, langfuse_context = initialize_langfuse()
+from .langfuse_setup import initialize_langfuse, observe, langfuse_context
 from .config import LLMConfig
-from .llm_openai import OpenAIAssistant
-from .llm_google_vertexai import VertexAssistant
-from .llm_anthropic import AnthropicAssistant
-from .llm_router import LLMInterface, OpenAILLM, VertexAILLM, AnthropicLLM, LLMQueryManager, LLMFactory
\ No newline at end of file
+
+_lazy_imports = {
+    "OpenAIAssistant": ".llm_openai",
+    "VertexAssistant": ".llm_google_vertexai",
+    "AnthropicAssistant": ".llm_anthropic",
+    "LLMInterface": ".llm_router",
+    "OpenAILLM": ".llm_router",
+    "VertexAILLM": ".llm_router",
+    "AnthropicLLM": ".llm_router",
+    "LLMQueryManager": ".llm_router",
+    "LLMFactory": ".llm_router",
+}
+
+def __getattr__(name):
+    if name not in _lazy_imports:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_lazy_imports[name], __name__), name)
+    globals()[name] = value
+    return value
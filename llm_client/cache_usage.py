@@ -0,0 +1,46 @@
+import threading
+
+
+class CacheUsage:
+    """
+    the input tokens of the calls of an assistant, and how many of them were read from the prompt cache of the LLM.
+    the assistants may be called from several threads, the counters are guarded by a lock.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.cache_hits = 0  # calls which read some of their input from the cache
+        self.input_tokens = 0  # all the input tokens, cached or not
+        self.cached_tokens = 0  # input tokens read from the cache
+        self.cache_write_tokens = 0  # input tokens written to the cache (anthropic)
+
+    def record(self, input_tokens: int, cached_tokens: int = 0, cache_write_tokens: int = 0):
+        with self._lock:
+            self.calls += 1
+            self.input_tokens += input_tokens
+            self.cached_tokens += cached_tokens
+            self.cache_write_tokens += cache_write_tokens
+            if cached_tokens:
+                self.cache_hits += 1
+
+    def hit_ratio(self) -> float:
+        return self.cache_hits / self.calls if self.calls else 0.0
+
+    def cached_token_ratio(self) -> float:
+        return self.cached_tokens / self.input_tokens if self.input_tokens else 0.0
+
+    @staticmethod
+    def merge(usages) -> "CacheUsage":
+        merged = CacheUsage()
+        for usage in usages:
+            merged.calls += usage.calls
+            merged.cache_hits += usage.cache_hits
+            merged.input_tokens += usage.input_tokens
+            merged.cached_tokens += usage.cached_tokens
+            merged.cache_write_tokens += usage.cache_write_tokens
+        return merged
+
+    def report(self) -> str:
+        return (f"Prompt cache: {self.cache_hits} of {self.calls} calls hit the cache ({self.hit_ratio():.0%}), "
+                f"{self.cached_tokens:,} of {self.input_tokens:,} input tokens read from the cache ({self.cached_token_ratio():.0%}), "
+                f"{self.cache_write_tokens:,} written to it")
@@ -1,6 +1,8 @@
 # langfuse_setup.py
 
 import os
+import functools
+import threading
 from typing import Optional, Callable
 
 def get_observe():
@@ -33,8 +35,43 @@ def get_langfuse_context():
                 pass
         return FakeLangfuseContext()
 
+_lock = threading.Lock()
+_observe = None
+_langfuse_context = None
+
 def initialize_langfuse():
-    global observe, langfuse_context
-    observe = get_observe()
-    langfuse_context = get_langfuse_context()
-    return observe, langfuse_context
\ No newline at end of file
+    """
+    the decorator and the context of langfuse, or the fake ones without LANGFUSE_HOST, chosen once on first use
+    so the environment variables (and the configuration) can be loaded after the import
+    """
+    global _observe, _langfuse_context
+    with _lock:
+        if _observe is None:
+            from config_utils import ensure_config_loaded
+            ensure_config_loaded()
+            _observe = get_observe()
+            _langfuse_context = get_langfuse_context()
+    return _observe, _langfuse_context
+
+def observe(**kwargs) -> Callable:
+    """
+    the observe decorator of langfuse, applied on the first call of the decorated function
+    """
+    def decorator(func):
+        traced = None
+
+        @functools.wraps(func)
+        def wrapper(*args, **func_kwargs):
+            nonlocal traced
+            if traced is None:
+                traced = initialize_langfuse()[0](**kwargs)(func)
+            return traced(*args, **func_kwargs)
+        return wrapper
+    return decorator
+
+class _LazyLangfuseContext:
+    # the langfuse context, initialized on the first use of one of its methods
+    def __getattr__(self, name):
+        return getattr(initialize_langfuse()[1], name)
+
+langfuse_context = _LazyLangfuseContext()
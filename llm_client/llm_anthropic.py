@@ -2,9 +2,10 @@ from .langfuse_setup import observe, langfuse_context
 
 from anthropic import Anthropic, RateLimitError
 import os
-from typing import List, Dict
+from typing import List, Dict, Callable, Optional
 from time import sleep
 from .config import LLMConfig
+from .cache_usage import CacheUsage
 
 import logging
 logger = logging.getLogger(__name__)
@@ -25,13 +26,14 @@ class AnthropicAssistant:
         self.reset_messages()
         self.max_retries = 3
         self.base_delay = 20  # 5 seconds
+        self.cache_usage = CacheUsage()
         logger.info(f"Anthropic model: {self.model}, temperature: {self.temperature}, max_tokens: {self.max_tokens}")
         logger.debug(f"Anthropic system prompt: {self.system_prompt}")
 
     def set_system_prompts(self, system_prompt: str, cached_prompt: str = None):
         self.system_prompt = system_prompt
         if cached_prompt is not None:
-            if self.is_support_cached_prompt() and self.cached_prompt is not None:
+            if self.is_support_cached_prompt():
                 self.cached_prompt = cached_prompt
             else:
                 logger.info("Cached prompt is not supported by this assistant. Will append it to the system prompt.")
@@ -44,11 +46,17 @@ class AnthropicAssistant:
         return True
 
     @observe(as_type="generation", name="query", capture_input=False, capture_output=False)
-    def query(self, user_prompt: str) -> str:
-        if not self.use_history:
-            self.reset_messages()
-
-        self.messages.append({"role": "user", "content": user_prompt})
+    def query(self, user_prompt: str, stop_condition: Optional[Callable[[str], bool]] = None) -> str:
+        """
+        with a stop_condition, the reply is streamed and the stream is closed as soon as stop_condition(text so far) is true,
+        so the tokens after e.g. a closing tag are not generated
+        """
+        if self.use_history:
+            self.messages.append({"role": "user", "content": user_prompt})
+            messages = self.messages
+        else:
+            # a fresh conversation per query, kept local so concurrent queries do not mix their messages
+            messages = [{"role": "user", "content": user_prompt}]
         system_prompt = [
             {
                 "type": "text",
@@ -64,16 +72,22 @@ class AnthropicAssistant:
 
         for attempt in range(self.max_retries):
             try:
-                logger.debug(f"Anthropic messages: {self.messages}")
-                response = self.anthropic.messages.create(
+                logger.debug(f"Anthropic messages: {messages}")
+                request = dict(
                     model=self.model,
                     max_tokens=self.max_tokens,
                     temperature=self.temperature,
                     #FIXME: remove this after anthropic support prompt caching
                     extra_headers={"anthropic-beta": "prompt-caching-2024-07-31"},
                     system=system_prompt,
-                    messages=self.messages
+                    messages=messages
                 )
+                if stop_condition is None:
+                    response = self.anthropic.messages.create(**request)
+                    assistant_message = response.content[0].text
+                    usage = response.usage
+                else:
+                    assistant_message, usage = self._stream(request, stop_condition)
                 break  # If successful, break out of the retry loop
             except RateLimitError as e:
                 if attempt < self.max_retries - 1:
@@ -85,21 +99,22 @@ class AnthropicAssistant:
                     raise e
 
         langfuse_context.update_current_observation(
-            input=self.messages,
+            input=messages,
             model=self.model,
-            output=response.content,
+            output=assistant_message,
             usage={
-                "input": response.usage.input_tokens,
-                "output": response.usage.output_tokens
+                "input": usage.input_tokens,
+                "output": usage.output_tokens
             }
         )
 
-        assistant_message = response.content[0].text
+        # the input tokens do not include the ones read from or written to the cache
+        cached_tokens = getattr(usage, "cache_read_input_tokens", None) or 0
+        cache_write_tokens = getattr(usage, "cache_creation_input_tokens", None) or 0
+        self.cache_usage.record(usage.input_tokens + cached_tokens + cache_write_tokens, cached_tokens, cache_write_tokens)
 
         if self.use_history:
             self.messages.append({"role": "assistant", "content": assistant_message})
-        else:
-            self.reset_messages()
         
         try:
             logger.debug(f"\ncost: {self.get_cost()}\n")
@@ -107,6 +122,21 @@ class AnthropicAssistant:
             logger.info(f"Error getting cost: {e}")
         return assistant_message
 
+    def _stream(self, request: dict, stop_condition: Callable[[str], bool]) -> tuple:
+        """
+        stream the reply until it ends or stop_condition is true, leaving the stream closes the connection and ends the generation.
+        returns the text and the usage so far (the output tokens counted until the stop).
+        """
+        text = ""
+        with self.anthropic.messages.stream(**request) as stream:
+            for delta in stream.text_stream:
+                text += delta
+                if stop_condition(text):
+                    logger.debug("Stop condition met, closing the stream")
+                    break
+            usage = stream.current_message_snapshot.usage
+        return text, usage
+
     def get_session_history(self) -> List[Dict[str, str]]:
         return self.messages if self.use_history else []
 
@@ -1,9 +1,10 @@
-from langfuse.decorators import observe, langfuse_context
+from .langfuse_setup import observe, langfuse_context
 import vertexai
 from vertexai.generative_models import GenerativeModel, ChatSession
 import vertexai.preview.generative_models as generative_models
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Callable
 from .config import LLMConfig
+from .cache_usage import CacheUsage
 class VertexAssistant:
     def __init__(self, project_id: str, location: str,  config: LLMConfig, use_history: bool = True) -> None:
         self.project_id = project_id
@@ -12,6 +13,8 @@ class VertexAssistant:
         self.use_history = use_history
         self.system_prompt = config.system_prompt
         self.cached_prompt = config.cached_prompt
+        # gemini caches the repeated prefixes of the prompts implicitly, the cached prompt is part of the system instruction
+        self.cache_usage = CacheUsage()
         self.generation_config = generative_models.GenerationConfig(
             max_output_tokens=config.max_tokens,
             temperature=config.temperature,
@@ -45,18 +48,26 @@ class VertexAssistant:
         self._initialize_model()
 
     @observe(as_type="generation", capture_input=True, capture_output=True)
-    def query(self, message: str) -> str:
-        if not self.use_history:
-            self._start_new_session()
-
+    def query(self, message: str, stop_condition: Optional[Callable[[str], bool]] = None) -> str:
+        """
+        with a stop_condition, the reply is streamed and the stream is left as soon as stop_condition(text so far) is true.
+        the chat session records a streamed reply once it is read to the end, so with history the reply is read to the end.
+        """
+        # without history, a new chat per query, kept local so concurrent queries do not share it
+        chat = self.chat if self.use_history else self.model.start_chat(history=[], response_validation=False)
         try:
-            response = self.chat.send_message(
+            if stop_condition is not None:
+                return self._stream(chat, message, stop_condition)
+            response = chat.send_message(
                 message,
                 generation_config=self.generation_config,
                 safety_settings=self.safety_settings,
                 stream=False,
             )
             
+            usage = getattr(response, "usage_metadata", None)
+            if usage is not None:
+                self.cache_usage.record(getattr(usage, "prompt_token_count", 0) or 0, getattr(usage, "cached_content_token_count", 0) or 0)
             if response is not None and response.text is not None:
                 return response.text
             else:
@@ -67,6 +78,28 @@ class VertexAssistant:
             print(f"Error type: {type(e)}")
             raise e
 
+    def _stream(self, chat: ChatSession, message: str, stop_condition: Callable[[str], bool]) -> str:
+        responses = chat.send_message(
+            message,
+            generation_config=self.generation_config,
+            safety_settings=self.safety_settings,
+            stream=True,
+        )
+        text = ""
+        usage = None
+        try:
+            for chunk in responses:
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                text += chunk.text or ""
+                if not self.use_history and stop_condition(text):
+                    break
+        finally:
+            # the responses are a generator, closing it ends the stream
+            responses.close()
+        if usage is not None:
+            self.cache_usage.record(getattr(usage, "prompt_token_count", 0) or 0, getattr(usage, "cached_content_token_count", 0) or 0)
+        return text
+
     def save_session_history(self, filename: str) -> None:
         if self.use_history:
             with open(filename, 'w') as f:
@@ -4,8 +4,9 @@ from openai import OpenAI, RateLimitError, APIError
 from datetime import datetime
 import time
 import os
-from typing import List, Dict
+from typing import List, Dict, Callable, Optional
 from .config import LLMConfig
+from .cache_usage import CacheUsage
 
 class OpenAIAssistant:
     def __init__(self, config: LLMConfig, use_history: bool = True):
@@ -16,10 +17,13 @@ class OpenAIAssistant:
         self.system_prompt = config.system_prompt
         self.cached_prompt = config.cached_prompt
         self.use_history = use_history
+        self.cache_usage = CacheUsage()
         self.reset_conversation()
 
     def is_support_cached_prompt(self):
-          return False
+        # openai caches the longest prefix of the prompt seen recently (from 1024 tokens), the cached prompt follows
+        # the system prompt in the system message, so it is part of the stable prefix of all the queries
+        return True
     
     def set_system_prompts(self, system_prompt: str, cached_prompt: str = None):
         self.system_prompt = system_prompt
@@ -29,42 +33,57 @@ class OpenAIAssistant:
             self.system_prompt += "\n" + cached_prompt
             self.cached_prompt = None
         self.reset_conversation()
-                
+
+    def get_system_content(self) -> str:
+        if self.cached_prompt:
+            return self.system_prompt + "\n" + self.cached_prompt
+        return self.system_prompt
 
     def reset_conversation(self):
-        self.messages = [{"role": "system", "content": self.system_prompt}]
+        self.messages = [{"role": "system", "content": self.get_system_content()}]
         
 
     @observe(as_type="generation", capture_input=False, capture_output=False)
-    def query(self, user_prompt: str) -> str:
-        if not self.use_history:
-            self.reset_conversation()
-        
-        self.messages.append({"role": "user", "content": user_prompt})
+    def query(self, user_prompt: str, stop_condition: Optional[Callable[[str], bool]] = None) -> str:
+        """
+        with a stop_condition, the reply is streamed and the stream is closed as soon as stop_condition(text so far) is true,
+        so the tokens after e.g. a closing tag are not generated
+        """
+        if self.use_history:
+            self.messages.append({"role": "user", "content": user_prompt})
+            messages = self.messages
+        else:
+            # a fresh conversation per query, kept local so concurrent queries do not mix their messages
+            messages = [{"role": "system", "content": self.get_system_content()}, {"role": "user", "content": user_prompt}]
         
         while True:
             try:
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    max_tokens=self.max_tokens,
-                    temperature=self.temperature,
-                    messages=self.messages
-                )
-                #completion = raw_response.parse()
-                assistant_message = response.choices[0].message.content
+                if stop_condition is None:
+                    response = self.client.chat.completions.create(
+                        model=self.model,
+                        max_tokens=self.max_tokens,
+                        temperature=self.temperature,
+                        messages=messages
+                    )
+                    #completion = raw_response.parse()
+                    assistant_message = response.choices[0].message.content
+                    usage = response.usage
+                else:
+                    assistant_message, usage = self._stream(messages, stop_condition)
+                if usage is not None:
+                    details = getattr(usage, "prompt_tokens_details", None)
+                    self.cache_usage.record(usage.prompt_tokens, getattr(details, "cached_tokens", None) or 0)
                 langfuse_context.update_current_observation(
-                    input=self.messages,
+                    input=messages,
                     model=self.model,
                     output=assistant_message,
                     usage={
-                        "input": response.usage.prompt_tokens,
-                        "output": response.usage.completion_tokens
-                    }
+                        "input": usage.prompt_tokens,
+                        "output": usage.completion_tokens
+                    } if usage is not None else None
                 )
                 if self.use_history:
                     self.messages.append({"role": "assistant", "content": assistant_message})
-                else:
-                    self.reset_conversation()
                 
                 print(f"OpenAIAssistant.query returning: {type(assistant_message)}")
                 return assistant_message
@@ -77,11 +96,38 @@ class OpenAIAssistant:
                 else:
                     raise e
             except APIError as e:
-                print("self.messages:", self.messages)
+                print("messages:", messages)
                 print(f'{datetime.now()}: query_gpt_model: APIError {e.message}: {e}')
                 print(f'{datetime.now()}: query_gpt_model: Retrying after 5 seconds...')
                 time.sleep(5)
 
+    def _stream(self, messages: list, stop_condition: Callable[[str], bool]) -> tuple:
+        """
+        stream the reply until it ends or stop_condition is true, closing the stream ends the generation.
+        returns the text and the usage, which comes with the last chunk only: None when the stream is stopped.
+        """
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        text = ""
+        usage = None
+        try:
+            for chunk in stream:
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    text += chunk.choices[0].delta.content
+                    if stop_condition(text):
+                        break
+        finally:
+            stream.close()
+        return text, usage
+
     def get_session_history(self) -> List[Dict[str, str]]:
         return self.messages if self.use_history else []
 
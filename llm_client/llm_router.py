@@ -2,10 +2,12 @@ import os
 from typing import Callable, Optional
 from abc import ABC, abstractmethod
 import time
-from ratelimit import limits, sleep_and_retry
+import threading
+from collections import deque
 from datetime import datetime, timedelta
 from token_estimation_utils import estimate_tokens
 from .config import LLMConfig
+from .cache_usage import CacheUsage
 # set up tracing, use relative import to avoid import errors since they are in the same path
 #from .langfuse_setup import observe, langfuse_context
 
@@ -14,9 +16,18 @@ from .config import LLMConfig
 
 class LLMInterface(ABC):
     @abstractmethod
-    def query(self, user_prompt: str) -> str:
+    def query(self, user_prompt: str, stop_condition: Optional[Callable[[str], bool]] = None) -> str:
+        """
+        with a stop_condition, the reply is streamed and stops as soon as stop_condition(text so far) is true
+        """
         pass
 
+    def _query_assistant(self, user_prompt: str, stop_condition: Optional[Callable[[str], bool]] = None):
+        # the stop condition is only passed when set, so the assistants without streaming still work
+        if stop_condition is None:
+            return self.assistant.query(user_prompt)
+        return self.assistant.query(user_prompt, stop_condition=stop_condition)
+
 
 class OpenAILLM(LLMInterface):
     def __init__(self, config: LLMConfig):
@@ -26,8 +37,8 @@ class OpenAILLM(LLMInterface):
         self.assistant = assistant_without_history
 
     #@observe(as_type="generation", capture_input=True, capture_output=True)
-    def query(self, user_prompt: str) -> str:
-        response = self.assistant.query(user_prompt)
+    def query(self, user_prompt: str, stop_condition: Optional[Callable[[str], bool]] = None) -> str:
+        response = self._query_assistant(user_prompt, stop_condition)
         while callable(response):
             response = response()
         
@@ -48,8 +59,8 @@ class VertexAILLM(LLMInterface):
         )
 
     #@observe(as_type="generation", capture_input=True, capture_output=True)
-    def query(self, user_prompt: str) -> str:
-        return self.assistant.query(user_prompt)
+    def query(self, user_prompt: str, stop_condition: Optional[Callable[[str], bool]] = None) -> str:
+        return self._query_assistant(user_prompt, stop_condition)
 
 class AnthropicLLM(LLMInterface):
     def __init__(self, config: LLMConfig):
@@ -58,8 +69,8 @@ class AnthropicLLM(LLMInterface):
         self.assistant = AnthropicAssistant(config, use_history=False)
 
     #@observe(as_type="generation", capture_input=True, capture_output=True)
-    def query(self, user_prompt: str) -> str:
-        return self.assistant.query(user_prompt)
+    def query(self, user_prompt: str, stop_condition: Optional[Callable[[str], bool]] = None) -> str:
+        return self._query_assistant(user_prompt, stop_condition)
 
 class LLMFactory: 
     
@@ -88,7 +99,12 @@ class LLMQueryManager:
         if not use_llm:
             raise ValueError("Please set the environment variable USE_LLM to either openai, gemini, or anthropic")
         
+        self.use_llm = use_llm
+        self.tier = tier
+        self.system_prompt = system_prompt
         self.llm = LLMFactory.get_llm(use_llm=use_llm, tier=tier, system_prompt=system_prompt, cached_prompt=cached_prompt)
+        # the LLMs of the other cached prompts passed to query, e.g. the instructions of each file type when gisting
+        self._cached_prompt_llms = {}
         self.max_calls = max_calls
         self.period = period
         self.max_tokens_per_min = max_tokens_per_min
@@ -100,6 +116,9 @@ class LLMQueryManager:
         self.tokens_used_this_minute = 0
         self.last_token_reset = datetime.now()
         self.last_day_reset = datetime.now().date()
+        # the manager is shared by concurrent queries (e.g. the gisting engine), the counters and the call window are guarded by the lock
+        self._lock = threading.Lock()
+        self._call_times = deque()
 
         # Pricing per million tokens (in USD)
         self.input_token_price = 3.00
@@ -117,34 +136,87 @@ class LLMQueryManager:
             self.last_token_reset = now
 
     def _update_token_usage(self, input_tokens: int, output_tokens: int):
-        self.input_tokens_used_today += input_tokens
-        self.output_tokens_used_today += output_tokens
-        self.tokens_used_this_minute += input_tokens + output_tokens
+        with self._lock:
+            self.input_tokens_used_today += input_tokens
+            self.output_tokens_used_today += output_tokens
+            # the input tokens are counted by _check_token_limits already
+            self.tokens_used_this_minute += output_tokens
 
     def _check_token_limits(self, estimated_tokens: int):
-        self._reset_token_counters()
-        if self.input_tokens_used_today + self.output_tokens_used_today + estimated_tokens > self.max_tokens_per_day:
-            raise Exception("Daily token limit exceeded")
-        if self.tokens_used_this_minute + estimated_tokens > self.max_tokens_per_min:
-            sleep_time = 60 - (datetime.now() - self.last_token_reset).total_seconds()
+        """
+        wait until the estimated input tokens fit in the per minute limit, and count them right away so the concurrent queries see them
+        """
+        while True:
+            with self._lock:
+                self._reset_token_counters()
+                if self.input_tokens_used_today + self.output_tokens_used_today + estimated_tokens > self.max_tokens_per_day:
+                    raise Exception("Daily token limit exceeded")
+                # a prompt bigger than the limit still goes out, alone in its minute
+                if self.tokens_used_this_minute == 0 or self.tokens_used_this_minute + estimated_tokens <= self.max_tokens_per_min:
+                    self.tokens_used_this_minute += estimated_tokens
+                    return
+                sleep_time = 60 - (datetime.now() - self.last_token_reset).total_seconds()
+            time.sleep(max(0, sleep_time))
+
+    def _acquire_call_slot(self):
+        """
+        wait until there are less than max_calls calls in the last period seconds
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._call_times and now - self._call_times[0] >= self.period:
+                    self._call_times.popleft()
+                if len(self._call_times) < self.max_calls:
+                    self._call_times.append(now)
+                    return
+                sleep_time = self.period - (now - self._call_times[0])
             time.sleep(max(0, sleep_time))
-            self._reset_token_counters()
 
-    @sleep_and_retry
-    @limits(calls=10, period=60)
-    def rate_limited_query(self, user_prompt: str) -> str:
+    def _llm_for(self, cached_prompt: str = None) -> LLMInterface:
+        """
+        the LLM with this cached prompt after the system prompt, created once per cached prompt so each one is a stable prefix
+        cached by the provider. the queries of all of them share the rate limits of this manager.
+        """
+        if cached_prompt is None:
+            return self.llm
+        with self._lock:
+            llm = self._cached_prompt_llms.get(cached_prompt)
+            if llm is None:
+                llm = LLMFactory.get_llm(use_llm=self.use_llm, tier=self.tier, system_prompt=self.system_prompt, cached_prompt=cached_prompt)
+                self._cached_prompt_llms[cached_prompt] = llm
+            return llm
+
+    def rate_limited_query(self, user_prompt: str, cached_prompt: str = None, stop_condition: Optional[Callable[[str], bool]] = None) -> str:
         input_tokens = estimate_tokens(user_prompt, self.encoding_name)
+        llm = self._llm_for(cached_prompt)
+        self._acquire_call_slot()
         self._check_token_limits(input_tokens)
         
-        response = self.llm.query(user_prompt)
+        if stop_condition is None:
+            response = llm.query(user_prompt)
+        else:
+            response = llm.query(user_prompt, stop_condition=stop_condition)
         
         output_tokens = estimate_tokens(response, self.encoding_name)
         self._update_token_usage(input_tokens, output_tokens)
         
         return response
 
-    def query(self, user_prompt: str) -> str:
-        return self.rate_limited_query(user_prompt)
+    def query(self, user_prompt: str, cached_prompt: str = None, stop_condition: Optional[Callable[[str], bool]] = None) -> str:
+        """
+        query the LLM, with cached_prompt instead of the cached prompt of the manager if set.
+        with a stop_condition, e.g. stop_conditions.stop_after("</File>"), the reply is streamed and stops as soon as
+        stop_condition(text so far) is true, the tokens which would follow are neither generated nor paid.
+        """
+        return self.rate_limited_query(user_prompt, cached_prompt, stop_condition)
+
+    def get_cache_usage(self) -> CacheUsage:
+        """
+        the prompt cache usage of the queries of all the LLMs of the manager
+        """
+        llms = [self.llm] + list(self._cached_prompt_llms.values())
+        return CacheUsage.merge(llm.assistant.cache_usage for llm in llms if hasattr(getattr(llm, "assistant", None), "cache_usage"))
 
     def get_total_tokens(self) -> tuple:
         return (self.input_tokens_used_today, self.output_tokens_used_today)
@@ -6,7 +6,10 @@ from functions import efficient_file_search, read_files, read_packages, process_
 from functions import make_api_call, make_db_query
 from functions import do_not_search_prompt
 from llm_client import LLMQueryManager, langfuse_context
+from config_utils import ensure_config_loaded
 from conversation_reviewer import ConversationReviewer
+from stop_conditions import next_steps_complete
+from keyword_index import project_keyword_index, default_file_extensions
 import logging
 import string
 # Set up logging
@@ -31,13 +34,26 @@ def not_found_terms(search_results: dict = None) -> str:
             result_str += f"\n{keyword}"
     return result_str
 
-def initiate_llm_query_manager(pf: Optional[ProjectFiles], system_prompt, reused_prompt_template, tier="tier1"):
+# the project tree in the cached prompt is cut down to this many tokens, set by prompt.project_tree_max_tokens in application.yml
+default_project_tree_max_tokens = 8000
+
+#FIXME: need to add the max_calls, period, max_tokens_per_min, max_tokens_per_day, encoding_name to application.yml
+# the rate limits of the query managers, also used to plan a gisting run
+query_manager_limits = dict(max_calls=1000, period=60, max_tokens_per_min=80000, max_tokens_per_day=2500000)
+
+def initiate_llm_query_manager(pf: Optional[ProjectFiles], system_prompt, reused_prompt_template, tier="tier1", project_tree_max_tokens=None):
+    # a no-op if the command loaded the configuration already
+    ensure_config_loaded()
     use_llm = os.environ.get("LLM_USE")
     # prompts can be reused and cached in the LLM if it is supported
     if pf is not None:
         package_notes = get_static_notes(pf)
-        project_tree = pf.to_tree()
-        file_notes = pf.get_file_notes()
+        if project_tree_max_tokens is None:
+            project_tree_max_tokens = int(os.environ.get("PROMPT_PROJECT_TREE_MAX_TOKENS", default_project_tree_max_tokens))
+        # only rendered if used, and memoized by pf
+        project_tree = pf.to_tree(max_tokens=project_tree_max_tokens) if reused_prompt_template and "{project_tree}" in reused_prompt_template else ""
+        # the notes of all the files are big, and read every summary of a lazily loaded project, only build them if used
+        file_notes = pf.get_file_notes() if reused_prompt_template and "{file_notes}" in reused_prompt_template else ""
     else:
         project_tree = ""
         package_notes = ""
@@ -47,13 +63,8 @@ def initiate_llm_query_manager(pf: Optional[ProjectFiles], system_prompt, reused
         package_notes=package_notes, file_notes=file_notes)
     else:
         cached_prompt = None
-    #FIXME: need to add the max_calls, period, max_tokens_per_min, max_tokens_per_day, encoding_name to application.yml
     query_manager = LLMQueryManager(use_llm=use_llm, tier=tier, system_prompt=system_prompt, cached_prompt=cached_prompt,
-                                    max_calls=1000,
-                                    period=60,
-                                    max_tokens_per_min=80000,
-                                    max_tokens_per_day=2500000,
-                                    encoding_name="cl100k_base")
+                                    encoding_name="cl100k_base", **query_manager_limits)
     
     return query_manager
 
@@ -88,8 +99,12 @@ def extract_and_process_next_steps(response: str, pf: ProjectFiles) -> str:
                 if keyword in global_search_results:
                     matching_files = global_search_results[keyword]
                 else:
-                    # Perform the actual search, with all the common extensions
-                    matching_files = efficient_file_search(pf.root_path, keyword, file_extensions=[".java", ".xml", ".yml", ".yaml", ".properties", ".sql", ".json"])           
+                    # looked up in the keyword index built by gist_files.py, or searched in the files without index
+                    keyword_index = project_keyword_index(pf.root_path)
+                    matching_files = keyword_index.search(keyword, default_file_extensions) if keyword_index is not None else None
+                    if matching_files is None:
+                        # Perform the actual search, with all the common extensions
+                        matching_files = efficient_file_search(pf.root_path, keyword, file_extensions=default_file_extensions)
                     # remember the search results so we don't have to search again
                     global_search_results[keyword] = matching_files
                 logger.info(f"Found matching files: {matching_files} for keyword: {keyword}")
@@ -141,9 +156,10 @@ def extract_and_process_next_steps(response: str, pf: ProjectFiles) -> str:
 def remove_next_steps(response) -> str:
     return response.replace("**Next Steps**", "AI requested more info").strip()
 
-def query_llm(query_manager, question, user_prompt_template, instruction_prompt, function_prompt, last_response, pf, iteration_number: str="", new_information: str="", key_findings: List[str]=[], reviewer: ConversationReviewer=None) -> Tuple[str, str, bool, List[str], str]:
+def query_llm(query_manager, question, user_prompt_template, instruction_prompt, function_prompt, last_response, pf, iteration_number: str="", new_information: str="", key_findings: List[str]=[], reviewer: ConversationReviewer=None, stop_after_next_steps: bool=False) -> Tuple[str, str, bool, List[str], str]:
     """
     query the LLM with the given question, user_prompt_template, instruction_prompt, last_response, pf, iteration_number, new_information, key_findings, reviewer
+    with stop_after_next_steps, the reply is streamed and stops at the end of its Next Steps section, which ends the replies asking for more information
     process the response and update the key findings
     review the conversation and decide whether to continue the conversation
     return new_information, response, should_conclude, key_findings, final_answer_prompt
@@ -168,7 +184,10 @@ def query_llm(query_manager, question, user_prompt_template, instruction_prompt,
     user_prompt = user_prompt_template.format(**filtered_params)
 
     # query LLM
-    response = query_manager.query(user_prompt)
+    if stop_after_next_steps:
+        response = query_manager.query(user_prompt, stop_condition=next_steps_complete)
+    else:
+        response = query_manager.query(user_prompt)
 
     # update the tracing with the iteration number
     langfuse_context.update_current_observation(tags=[iteration_number])
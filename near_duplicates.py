@@ -0,0 +1,166 @@
+import os
+import re
+import zlib
+import random
+import argparse
+from collections import defaultdict
+from projectfiles import CodeFile, read_file_with_fingerprint
+from java_structure import strip_comments
+
+_TOKEN = re.compile(r'\w+|[^\s\w]')
+_PACKAGE = re.compile(r'^\s*package\s+([\w.]+)\s*;', re.MULTILINE)
+# a Mersenne prime above the 32 bits hashes of the shingles
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def normalized_tokens(source: str, class_name: str) -> list[str]:
+    """
+    the tokens of the Java source without its comments, with its own class name and its package replaced by placeholders,
+    so two classes differing by their names only have the same tokens. the package is replaced in the package and import
+    statements only, the identifiers named like one of its segments (e.g. service) are kept.
+    """
+    source = strip_comments(source)
+    match = _PACKAGE.search(source)
+    if match:
+        source = re.sub(rf'^(\s*(?:package|import)\s+(?:static\s+)?){re.escape(match.group(1))}\b', r'\1$PACKAGE', source, flags=re.MULTILINE)
+    return ["$NAME" if token == class_name else token for token in _TOKEN.findall(source)]
+
+def shingles(tokens: list[str], size: int = 3) -> set[int]:
+    """
+    the 32 bits hashes of the runs of size tokens
+    """
+    if len(tokens) < size:
+        return {zlib.crc32(" ".join(tokens).encode("utf-8"))}
+    return {zlib.crc32(" ".join(tokens[i:i + size]).encode("utf-8")) for i in range(len(tokens) - size + 1)}
+
+def jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class MinHasher:
+    """
+    MinHash signatures of the shingle sets: the share of equal values of two signatures estimates the Jaccard similarity of the sets
+    """
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        generator = random.Random(seed)
+        self.permutations = [(generator.randrange(1, _PRIME), generator.randrange(0, _PRIME)) for _ in range(num_perm)]
+
+    def signature(self, shingle_set: set[int]) -> tuple:
+        return tuple(min(((a * s + b) % _PRIME) & _MAX_HASH for s in shingle_set) for a, b in self.permutations)
+
+
+def find_near_duplicates(project_root: str, files: list[CodeFile], threshold: float = 0.85, num_perm: int = 64, bands: int = 16,
+                         shingle_size: int = 3, fingerprints: dict = None) -> list[list[CodeFile]]:
+    """
+    the clusters of near-duplicate Java files, whose normalized sources have a Jaccard similarity of at least threshold.
+    the candidate pairs come from the bands of their MinHash signatures (locality sensitive hashing), and are checked on
+    their shingles. the largest file of a cluster comes first, it is the one to gist for the others: every other file
+    of the cluster is similar enough to it, not only to another member (A like B and B like C does not make C like A).
+    with fingerprints, the fingerprint of the content compared is set in it by path, a derived gist is made for that content.
+    """
+    shingle_sets = {}
+    for file in files:
+        if not file.filename.endswith(".java"):
+            continue
+        try:
+            source, fingerprint = read_file_with_fingerprint(os.path.join(project_root, file.path), errors="replace")
+        except OSError:
+            continue
+        if fingerprints is not None:
+            fingerprints[file.path] = fingerprint
+        shingle_sets[id(file)] = (file, shingles(normalized_tokens(source, file.filename[:-len(".java")]), shingle_size))
+
+    hasher = MinHasher(num_perm)
+    rows = num_perm // bands
+    buckets = defaultdict(list)
+    for key, (_, shingle_set) in shingle_sets.items():
+        signature = hasher.signature(shingle_set)
+        for band in range(bands):
+            buckets[(band, signature[band * rows:(band + 1) * rows])].append(key)
+
+    # union-find of the pairs similar enough
+    parent = {key: key for key in shingle_sets}
+
+    def find(key):
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    checked = set()
+    for keys in buckets.values():
+        for i, a in enumerate(keys):
+            for b in keys[i + 1:]:
+                if (a, b) in checked or find(a) == find(b):
+                    continue
+                checked.add((a, b))
+                if jaccard(shingle_sets[a][1], shingle_sets[b][1]) >= threshold:
+                    parent[find(a)] = find(b)
+
+    components = defaultdict(list)
+    for key, (file, _) in shingle_sets.items():
+        components[find(key)].append(file)
+    clusters = []
+    for component in components.values():
+        # the largest file left is the representative of the files similar enough to it, the others are clustered again
+        remaining = sorted(component, key=lambda f: -len(shingle_sets[id(f)][1]))
+        while len(remaining) > 1:
+            representative, *others = remaining
+            representative_shingles = shingle_sets[id(representative)][1]
+            members = [f for f in others if jaccard(representative_shingles, shingle_sets[id(f)][1]) >= threshold]
+            if members:
+                clusters.append([representative] + members)
+            remaining = [f for f in others if f not in members]
+    return clusters
+
+def derive_summary(summary: str, representative: CodeFile, member: CodeFile) -> str:
+    """
+    the summary of a near-duplicate of the representative, with the class name and package of the representative replaced by its own.
+    it starts with a note of where it comes from, the names in the code may still tell a different purpose.
+    """
+    representative_name = os.path.splitext(representative.filename)[0]
+    member_name = os.path.splitext(member.filename)[0]
+    summary = re.sub(rf'\b{re.escape(representative_name)}\b', member_name, summary)
+    if representative.package and member.package and representative.package != member.package:
+        summary = re.sub(rf'\b{re.escape(representative.package)}\b', member.package, summary)
+    summary = summary.replace(representative.filename, member.filename)
+    return f"\n(Derived from the gist of {representative.path}, a near-duplicate of this file)\n{summary.lstrip()}"
+
+def share_gists(clusters: list[list[CodeFile]], gisted: set[str], on_derived=None) -> list[CodeFile]:
+    """
+    set the derived summary of the other files of the clusters whose representative is gisted, return these files.
+    gisted is the paths of the files gisted by this run, the summary of a representative which failed or was not run
+    is the one of a previous run, which may not describe its current content.
+    on_derived(file) is called for each of them, e.g. to journal it.
+    """
+    derived = []
+    for representative, *members in clusters:
+        if representative.path not in gisted or not representative.summary:
+            continue
+        for member in members:
+            member.set_summary(derive_summary(representative.summary, representative, member))
+            if on_derived:
+                on_derived(member)
+            derived.append(member)
+    return derived
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List the near-duplicate Java files, which gist_files.py --dedupe gists once")
+    parser.add_argument("project_root", type=str, help="Path to the project root")
+    parser.add_argument("--threshold", type=float, default=0.85, help="Minimum similarity of the normalized sources, default 0.85")
+    args = parser.parse_args()
+
+    from project_scanner import ProjectScanner
+    from projectfiles import ProjectFiles
+    root_path = os.path.abspath(args.project_root)
+    pf = ProjectFiles(root_path, prefix_list=["src/main/java", "src/test/java"], suffix_list=[".java"], scanner=ProjectScanner(root_path))
+    java_files, _ = pf.scan_project()
+    clusters = find_near_duplicates(root_path, java_files, threshold=args.threshold)
+    for representative, *members in clusters:
+        print(f"{representative.path}")
+        for member in members:
+            print(f"    {member.path}")
+    saved = sum(len(cluster) - 1 for cluster in clusters)
+    print(f"\n{len(clusters)} clusters of near-duplicates, {saved} of {len(java_files)} files would get a derived gist, {saved} calls saved")
@@ -0,0 +1,206 @@
+import time
+import logging
+from projectfiles import ProjectFiles, hash_package_inputs
+from gisting_engine import GistingEngine
+
+logger = logging.getLogger(__name__)
+
+# the groups of a large package are gisted at the same time, up to this number, within the concurrency of the packages
+max_group_concurrency = 4
+# a package with notes of its files and sub packages above this is gisted in parts
+default_max_input_tokens = 30000
+# the cap of the notes of a package
+default_max_notes_tokens = 1500
+# the tokens of the "Part i of n: " header of the notes of a part, and of the cut mark of cap_notes
+part_header_tokens = 16
+
+
+def estimate_notes_tokens(text: str) -> int:
+    # about 4 characters per token, close enough to split the notes without loading a tokenizer
+    return (len(text) + 3) // 4
+
+def group_entries(entries: list[str], max_tokens: int) -> list[list[str]]:
+    """
+    consecutive groups of the entries of at most max_tokens, an entry larger than that is alone in its group
+    """
+    groups = []
+    current = []
+    current_tokens = 0
+    for entry in entries:
+        tokens = estimate_notes_tokens(entry)
+        if current and current_tokens + tokens > max_tokens:
+            groups.append(current)
+            current = []
+            current_tokens = 0
+        current.append(entry)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+def cap_notes(notes: str, max_tokens: int = None) -> str:
+    """
+    the notes cut to about max_tokens at the end of a paragraph, or of a line, so the notes higher in the tree stay bounded
+    """
+    if max_tokens is None or estimate_notes_tokens(notes) <= max_tokens:
+        return notes
+    max_chars = max_tokens * 4
+    cut = notes.rfind("\n\n", 0, max_chars)
+    if cut < max_chars // 2:
+        cut = notes.rfind("\n", 0, max_chars)
+    if cut < max_chars // 2:
+        cut = max_chars
+    return notes[:cut].rstrip() + "\n..."
+
+def _gist_all(gist_func, items: list) -> list:
+    engine = GistingEngine(gist_func, max_concurrency=max_group_concurrency, initial_concurrency=max_group_concurrency)
+    results = engine.run(items)
+    if engine.errors:
+        # the package is not summarized from some of its groups only
+        raise next(iter(engine.errors.values()))
+    return results
+
+def map_reduce_package(package: str, subpackage_entries: list[str], file_entries: list[str], package_gisting_func, reduce_func=None,
+                       max_input_tokens: int = None, max_notes_tokens: int = None) -> str:
+    """
+    the notes of a package, from package_gisting_func(package, subpackage_notes, filenotes) if its entries fit in max_input_tokens.
+    otherwise the sub packages and the files are split into groups of max_input_tokens, gisted concurrently as the parts of the
+    package, and their notes are combined by reduce_func(package, partial_notes), level by level while they do not fit in one prompt.
+    reduce_func defaults to package_gisting_func with the partial notes as the notes of the sub packages.
+    all the notes are capped to max_notes_tokens. the notes of parts which fill a prompt by themselves (e.g. without
+    max_notes_tokens) are cut to half of max_input_tokens, so every reduce fits in max_input_tokens.
+    """
+    if reduce_func is None:
+        def reduce_func(package, partial_notes):
+            return package_gisting_func(package, partial_notes, "")
+    subpackage_notes, filenotes = "".join(subpackage_entries), "".join(file_entries)
+    if max_input_tokens is None or estimate_notes_tokens(subpackage_notes + filenotes) <= max_input_tokens:
+        return cap_notes(package_gisting_func(package, subpackage_notes, filenotes), max_notes_tokens)
+
+    groups = ([("".join(group), "") for group in group_entries(subpackage_entries, max_input_tokens)] +
+              [("", "".join(group)) for group in group_entries(file_entries, max_input_tokens)])
+    logger.info(f"Package {package} is too large for one prompt, gisting it in {len(groups)} parts")
+
+    def gist_group(group):
+        part, (group_subpackage_notes, group_filenotes) = group
+        notes = package_gisting_func(f"{package} (part {part + 1} of {len(groups)})", group_subpackage_notes, group_filenotes)
+        return cap_notes(notes, max_notes_tokens)
+
+    def reduce_group(group):
+        return cap_notes(reduce_func(package, "".join(group)), max_notes_tokens)
+
+    def part_entries(notes_list):
+        return [f"Part {i + 1} of {len(notes_list)}: {notes}\n\n" for i, notes in enumerate(notes_list)]
+
+    partial_notes = _gist_all(gist_group, list(enumerate(groups)))
+    entries = part_entries(partial_notes)
+    while estimate_notes_tokens("".join(entries)) > max_input_tokens:
+        reduce_groups = group_entries(entries, max_input_tokens)
+        if len(reduce_groups) == len(entries):
+            # each part fills a prompt by itself, the notes are cut so at least two parts fit in one prompt
+            partial_notes = [cap_notes(notes, max(1, max_input_tokens // 2 - part_header_tokens)) for notes in partial_notes]
+            entries = part_entries(partial_notes)
+            reduce_groups = group_entries(entries, max_input_tokens)
+            if len(reduce_groups) == len(entries):
+                break
+        partial_notes = _gist_all(reduce_group, reduce_groups)
+        entries = part_entries(partial_notes)
+    # with a max_input_tokens too small for two parts, the input of the last call is cut to it
+    return cap_notes(reduce_func(package, cap_notes("".join(entries), max_input_tokens)), max_notes_tokens)
+
+
+def package_dag(packages: dict) -> tuple[list, dict]:
+    """
+    the packages of the package tree (ProjectFiles.packages) as (package, sub packages, file names), the sub packages first,
+    and for each of them the indexes of its sub packages, the dependencies of GistingEngine.run
+    """
+    nodes = []
+    dependencies = {}
+
+    def visit(tree) -> list[int]:
+        indexes = []
+        for package, value in sorted(tree.items(), reverse=True):
+            sub_indexes = visit(value["sub_packages"])
+            nodes.append((package, value["sub_packages"], value["files"]))
+            dependencies[len(nodes) - 1] = sub_indexes
+            indexes.append(len(nodes) - 1)
+        return indexes
+
+    visit(packages)
+    return nodes, dependencies
+
+def gist_packages_concurrently(pf: ProjectFiles, max_concurrency: int = 8, persist_interval: float = 60, verbose: bool = True,
+                               incremental: bool = False, max_input_tokens: int = None, max_notes_tokens: int = None,
+                               reduce_func=None) -> GistingEngine:
+    """
+    gist the packages bottom-up with pf.package_gisting_func, as package_structure_traverse does, but each package as soon as
+    all its sub packages have notes: the independent sub trees are gisted concurrently, up to max_concurrency calls at a time.
+    the notes are persisted every persist_interval seconds while gisting (None to leave it to the caller).
+
+    the hash of the inputs of each note (the summaries of its files and the notes of its sub packages) is recorded with it.
+    with incremental, a package whose inputs have the same hash keeps its notes: only the packages above a changed file are
+    gisted again, up to the root, and the propagation stops at a package whose new notes are the same as before.
+    the notes of the packages gone from the project are removed.
+
+    a package whose inputs are above max_input_tokens is gisted in parts, see map_reduce_package, and the notes are capped
+    to max_notes_tokens.
+
+    returns the engine, whose errors and blocked tell the packages which are not gisted (by their index in package_dag).
+    """
+    if pf.package_gisting_func is None:
+        raise ValueError("package_gisting_func is not set!")
+    nodes, dependencies = package_dag(pf.packages)
+    last_persist = time.monotonic()
+    if incremental:
+        packages = {node[0] for node in nodes}
+        for package in [package for package in pf.package_notes if package not in packages]:
+            del pf.package_notes[package]
+            pf.package_input_hashes.pop(package, None)
+
+    def gist_node(node):
+        package, subpackages, filenames = node
+        for filename in filenames:
+            pf.check_code_file_exists(package, filename)
+        # the sub packages are done, their notes were added by on_progress before this package was sent
+        subpackage_entries, file_entries = pf.package_gisting_entries(package, subpackages, filenames)
+        notes = map_reduce_package(package, subpackage_entries, file_entries, pf.package_gisting_func, reduce_func,
+                                   max_input_tokens, max_notes_tokens)
+        return notes, hash_package_inputs("".join(subpackage_entries), "".join(file_entries))
+
+    def unchanged_node(node):
+        package, subpackages, filenames = node
+        if not pf.package_notes.get(package) or package not in pf.package_input_hashes:
+            return None
+        try:
+            input_hash = hash_package_inputs(*pf.package_gisting_inputs(package, subpackages, filenames))
+        except Exception:
+            # e.g. a file without summary, gist_node reports it
+            return None
+        return (None, input_hash) if pf.package_input_hashes[package] == input_hash else None
+
+    def on_progress(completed, total, index, node, result, error):
+        nonlocal last_persist
+        package = node[0]
+        if error is not None:
+            print(f"Failed package {completed}/{total}: {package}: {error}")
+            return
+        notes, input_hash = result
+        if notes is None:
+            # unchanged, keeps its notes
+            return
+        if verbose:
+            print(f"Processed package {completed}/{total}: {package}")
+        pf.add_package_notes(package, notes, input_hash)
+        if persist_interval is not None and time.monotonic() - last_persist >= persist_interval:
+            pf.persist_package_notes()
+            last_persist = time.monotonic()
+
+    engine = GistingEngine(gist_node, max_concurrency=max_concurrency, progress_callback=on_progress,
+                           skip=unchanged_node if incremental else None)
+    engine.run(nodes, dependencies)
+    if incremental:
+        print(f"{len(nodes) - len(engine.skipped) - len(engine.errors) - len(engine.blocked)} packages gisted again, "
+              f"{len(engine.skipped)} unchanged")
+    if engine.blocked:
+        logger.error(f"{len(engine.blocked)} packages not gisted since one of their sub packages failed")
+    return engine
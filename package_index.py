@@ -0,0 +1,83 @@
+class PackageIndex:
+    """
+    the package tree of the code files, maintained incrementally by add_file and remove_file.
+
+    tree is the nested dict built by ProjectFiles.generate_package_structure, {package: {"files": [filename], "sub_packages": {...}}},
+    it stays plain (json serializable) since it is shown to the LLM and used by the traversals.
+    nodes maps every package to its node in the tree, and code_files maps every package to its CodeFile objects by filename,
+    so a package, its sub packages and its files are found without walking the tree.
+    revision is increased on every change, so derived data (e.g. the rendered tree) can be cached per revision.
+    """
+    def __init__(self, files=None):
+        self.tree = {}
+        self.nodes = {}       # package -> node in the tree
+        self.code_files = {}  # package -> {filename: [CodeFile]}, e.g. package-info.java in main and test
+        self.revision = 0
+        for file in files or []:
+            self.add_file(file)
+
+    def _ensure_node(self, package: str) -> dict:
+        node = self.nodes.get(package)
+        if node is not None:
+            return node
+        parent, _, _ = package.rpartition(".")
+        siblings = self._ensure_node(parent)["sub_packages"] if parent else self.tree
+        node = siblings[package] = {"files": [], "sub_packages": {}}
+        self.nodes[package] = node
+        return node
+
+    def add_file(self, file):
+        self._ensure_node(file.package)["files"].append(file.filename)
+        self.code_files.setdefault(file.package, {}).setdefault(file.filename, []).append(file)
+        self.revision += 1
+
+    def remove_file(self, file) -> bool:
+        """
+        remove the file, and the packages left without files and sub packages. returns False if the file is not indexed
+        """
+        files = self.code_files.get(file.package, {}).get(file.filename, [])
+        if not any(f is file for f in files):
+            return False
+        files[:] = [f for f in files if f is not file]
+        if not files:
+            del self.code_files[file.package][file.filename]
+        self.nodes[file.package]["files"].remove(file.filename)
+        self._prune(file.package)
+        self.revision += 1
+        return True
+
+    def _prune(self, package: str):
+        # the default package "" is a top level package too
+        while package is not None:
+            node = self.nodes[package]
+            if node["files"] or node["sub_packages"]:
+                return
+            parent, _, _ = package.rpartition(".")
+            siblings = self.nodes[parent]["sub_packages"] if parent else self.tree
+            del siblings[package]
+            del self.nodes[package]
+            self.code_files.pop(package, None)
+            package = parent or None
+
+    def node(self, package: str) -> dict:
+        return self.nodes.get(package)
+
+    def subtree(self, package: str) -> dict:
+        """
+        the tree rooted at the package, {package: node}, to traverse a single package and its sub packages
+        """
+        node = self.nodes.get(package)
+        return {package: node} if node is not None else {}
+
+    def code_files_of(self, package: str) -> list:
+        return [f for files in self.code_files.get(package, {}).values() for f in files]
+
+    def find_code_file(self, package: str, filename: str):
+        files = self.code_files.get(package, {}).get(filename)
+        return files[0] if files else None
+
+    def __contains__(self, package: str) -> bool:
+        return package in self.nodes
+
+    def __len__(self) -> int:
+        return len(self.nodes)
@@ -0,0 +1,247 @@
+import os
+import re
+import sys
+import argparse
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from projectfiles import ProjectFiles, adopt_summaries
+
+
+class ProjectModule:
+    """
+    a module of a Maven or Gradle build, the path is relative to the project root ("" for the root module)
+    """
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.path = path
+
+    def prefix_list(self, prefix_list: list[str]) -> list[str]:
+        return [f"{self.path}/{prefix}" if self.path else prefix for prefix in prefix_list]
+
+    def __repr__(self):
+        return f"ProjectModule(name={self.name}, path={self.path})"
+
+
+def _xml_children(element, tag: str):
+    # pom.xml usually has the maven namespace, match the local name only
+    return [child for child in element if child.tag == tag or child.tag.endswith("}" + tag)]
+
+
+def find_maven_modules(root_path: str, rel_dir: str = "", seen: set[str] = None) -> list[str]:
+    """
+    the module folders (relative to the project root) declared in the <modules> of pom.xml, including profiles, recursively
+    """
+    seen = set() if seen is None else seen
+    pom_path = os.path.join(root_path, rel_dir, "pom.xml")
+    if rel_dir in seen or not os.path.isfile(pom_path):
+        return []
+    seen.add(rel_dir)
+    try:
+        project = ET.parse(pom_path).getroot()
+    except ET.ParseError as e:
+        print(f"Error parsing {pom_path}: {e}")
+        return []
+    module_elements = []
+    for parent in [project] + [p for profiles in _xml_children(project, "profiles") for p in _xml_children(profiles, "profile")]:
+        for modules in _xml_children(parent, "modules"):
+            module_elements.extend(_xml_children(modules, "module"))
+    found = []
+    for element in module_elements:
+        module = (element.text or "").strip()
+        if not module:
+            continue
+        # a module may point to its pom file instead of its folder
+        if module.endswith(".xml"):
+            module = os.path.dirname(module)
+        module_dir = os.path.normpath(os.path.join(rel_dir, module)).replace(os.sep, "/")
+        if module_dir in seen or module_dir.startswith(".."):
+            continue
+        found.append(module_dir)
+        found.extend(find_maven_modules(root_path, module_dir, seen))
+    return found
+
+
+def find_gradle_modules(root_path: str) -> list[str]:
+    """
+    the module folders (relative to the project root) included in settings.gradle or settings.gradle.kts
+    """
+    for settings_file in ["settings.gradle", "settings.gradle.kts"]:
+        settings_path = os.path.join(root_path, settings_file)
+        if os.path.isfile(settings_path):
+            break
+    else:
+        return []
+    with open(settings_path, "r", errors="ignore") as f:
+        settings = re.sub(r"//.*", "", f.read())
+    # project(':app').projectDir = file('apps/app') or new File(settingsDir, 'apps/app')
+    project_dirs = {name: path for name, path in re.findall(
+        r"""project\(\s*['"](:?[^'"]+)['"]\s*\)\.projectDir\s*=\s*(?:file\(|new\s+File\(\s*(?:rootDir|settingsDir)\s*,)\s*['"]([^'"]+)['"]""", settings)}
+    found = []
+    for statement in re.findall(r"^\s*include\b\(?(.*)$", settings, re.MULTILINE):
+        for project in re.findall(r"""['"]([^'"]+)['"]""", statement):
+            project = project if project.startswith(":") else ":" + project
+            path = project_dirs.get(project) or project_dirs.get(project[1:]) or project[1:].replace(":", "/")
+            path = os.path.normpath(path).replace(os.sep, "/")
+            if path not in found:
+                found.append(path)
+    return found
+
+
+def discover_modules(root_path: str, prefix_list: list[str] = None) -> list[ProjectModule]:
+    """
+    the modules of the project with at least one source root, from the maven reactor and the gradle settings.
+    a project without modules is a single root module.
+    """
+    prefix_list = prefix_list or ProjectModules.default_prefix_list
+    module_dirs = [""] + find_maven_modules(root_path) + find_gradle_modules(root_path)
+    modules = []
+    for module_dir in dict.fromkeys(module_dirs):
+        module = ProjectModule(module_dir or ProjectModules.root_module_name, module_dir)
+        if any(os.path.isdir(os.path.join(root_path, prefix)) for prefix in module.prefix_list(prefix_list)):
+            modules.append(module)
+    if not modules:
+        modules = [ProjectModule(ProjectModules.root_module_name, "")]
+    return modules
+
+
+class ProjectModules:
+    """
+    the modules of a multi-module project, each one gisted into its own shard .gist/modules/<module path>/ so it can be
+    scanned, gisted and loaded independently. a single-module project keeps using .gist directly.
+    """
+    default_prefix_list = ["src/main/java", "src/main/resources", "src/test/java", "src/test/resources"]
+    root_module_name = "_root"
+    default_modules_folder = "modules"
+
+    def __init__(self, root_path: str, prefix_list: list[str] = None, modules: list[ProjectModule] = None):
+        self.root_path = root_path
+        self.prefix_list = prefix_list or self.default_prefix_list
+        self.modules = modules if modules is not None else discover_modules(root_path, self.prefix_list)
+
+    def is_multi_module(self) -> bool:
+        return len(self.modules) > 1 or self.modules[0].path != ""
+
+    def select(self, module_names: list[str] = None) -> list[ProjectModule]:
+        """
+        the modules with the given names (or paths), all of them if no name is given
+        """
+        if not module_names:
+            return self.modules
+        selected = [m for m in self.modules if m.name in module_names or m.path in module_names]
+        unknown = set(module_names) - {m.name for m in selected} - {m.path for m in selected}
+        if unknown:
+            raise ValueError(f"unknown modules {sorted(unknown)}, the modules are {[m.name for m in self.modules]}")
+        return selected
+
+    def gist_file_path(self, module: ProjectModule) -> str:
+        gist_folder = os.path.join(self.root_path, ProjectFiles.default_gist_foler)
+        if self.is_multi_module():
+            gist_folder = os.path.join(gist_folder, self.default_modules_folder, *module.name.split("/"))
+        return os.path.join(gist_folder, ProjectFiles.default_codefile_gist_file)
+
+    def module_of(self, path: str) -> ProjectModule:
+        """
+        the module of the file path relative to the project root, the one of the longest path, None if there is none
+        """
+        path = path.replace(os.sep, "/")
+        matching = [m for m in self.modules if not m.path or path.startswith(m.path + "/")]
+        return max(matching, key=lambda m: len(m.path), default=None)
+
+    def whole_project_files(self, modules: list[ProjectModule]) -> dict[str, list]:
+        """
+        the files of the gist of the project as a whole (.gist/code_files.txt, from before it was split into module shards)
+        by module name, for the modules without shard. empty if there is no such gist.
+        """
+        modules = [m for m in modules if not self.is_gisted(m)]
+        pf = ProjectFiles(self.root_path)
+        gist_file_path = os.path.join(self.root_path, ProjectFiles.default_gist_foler, ProjectFiles.default_codefile_gist_file)
+        if not self.is_multi_module() or not modules or not pf.persistence.code_files_exist(gist_file_path):
+            return {}
+        names = {m.name for m in modules}
+        files = {}
+        for file in pf.load_code_files(gist_file_path):
+            module = self.module_of(file.path)
+            if module is not None and module.name in names:
+                files.setdefault(module.name, []).append(file)
+        return files
+
+    def is_gisted(self, module: ProjectModule) -> bool:
+        gist_file_path = self.gist_file_path(module)
+        return ProjectFiles(self.root_path, gist_file_path=gist_file_path).persistence.code_files_exist(gist_file_path)
+
+    def project_files(self, module: ProjectModule, prefix_list: list[str] = None, **kwargs) -> ProjectFiles:
+        """
+        a ProjectFiles limited to the source roots of the module, the other arguments are passed to ProjectFiles
+        """
+        return ProjectFiles(self.root_path, prefix_list=module.prefix_list(prefix_list or self.prefix_list),
+                            gist_file_path=self.gist_file_path(module), **kwargs)
+
+    def _map(self, func, modules: list[ProjectModule], max_workers: int = None) -> list:
+        max_workers = max_workers or max(1, min(8, len(modules)))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(func, modules))
+
+    def from_project(self, module_names: list[str] = None, max_workers: int = None, **kwargs) -> list[tuple[ProjectModule, ProjectFiles]]:
+        """
+        scan the modules concurrently and merge them with their gist shards, one ProjectFiles per module.
+        the other arguments are passed to ProjectFiles, e.g. a project_scanner.ProjectScanner to skip the ignored files.
+        a module without shard of a project gisted as a whole before takes the summaries of its files from that gist,
+        they are persisted to its shard by the next persist_code_files.
+        """
+        selected = self.select(module_names)
+        whole_project_files = self.whole_project_files(selected)
+        whole_gist_file_path = os.path.join(self.root_path, ProjectFiles.default_gist_foler, ProjectFiles.default_codefile_gist_file)
+
+        def scan(module):
+            pf = self.project_files(module, **kwargs)
+            pf.from_project(pf.gist_file_path)
+            if module.name in whole_project_files:
+                adopt_summaries(pf.files + pf.resource_files, whole_project_files[module.name])
+                pf.loaded_gist_file_path = whole_gist_file_path
+            return module, pf
+        return self._map(scan, selected, max_workers)
+
+    def load(self, module_names: list[str] = None, lazy: bool = False, max_workers: int = None) -> ProjectFiles:
+        """
+        load the gist shards of the modules concurrently into one ProjectFiles.
+        the notes of a package split over several modules are joined.
+        """
+        selected = self.select(module_names)
+        if not self.is_multi_module() or not any(self.is_gisted(m) for m in selected):
+            # a single module, or a project gisted as a whole before it was split into shards
+            pf = ProjectFiles(self.root_path)
+            pf.from_gist_files(lazy=lazy)
+            return pf
+
+        def load_module(module):
+            pf = self.project_files(module)
+            pf.from_gist_files(pf.gist_file_path, lazy=lazy)
+            return pf
+        parts = self._map(load_module, [m for m in selected if self.is_gisted(m)], max_workers)
+        # the modules not gisted since the project was gisted as a whole keep the files of that gist
+        whole_project_files = [f for files in self.whole_project_files(selected).values() for f in files]
+
+        merged = ProjectFiles(self.root_path)
+        merged.from_files([f for pf in parts for f in pf.files] + [f for f in whole_project_files if f.package != "resources"],
+                          [f for pf in parts for f in pf.resource_files] + [f for f in whole_project_files if f.package == "resources"])
+        for pf in parts:
+            for package, notes in pf.package_notes.items():
+                merged.package_notes[package] = f"{merged.package_notes[package]}\n\n{notes}" if merged.package_notes.get(package) else notes
+        return merged
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List the modules of a Maven or Gradle project")
+    parser.add_argument("project_root", type=str, help="Path to the project root")
+    args = parser.parse_args()
+
+    root_path = os.path.abspath(args.project_root)
+    if not os.path.exists(root_path):
+        print(f"Error: {root_path} does not exist")
+        sys.exit(1)
+
+    project_modules = ProjectModules(root_path)
+    for module in project_modules.modules:
+        gist_file_path = project_modules.gist_file_path(module)
+        status = "gisted" if project_modules.is_gisted(module) else "not gisted"
+        print(f"{module.name}: {module.path or '.'} ({status}, {os.path.relpath(gist_file_path, root_path)})")
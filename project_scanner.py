@@ -0,0 +1,201 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from projectfiles import CodeFile
+
+
+def _glob_to_regex(pattern: str) -> str:
+    regex = ""
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            regex += ".*"
+            i += 2
+            continue
+        if c == "*":
+            regex += "[^/]*"
+        elif c == "?":
+            regex += "[^/]"
+        elif c == "[":
+            end = pattern.find("]", i + 1)
+            if end == -1:
+                regex += re.escape(c)
+            else:
+                regex += "[" + pattern[i + 1:end].replace("\\", "\\\\") + "]"
+                i = end
+        else:
+            regex += re.escape(c)
+        i += 1
+    return regex
+
+
+class GitIgnore:
+    """
+    the rules of one .gitignore file, matched against paths relative to the folder of the file.
+    supports comments, negation, directory-only and anchored patterns, and * ? [] ** globs; the last matching rule wins.
+    """
+    def __init__(self, lines: list[str]):
+        self.rules = []  # (regex, negated, dir_only)
+        for line in lines:
+            line = line.rstrip("\n").rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negated = line.startswith("!")
+            if negated:
+                line = line[1:]
+            if line.startswith("\\"):
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.strip("/") if dir_only else line
+            if "/" in line:
+                # anchored to the folder of the .gitignore
+                regex = "^" + _glob_to_regex(line.lstrip("/")) + "$"
+            else:
+                # matches the name at any depth
+                regex = "(?:^|/)" + _glob_to_regex(line) + "$"
+            self.rules.append((re.compile(regex), negated, dir_only))
+
+    @staticmethod
+    def from_file(path: str) -> "GitIgnore":
+        with open(path, "r", errors="ignore") as f:
+            return GitIgnore(f.readlines())
+
+    def match(self, rel_path: str, is_dir: bool):
+        """
+        True if ignored, False if explicitly not ignored (negated), None if no rule matches
+        """
+        result = None
+        for regex, negated, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.search(rel_path):
+                result = not negated
+        return result
+
+
+class ProjectScanner:
+    """
+    find the code and resource files of a project in one pass per prefix root, the roots are walked concurrently with os.scandir.
+    directories and files ignored by .gitignore files (at the project root and in the walked folders) are skipped, as well as
+    build output folders, except the ones inside src/main or src/test where they are regular packages.
+    """
+    always_ignored_dirs = {".git", ".gist", ".svn", ".hg"}
+    default_ignored_dirs = {"target", "build", "out", "bin", "node_modules", ".gradle", ".mvn", ".idea", ".vscode",
+                            "generated-sources", "generated-test-sources"}
+    source_folder_pattern = re.compile(r"(?:^|/)src/(?:main|test)/")
+
+    def __init__(self, root_path: str, ignored_dirs: set[str] = None, use_gitignore: bool = True, max_workers: int = None):
+        self.root_path = root_path
+        self.ignored_dirs = self.default_ignored_dirs if ignored_dirs is None else set(ignored_dirs)
+        self.use_gitignore = use_gitignore
+        self.max_workers = max_workers
+        self._gitignores = {}  # folder relative to root -> GitIgnore or None
+
+    def _gitignore_of(self, rel_dir: str):
+        if rel_dir not in self._gitignores:
+            path = os.path.join(self.root_path, rel_dir, ".gitignore")
+            self._gitignores[rel_dir] = GitIgnore.from_file(path) if os.path.isfile(path) else None
+        return self._gitignores[rel_dir]
+
+    def _gitignore_chain(self, rel_dir: str) -> list[tuple[str, GitIgnore]]:
+        """
+        the .gitignore files which apply to the folder, from the project root down to the folder itself
+        """
+        parts = rel_dir.split("/") if rel_dir else []
+        chain = []
+        for depth in range(len(parts) + 1):
+            folder = "/".join(parts[:depth])
+            gitignore = self._gitignore_of(folder) if self.use_gitignore else None
+            if gitignore is not None:
+                chain.append((folder, gitignore))
+        return chain
+
+    def _is_ignored(self, rel_path: str, is_dir: bool, chain: list[tuple[str, GitIgnore]]) -> bool:
+        name = rel_path.rsplit("/", 1)[-1]
+        if is_dir and name in self.always_ignored_dirs:
+            return True
+        if is_dir and name in self.ignored_dirs and not self.source_folder_pattern.search(rel_path):
+            return True
+        # the deepest .gitignore with a matching rule wins
+        ignored = None
+        for folder, gitignore in chain:
+            matched = gitignore.match(rel_path[len(folder) + 1:] if folder else rel_path, is_dir)
+            if matched is not None:
+                ignored = matched
+        return bool(ignored)
+
+    def is_ignored(self, rel_path: str, is_dir: bool) -> bool:
+        return self._is_ignored(rel_path, is_dir, self._gitignore_chain(rel_path.rpartition("/")[0]))
+
+    def find_files(self, folder: str, suffixes: tuple[str, ...]) -> list[str]:
+        """
+        relative paths (to the project root) of the files under the folder with one of the suffixes, in os.walk order
+        """
+        return [path for path, _ in self._walk(folder, [tuple(suffixes)])]
+
+    def _walk(self, folder: str, suffix_groups: list[tuple[str, ...]]):
+        """
+        yield (relative path, indexes of the matching suffix groups) for the files under the folder, in os.walk order
+        """
+        rel_folder = os.path.relpath(folder, self.root_path).replace(os.sep, "/")
+        if rel_folder == ".":
+            rel_folder = ""
+        stack = [(folder, rel_folder, self._gitignore_chain(rel_folder))]
+        while stack:
+            current, rel_current, chain = stack.pop()
+            subdirs = []
+            try:
+                with os.scandir(current) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            for entry in entries:
+                rel_path = f"{rel_current}/{entry.name}" if rel_current else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if not self._is_ignored(rel_path, True, chain):
+                        gitignore = self._gitignore_of(rel_path) if self.use_gitignore else None
+                        subdirs.append((entry.path, rel_path, chain + [(rel_path, gitignore)] if gitignore else chain))
+                    continue
+                groups = [i for i, suffixes in enumerate(suffix_groups) if suffixes and entry.name.endswith(suffixes)]
+                if groups and not self._is_ignored(rel_path, False, chain):
+                    yield rel_path, groups
+            # depth first, in directory order, as os.walk does
+            stack.extend(reversed(subdirs))
+
+    def _scan_prefix(self, prefix: str, suffixes: tuple[str, ...], resource_suffixes: tuple[str, ...]):
+        folder = os.path.join(self.root_path, prefix)
+        files, resource_files = [], []
+        if not os.path.isdir(folder):
+            return files, resource_files
+        is_resource_folder = prefix.endswith("resources")
+        suffix_groups = [suffixes, resource_suffixes if is_resource_folder else ()]
+        prefix_len = len(os.path.relpath(folder, self.root_path).replace(os.sep, "/")) + 1
+        for rel_path, groups in self._walk(folder, suffix_groups):
+            directory, _, filename = rel_path.rpartition("/")
+            if 0 in groups:
+                package = directory[prefix_len:].replace("/", ".")
+                files.append(CodeFile(filename, rel_path, package))
+            if 1 in groups:
+                resource_files.append(CodeFile(filename, rel_path, "resources"))
+        return files, resource_files
+
+    def scan(self, prefix_list: list[str], suffix_list: list[str], resource_suffix_list: list[str]) -> tuple[list[CodeFile], list[CodeFile]]:
+        """
+        return the code files and the resource files under the prefix folders, the same as
+        ProjectFiles.get_files_of_project() and ProjectFiles.get_resource_files() but in one pass
+        """
+        suffixes = tuple(suffix_list)
+        resource_suffixes = tuple(resource_suffix_list)
+        max_workers = self.max_workers or max(1, min(32, len(prefix_list)))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(lambda prefix: self._scan_prefix(prefix, suffixes, resource_suffixes), prefix_list))
+        files, resource_files = [], []
+        for prefix_files, prefix_resource_files in results:
+            files.extend(prefix_files)
+            resource_files.extend(prefix_resource_files)
+        return files, resource_files
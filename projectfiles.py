@@ -1,19 +1,47 @@
 from collections import defaultdict
 import os
+import sys
 import json
+import io
+import hashlib
+import mmap
 from abc import ABC, abstractmethod
+from package_index import PackageIndex
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
 
 class CodeFile:
+    """
+    a code file of the project and its summary.
+    the attributes are slots, and the package and the directory of the path are interned, since they are shared
+    by many files; a 100k-file project holds them once instead of once per file (see benchmarks/bench_codefile_memory.py).
+    """
+    __slots__ = ("filename", "package", "summary", "content_hash", "mtime_ns", "size", "_dir", "_base")
+
     def __init__(self, filename, path, package):
         self.filename = filename
         self.path = path
-        self.package = package
+        self.package = _intern(package)
         self.summary = ""
+        # fingerprint of the content the summary was made from, used by the incremental gisting
+        self.content_hash = ""
+        self.mtime_ns = 0
+        self.size = 0
         #self.imports = ""
         #self.functions = ""
         #self.todo_comments = ""
-        # a function to gist packages, only used in the package_structure_traverse
-        self.package_gisting_func = None
+
+    @property
+    def path(self):
+        return f"{self._dir}/{self._base}" if self._dir else self._base
+
+    @path.setter
+    def path(self, path):
+        directory, _, base = path.rpartition("/")
+        self._dir = _intern(directory)
+        # the last part of the path is usually the file name, share it instead of keeping a copy
+        self._base = self.filename if base == self.filename else base
 
     def set_details(self, summary):
         self.summary = summary
@@ -27,14 +55,31 @@ class CodeFile:
     def get_summary(self):
         return self.summary
 
+    def set_fingerprint(self, content_hash, mtime_ns, size):
+        self.content_hash = content_hash
+        self.mtime_ns = mtime_ns
+        self.size = size
+
+    def to_dict(self):
+        return {
+            "filename": self.filename,
+            "path": self.path,
+            "package": self.package,
+            "summary": self.summary,
+            "content_hash": self.content_hash,
+            "mtime_ns": self.mtime_ns,
+            "size": self.size,
+        }
+
     def to_json(self):
-        return json.dumps(self, default=lambda o: o.__dict__, indent=4)
+        return json.dumps(self.to_dict(), indent=4)
 
     @staticmethod
     def from_json(json_str):
         data = json.loads(json_str)
         code_file = CodeFile(data['filename'], data['path'], data['package'])
         code_file.set_details(data.get('summary', ''))
+        code_file.set_fingerprint(data.get('content_hash', ''), data.get('mtime_ns', 0), data.get('size', 0))
 
         return code_file
 
@@ -44,12 +89,93 @@ class CodeFile:
     def __repr__(self):
         return f"CodeFile(filename={self.filename!r}, path={self.path!r}, package={self.package!r}, summary={self.summary!r})"
 
+# the slot of CodeFile.summary, LazyCodeFile keeps the loaded summary in it
+_summary_slot = CodeFile.summary
+
+class LazyCodeFile(CodeFile):
+    """
+    a CodeFile whose summary is read from the gist store only when it is accessed the first time.
+    summary_source is anything with read_summary(path), e.g. a GistFileIndex.
+    """
+    __slots__ = ("_summary_source",)
+
+    def __init__(self, filename, path, package, summary_source):
+        super().__init__(filename, path, package)
+        self._summary_source = summary_source
+        # None means not loaded yet
+        _summary_slot.__set__(self, None)
+
+    @property
+    def summary(self):
+        summary = _summary_slot.__get__(self)
+        if summary is None:
+            summary = self._summary_source.read_summary(self.path)
+            _summary_slot.__set__(self, summary)
+        return summary
+
+    @summary.setter
+    def summary(self, summary):
+        _summary_slot.__set__(self, summary)
+
+    def is_summary_loaded(self) -> bool:
+        return _summary_slot.__get__(self) is not None
+
+def hash_file_content(full_path) -> str:
+    h = hashlib.sha256()
+    with open(full_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def adopt_summaries(files: list[CodeFile], existing_files: list[CodeFile]) -> set[str]:
+    """
+    set the summary and fingerprint of the existing file of the same path on each file, return the normalized paths found
+    """
+    existing_by_path = {os.path.normpath(f.path): f for f in existing_files}
+    found_paths = set()
+    for new_file in files:
+        existing_file = existing_by_path.get(os.path.normpath(new_file.path))
+        if existing_file and existing_file.filename == new_file.filename:
+            new_file.summary = existing_file.summary
+            new_file.set_fingerprint(existing_file.content_hash, existing_file.mtime_ns, existing_file.size)
+            found_paths.add(os.path.normpath(new_file.path))
+    return found_paths
+
+def file_fingerprint(full_path) -> tuple[str, int, int]:
+    """
+    return (content hash, mtime in ns, size) of the file
+    """
+    stat = os.stat(full_path)
+    return hash_file_content(full_path), stat.st_mtime_ns, stat.st_size
+
+def read_file_with_fingerprint(full_path, errors=None) -> tuple[str, tuple[str, int, int]]:
+    """
+    return the text of the file and the fingerprint of that very content, (content hash, mtime in ns, size).
+    the file is read once, so a change made while it is gisted is not taken for the content of its summary.
+    """
+    stat = os.stat(full_path)
+    with open(full_path, "rb") as f:
+        data = f.read()
+    # decoded as open(full_path, "r") would
+    text = io.TextIOWrapper(io.BytesIO(data), errors=errors).read()
+    return text, (hashlib.sha256(data).hexdigest(), stat.st_mtime_ns, stat.st_size)
+
+def hash_package_inputs(subpackage_notes: str, filenotes: str) -> str:
+    """
+    the hash of the inputs of the notes of a package, see ProjectFiles.package_gisting_inputs
+    """
+    h = hashlib.sha256()
+    h.update(subpackage_notes.encode("utf-8"))
+    h.update(b"\0")
+    h.update(filenotes.encode("utf-8"))
+    return h.hexdigest()
+
 def dumb_package_gisting(package, subpackage_notes, filenotes):
     return f"This is the summary of package {package}"
 
 class FilePersistence(ABC):
     @abstractmethod
-    def persist_package_notes(self, package_notes, file_path):
+    def persist_package_notes(self, package_notes, file_path, input_hashes=None):
         pass
 
     @abstractmethod
@@ -64,17 +190,66 @@ class FilePersistence(ABC):
     def load_code_files(self, gist_file_path):
         pass
 
+    def load_code_files_lazy(self, gist_file_path) -> list[CodeFile]:
+        """
+        load the code files without their summaries, which are read when accessed.
+        fall back to loading everything if the persistence can not do better.
+        """
+        return self.load_code_files(gist_file_path)
+
+    def code_files_exist(self, gist_file_path) -> bool:
+        return os.path.exists(gist_file_path)
+
+    def package_notes_exist(self, file_path) -> bool:
+        return os.path.exists(file_path)
+
+    def load_package_input_hashes(self, file_path) -> dict[str, str]:
+        """
+        the hashes of the inputs the package notes were made from, by package, {} if they were not recorded
+        """
+        return {}
+
 class DefaultFilePersistence(FilePersistence):
     def __init__(self, separator="|"):
         self.separator = separator
 
-    def persist_package_notes(self, package_notes: dict[str, str], file_path: str) -> str:
-        with open(file_path, "w") as f:
+    @staticmethod
+    def input_hashes_path(file_path: str) -> str:
+        # a sidecar file next to the package notes, e.g. package_notes.hashes
+        return os.path.splitext(file_path)[0] + ".hashes"
+
+    def persist_package_notes(self, package_notes: dict[str, str], file_path: str, input_hashes: dict[str, str] = None) -> str:
+        with open(file_path + ".tmp", "w") as f:
             for package, notes in package_notes.items():
                 f.write(self.separator)
                 f.write(f"Package: {package}\nNotes: {notes}\n\n")
+        os.replace(file_path + ".tmp", file_path)
+        if input_hashes is not None:
+            hashes_path = self.input_hashes_path(file_path)
+            hashed = [package for package in package_notes if package in input_hashes]
+            if not hashed:
+                # no sidecar without hashes, and none left from the notes written before
+                if os.path.exists(hashes_path):
+                    os.remove(hashes_path)
+                return file_path
+            with open(hashes_path + ".tmp", "w") as f:
+                for package in hashed:
+                    f.write(f"{package}{self.separator}{input_hashes[package]}\n")
+            os.replace(hashes_path + ".tmp", hashes_path)
         return file_path
 
+    def load_package_input_hashes(self, file_path) -> dict[str, str]:
+        hashes_path = self.input_hashes_path(file_path)
+        if not os.path.exists(hashes_path):
+            return {}
+        input_hashes = {}
+        with open(hashes_path, "r") as f:
+            for line in f:
+                package, _, input_hash = line.rstrip("\n").partition(self.separator)
+                if input_hash:
+                    input_hashes[package] = input_hash
+        return input_hashes
+
     def load_package_notes(self, file_path) -> dict[str, str]:
         package_notes = defaultdict(str)
         with open(file_path, "r") as f:
@@ -97,16 +272,45 @@ class DefaultFilePersistence(FilePersistence):
         return package_notes
 
     def persist_code_files(self, files: list[CodeFile], gist_file_path: str) -> str:
-        with open(gist_file_path, "w") as f:
+        # write a new file and swap it in, so a lazily loaded (memory-mapped) gist file is never truncated under its readers
+        with open(gist_file_path + ".tmp", "w") as f:
             for file in files:
                 f.write(self.separator)
                 f.write(f"Filename: {file.filename}\n")
                 f.write(f"Path: {file.path}\n")
                 f.write(f"Package: {file.package}\n")
+                # the fingerprint goes before the summary, since the summary is free text till the end of the block
+                if file.content_hash:
+                    f.write(f"Hash: {file.content_hash}\n")
+                    f.write(f"Mtime: {file.mtime_ns}\n")
+                    f.write(f"Size: {file.size}\n")
                 f.write(f"Summary: {file.summary}\n")
                 f.write("\n")
+        os.replace(gist_file_path + ".tmp", gist_file_path)
         return gist_file_path
 
+    @staticmethod
+    def parse_code_file_block(block: str) -> dict[str, str]:
+        file_data = {}
+        current_key = None
+        for line in block.split("\n"):
+            if ": " in line and not line.startswith(" "):
+                key, value = line.split(": ", 1)
+                file_data[key] = value
+                current_key = key
+            elif current_key:
+                file_data[current_key] += "\n" + line
+        return file_data
+
+    @staticmethod
+    def is_code_file_data(file_data: dict[str, str]) -> bool:
+        return 'Filename' in file_data and 'Path' in file_data and 'Package' in file_data
+
+    @staticmethod
+    def set_fingerprint_from_data(code_file: CodeFile, file_data: dict[str, str]):
+        if file_data.get('Hash', '').strip():
+            code_file.set_fingerprint(file_data['Hash'].strip(), int(file_data.get('Mtime', 0)), int(file_data.get('Size', 0)))
+
     def load_code_files(self, gist_file_path: str) -> list[CodeFile]:
         files = []
         with open(gist_file_path, "r") as f:
@@ -114,30 +318,87 @@ class DefaultFilePersistence(FilePersistence):
             file_blocks = content.split(self.separator)
             for block in file_blocks:
                 if block.strip():
-                    lines = block.split("\n")
-                    file_data = {}
-                    current_key = None
-                    for line in lines:
-                        if ": " in line and not line.startswith(" "):
-                            key, value = line.split(": ", 1)
-                            file_data[key] = value
-                            current_key = key
-                        elif current_key:
-                            file_data[current_key] += "\n" + line
-
-                    if 'Filename' in file_data and 'Path' in file_data and 'Package' in file_data:
+                    file_data = self.parse_code_file_block(block)
+                    if self.is_code_file_data(file_data):
                         code_file = CodeFile(file_data['Filename'], file_data['Path'], file_data['Package'])
                         code_file.set_details(file_data.get('Summary', '').strip())
+                        self.set_fingerprint_from_data(code_file, file_data)
                         files.append(code_file)
         return files
 
+    def load_code_files_lazy(self, gist_file_path: str) -> list[CodeFile]:
+        index = GistFileIndex(gist_file_path, self.separator)
+        files = []
+        for path, file_data in index.headers():
+            code_file = LazyCodeFile(file_data['Filename'], path, file_data['Package'], index)
+            self.set_fingerprint_from_data(code_file, file_data)
+            files.append(code_file)
+        return files
+
+class GistFileIndex:
+    """
+    offset index over a memory-mapped code_files.txt: for each path the byte range of its block.
+    only the headers (filename, path, package, fingerprint) are decoded when indexing, a summary is decoded by read_summary.
+    """
+    summary_marker = b"\nSummary: "
+
+    def __init__(self, gist_file_path: str, separator: str = "|"):
+        self.gist_file_path = gist_file_path
+        self.separator = separator.encode("utf-8")
+        self.ranges = {}  # path -> (start, end)
+        self._headers = []
+        with open(gist_file_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                self.mm = None
+                return
+            # the mapping stays valid after the file is closed, and after it is replaced by a new one
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._build()
+
+    def _decode(self, start: int, end: int) -> str:
+        # same as reading the file in text mode
+        return self.mm[start:end].decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+
+    def _build(self):
+        mm = self.mm
+        size = len(mm)
+        start = 0
+        while start <= size:
+            end = mm.find(self.separator, start)
+            if end == -1:
+                end = size
+            summary_at = mm.find(self.summary_marker, start, end)
+            header = self._decode(start, summary_at if summary_at != -1 else end)
+            if header.strip():
+                file_data = DefaultFilePersistence.parse_code_file_block(header)
+                if DefaultFilePersistence.is_code_file_data(file_data):
+                    self.ranges.setdefault(file_data['Path'], (start, end))
+                    self._headers.append((file_data['Path'], file_data))
+            start = end + len(self.separator)
+
+    def headers(self) -> list[tuple[str, dict[str, str]]]:
+        return self._headers
+
+    def read_summary(self, path: str) -> str:
+        if path not in self.ranges:
+            return ""
+        start, end = self.ranges[path]
+        file_data = DefaultFilePersistence.parse_code_file_block(self._decode(start, end))
+        return file_data.get('Summary', '').strip()
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+
 class ProjectFiles:
     default_codefile_gist_file = "code_files.txt"
     default_package_notes_file = "package_notes.txt"
     default_gist_foler = ".gist"
     default_seporator = "|"
 
-    def __init__(self, repo_root_path, prefix_list = None, suffix_list = None, resource_suffix_list=None, persistence=None):
+    def __init__(self, repo_root_path, prefix_list = None, suffix_list = None, resource_suffix_list=None, persistence=None, scanner=None,
+                 gist_file_path=None):
         self.root_path = repo_root_path
         # default prefix list should be ["src/main/java", "src/main/resources", "src/test/java", "src/test/resources"]
         if prefix_list is None:
@@ -151,73 +412,179 @@ class ProjectFiles:
         #FIXME, the suffix list and resource_suffix_list are conflicting, need to fix it
         self.resource_suffix_list = resource_suffix_list or ['.properties', '.yaml', ".yml", ".json", '.xml']
         self.package_notes = defaultdict(str)
+        # the hashes of the inputs of the package notes, to only gist again the packages whose inputs changed
+        self.package_input_hashes = {}
         self.files = []
         self.resource_files = []
-        self.packages = {}
-        self.gist_file_path = None
+        # the package tree of self.files, self.packages is its nested dict, rebuilt by _index_files()
+        self.package_index = PackageIndex()
+        self.packages = self.package_index.tree
+        # rendered trees by (package index revision, options)
+        self._tree_cache = {}
+        # e.g. the gist shard of a module, see project_modules.ProjectModules.gist_file_path
+        self.gist_file_path = gist_file_path
+        # files found in the gist file but not in the project anymore, set by from_project
+        self.removed_files = []
+        # the gist file the summaries of the files were taken from by from_project, None if they are all new
+        self.loaded_gist_file_path = None
         self.package_gisting_func = None
-        self.persistence = persistence or DefaultFilePersistence(self.default_seporator)
-
-    def from_files(self, files):
+        self.persistence = persistence or self.default_persistence(gist_file_path)
+        # e.g. a project_scanner.ProjectScanner, to find the files of the project in one concurrent pass with ignore rules
+        self.scanner = scanner
+        # lookup indexes over self.files + self.resource_files, rebuilt by _index_files()
+        self._files_by_key = {}   # (package, filename) -> list of CodeFile, e.g. package-info.java in main and test
+        self._files_by_name = {}  # filename -> CodeFile
+        self._files_by_path = {}  # relative path -> CodeFile
+
+    def default_persistence(self, gist_file_path=None) -> FilePersistence:
+        """
+        use the sqlite gist store if the gist folder has one (e.g. migrated by sqlite_persistence.py), otherwise the text files.
+        the gist folder is the one of gist_file_path, e.g. .gist/modules/<name> of a module, .gist of the project by default
+        """
+        from sqlite_persistence import SqliteFilePersistence
+        if gist_file_path is None:
+            gist_file_path = os.path.join(self.root_path, self.default_gist_foler, self.default_codefile_gist_file)
+        if os.path.exists(os.path.join(os.path.dirname(gist_file_path), SqliteFilePersistence.default_db_file)):
+            return SqliteFilePersistence()
+        return DefaultFilePersistence(self.default_seporator)
+
+    def _index_files(self):
+        """
+        rebuild the lookup indexes, must be called whenever self.files or self.resource_files is replaced.
+        the first file wins on duplicated keys, same as the linear scan over self.files + self.resource_files
+        """
+        self._files_by_key = {}
+        self._files_by_name = {}
+        self._files_by_path = {}
+        for file in self.files + self.resource_files:
+            self._add_to_lookup_indexes(file)
+        self.package_index = PackageIndex(self.files)
+        self.packages = self.package_index.tree
+        self._tree_cache = {}
+
+    def _add_to_lookup_indexes(self, file: CodeFile):
+        self._files_by_key.setdefault((file.package, file.filename), []).append(file)
+        self._files_by_name.setdefault(file.filename, file)
+        self._files_by_path.setdefault(os.path.normpath(file.path), file)
+
+    def add_file(self, file: CodeFile):
+        """
+        add a code file (or a resource file, by its "resources" package), the indexes and the package tree are updated in place
+        """
+        if file.package == "resources":
+            self.resource_files.append(file)
+        else:
+            self.files.append(file)
+            self.package_index.add_file(file)
+        self._add_to_lookup_indexes(file)
+
+    def remove_file(self, file: CodeFile) -> bool:
+        """
+        remove a code file, the indexes and the package tree are updated in place, emptied packages are dropped
+        """
+        all_files = self.resource_files if file.package == "resources" else self.files
+        if not any(f is file for f in all_files):
+            return False
+        all_files[:] = [f for f in all_files if f is not file]
+        if file.package != "resources":
+            self.package_index.remove_file(file)
+        same_key = self._files_by_key.get((file.package, file.filename), [])
+        same_key[:] = [f for f in same_key if f is not file]
+        if not same_key:
+            self._files_by_key.pop((file.package, file.filename), None)
+        path = os.path.normpath(file.path)
+        if self._files_by_path.get(path) is file:
+            del self._files_by_path[path]
+            # another file with the same path, if any, is found first now
+            other = next((f for f in self.files + self.resource_files if os.path.normpath(f.path) == path), None)
+            if other:
+                self._files_by_path[path] = other
+        if self._files_by_name.get(file.filename) is file:
+            del self._files_by_name[file.filename]
+            other = next((f for f in self.files + self.resource_files if f.filename == file.filename), None)
+            if other:
+                self._files_by_name[file.filename] = other
+        return True
+
+    def from_files(self, files, resource_files=None):
         self.files = files
-        self.packages = self.generate_package_structure(files)
+        if resource_files is not None:
+            self.resource_files = resource_files
+        self._index_files()
 
     def from_folder(self, folder_path):
         self.files = self.get_files_from_folder(folder_path)
-        self.packages = self.generate_package_structure(self.files)
+        self._index_files()
+
+    def scan_project(self) -> tuple[list[CodeFile], list[CodeFile]]:
+        """
+        find the code files and the resource files of the project, with the scanner if one is set
+        """
+        if self.scanner is not None:
+            return self.scanner.scan(self.prefix_list, self.suffix_list, self.resource_suffix_list)
+        return self.get_files_of_project(), self.get_resource_files()
 
     def from_project(self, gist_file_path=None):
-        java_files = self.get_files_of_project()
+        java_files, resource_files = self.scan_project()
         print(f"Java files found: {len(java_files)}")
-        resource_files = self.get_resource_files()
         print(f"Resource files found: {len(resource_files)}")
         
-        # if gist_file_path is not set, then use the default path
+        # if gist_file_path is not set, then use the one given to the constructor or the default path
         if gist_file_path is None:
-            gist_file_path = os.path.join(self.root_path, self.default_gist_foler, self.default_codefile_gist_file)
+            gist_file_path = self.gist_file_path or os.path.join(self.root_path, self.default_gist_foler, self.default_codefile_gist_file)
 
         self.gist_file_path = gist_file_path
 
-        if os.path.exists(gist_file_path):
+        if self.persistence.code_files_exist(gist_file_path):
             
             print(f"Loading existing gist files from {gist_file_path}")
             existing_files = self.load_code_files(gist_file_path)
-            # Update summaries for existing files
-            for existing_file in existing_files:
-                for new_file in java_files + resource_files:
-                    if existing_file.filename == new_file.filename and existing_file.path == new_file.path:
-                        new_file.summary = existing_file.summary
+            # Update summaries and fingerprints for existing files
+            found_paths = adopt_summaries(java_files + resource_files, existing_files)
+            self.removed_files = [f for f in existing_files if os.path.normpath(f.path) not in found_paths]
+            self.loaded_gist_file_path = gist_file_path
+            if self.removed_files:
+                print(f"Files no longer in the project: {len(self.removed_files)}")
         else:
             print(f"{gist_file_path} does not exist, so we will not load existing gist files")
 
         
         self.files = java_files
         self.resource_files = resource_files
-        self.packages = self.generate_package_structure(self.files)
+        self._index_files()
     
         
         gist_folder_path = os.path.dirname(gist_file_path)
-        if os.path.exists(os.path.join(gist_folder_path, self.default_package_notes_file)):
+        if self.persistence.package_notes_exist(os.path.join(gist_folder_path, self.default_package_notes_file)):
             print(f"Loading package notes from {self.default_package_notes_file}")
-            self.package_notes = self.load_package_notes()
+            self.package_notes = self.load_package_notes(os.path.join(gist_folder_path, self.default_package_notes_file))
+            self.package_input_hashes = self.persistence.load_package_input_hashes(os.path.join(gist_folder_path, self.default_package_notes_file))
         else:
             print(f"No package notes file {self.default_package_notes_file} found at {gist_folder_path}")
 
-    def from_gist_files(self, gist_file_path=None):
+    def from_gist_files(self, gist_file_path=None, lazy=False):
+        """
+        load the files and package notes from the gist store.
+        with lazy=True only the file index is loaded, a summary is read when it is accessed the first time.
+        """
         if gist_file_path is None:
-            gist_file_path = os.path.join(self.root_path, self.default_gist_foler, self.default_codefile_gist_file)
-        if os.path.exists(gist_file_path):
+            gist_file_path = self.gist_file_path or os.path.join(self.root_path, self.default_gist_foler, self.default_codefile_gist_file)
+        if self.persistence.code_files_exist(gist_file_path):
             print(f"Loading code gist files from {gist_file_path}")
-            all_files = self.load_code_files(gist_file_path)
+            if lazy:
+                all_files = self.persistence.load_code_files_lazy(gist_file_path)
+            else:
+                all_files = self.load_code_files(gist_file_path)
             self.files = [f for f in all_files if f.package != "resources"]
             self.resource_files = [f for f in all_files if f.package == "resources"]
+            self._index_files()
             print(f"After loading gist: Java files: {len(self.files)}, Resource files: {len(self.resource_files)}")
             self.gist_file_path = gist_file_path
-            self.packages = self.generate_package_structure(self.files)
             gist_folder_path = os.path.dirname(gist_file_path)
-            if os.path.exists(os.path.join(gist_folder_path, self.default_package_notes_file)):
+            if self.persistence.package_notes_exist(os.path.join(gist_folder_path, self.default_package_notes_file)):
                 print(f"Loading package notes from {self.default_package_notes_file}")
-                self.package_notes = self.load_package_notes()
+                self.package_notes = self.load_package_notes(os.path.join(gist_folder_path, self.default_package_notes_file))
+                self.package_input_hashes = self.persistence.load_package_input_hashes(os.path.join(gist_folder_path, self.default_package_notes_file))
         else:
             print(f"No existing gist file found at {gist_file_path}")
 
@@ -230,25 +597,24 @@ class ProjectFiles:
 
     def get_resource_files(self):
         resource_files = []
+        resource_suffixes = tuple(self.resource_suffix_list)
         for prefix in self.prefix_list:
             if prefix.endswith('resources'):
                 resource_path = os.path.join(self.root_path, prefix)
-                print(f"Searching for resource files in: {resource_path}")
                 for root, _, filenames in os.walk(resource_path):
                     for filename in filenames:
-                        if filename.endswith(tuple(self.resource_suffix_list)):
+                        if filename.endswith(resource_suffixes):
                             file_full_path = os.path.join(root, filename)
                             file_relative_path = os.path.relpath(file_full_path, self.root_path)
                             resource_files.append(CodeFile(filename, file_relative_path, "resources"))
-                            print(f"Found resource file: {filename}")
-        print(f"Total resource files found: {len(resource_files)}")
         return resource_files
 
     def get_files_from_folder(self, folder_path):
         files = []
+        suffixes = tuple(self.suffix_list)
         for root, dirs, filenames in os.walk(folder_path):
             for filename in filenames:
-                if filename.endswith(tuple(self.suffix_list)):
+                if filename.endswith(suffixes):
                     file_full_path = os.path.join(root, filename)
                     package = file_full_path[len(folder_path) + 1: -len(filename) - 1].replace("/", ".")
                     file_relative_path = file_full_path[len(self.root_path) + 1:]
@@ -256,49 +622,85 @@ class ProjectFiles:
         return files
 
     def generate_package_structure(self, files: list[CodeFile]) -> dict[str, dict[str, list[str]]]:
-        packages = {}
-        for file in files:
-            parts = file.package.split('.')
-            current = packages
-            for i, part in enumerate(parts):
-                package_path = '.'.join(parts[:i + 1])
-                if package_path not in current:
-                    current[package_path] = {"files": [], "sub_packages": {}}
-                if i == len(parts) - 1:
-                    current[package_path]["files"].append(file.filename)
-                current = current[package_path]["sub_packages"]
-        return packages
+        return PackageIndex(files).tree
 
     def check_code_file_exists(self, package: str, fileName: str) -> CodeFile:
         file = self.find_codefile_by_name(fileName, package)
         if not file or not file.summary:
             raise Exception(f"expect file {fileName} have summary by now!")
 
+    def refresh_fingerprint(self, file: CodeFile):
+        """
+        record the fingerprint of the current content of the file, usually right after it is gisted
+        """
+        file.set_fingerprint(*file_fingerprint(os.path.join(self.root_path, file.path)))
+
+    def is_code_file_changed(self, file: CodeFile) -> bool:
+        """
+        whether the content of the file differs from the one its summary was made from.
+        size and mtime are checked first so the unchanged files are not read at all, the content hash decides otherwise.
+        a summary without fingerprint (gisted before fingerprints were recorded) is trusted, and the current content is adopted as its fingerprint.
+        """
+        full_path = os.path.join(self.root_path, file.path)
+        try:
+            stat = os.stat(full_path)
+        except FileNotFoundError:
+            return True
+        if file.content_hash and stat.st_size == file.size and stat.st_mtime_ns == file.mtime_ns:
+            return False
+        content_hash = hash_file_content(full_path)
+        if file.content_hash and content_hash != file.content_hash:
+            return True
+        # same content (e.g. touched or checked out again) or no fingerprint yet
+        file.set_fingerprint(content_hash, stat.st_mtime_ns, stat.st_size)
+        return False
+
+    def find_files_to_gist(self, files: list[CodeFile] = None) -> list[CodeFile]:
+        """
+        the files which are new (no summary yet) or whose content changed since they were gisted
+        """
+        if files is None:
+            files = self.files + self.resource_files
+        return [f for f in files if not f.summary or self.is_code_file_changed(f)]
+
     def gist_package(self, package: str, subpackages: dict[str, dict[str, list[str]]], filenames: list[str]):
         # check to make sure the function is set
         if self.package_gisting_func is None:
             raise ValueError("package_gisting_func is not set!")
-        subpackage_notes = ""
+        subpackage_notes, filenotes = self.package_gisting_inputs(package, subpackages, filenames)
+        notes = self.package_gisting_func(package, subpackage_notes, filenotes)
+        self.add_package_notes(package, notes)
+
+    def package_gisting_inputs(self, package: str, subpackages: dict[str, dict[str, list[str]]], filenames: list[str]) -> tuple[str, str]:
+        """
+        the notes of the sub packages and the summaries of the files of the package, as passed to package_gisting_func
+        """
+        subpackage_entries, file_entries = self.package_gisting_entries(package, subpackages, filenames)
+        return "".join(subpackage_entries), "".join(file_entries)
+
+    def package_gisting_entries(self, package: str, subpackages: dict[str, dict[str, list[str]]], filenames: list[str]) -> tuple[list[str], list[str]]:
+        """
+        the entries of package_gisting_inputs, one per sub package and one per file, e.g. to split a large package into groups
+        """
+        subpackage_entries = []
         for subpackage, value in subpackages.items():
             notes = self.find_notes_of_package(subpackage)
             if not notes:
                 raise Exception(f"expect subpackage {subpackage} have notes!")
-            subpackage_notes += f"Sub package: {subpackage} : {notes}\n\n"
-        filenotes = ""
+            subpackage_entries.append(f"Sub package: {subpackage} : {notes}\n\n")
+        file_entries = []
         for filename in filenames:
             file = self.find_codefile_by_name(filename, package)
             if not file:
                 raise Exception(f"expect file {filename} exists!")
             if not file.summary:
                 raise Exception(f"expect file {filename} have summary!")
-            filenotes += f"File: {file.filename} : {file.summary}\n\n"
-        
-        notes = self.package_gisting_func(package, subpackage_notes, filenotes)
-        self.add_package_notes(package, notes)
+            file_entries.append(f"File: {file.filename} : {file.summary}\n\n")
+        return subpackage_entries, file_entries
 
     def package_structure_traverse(self, packages=None, action_file_func=check_code_file_exists, action_package_func=gist_package, is_bottom_up=False):
         if packages is None:
-            self.packages = self.generate_package_structure(self.files)
+            # the package index is kept up to date with self.files, no need to rebuild the tree
             packages = self.packages
         for package, value in sorted(packages.items(), reverse=is_bottom_up):
             sub_packages = value["sub_packages"]
@@ -321,14 +723,22 @@ class ProjectFiles:
     def find_codefile_by_name(self, file_name, package=None):
         if self.files is None:
             raise ValueError("Files are not loaded!")
-        for file in self.files + self.resource_files:
-            if file.filename == file_name and (package is None or file.package == package):
-                return file
-        return None
+        if package is None:
+            return self._files_by_name.get(file_name)
+        files = self._files_by_key.get((package, file_name))
+        return files[0] if files else None
+
+    def find_codefile_by_path(self, path):
+        """
+        find the code file by its path relative to the project root, e.g. src/main/java/com/iky/travel/TravelBeApplication.java
+        """
+        if self.files is None:
+            raise ValueError("Files are not loaded!")
+        return self._files_by_path.get(os.path.normpath(path))
 
     def find_package_node(self, package: str, packages: dict[str, dict[str, list[str]]] = None) -> dict[str, dict[str, list[str]]]:
-        if packages is None:
-            packages = self.packages
+        if packages is None or packages is self.packages:
+            return self.package_index.node(package)
         parts = package.split('.')
         current_structure = packages
         for i in range(len(parts)):
@@ -349,19 +759,15 @@ class ProjectFiles:
         if packages is None:
             packages = self.packages
         node = self.find_package_node(package)
-        code_files = []
         if node:
-            sub_packages, file_names = node['sub_packages'], node['files']
-            for file_name in file_names:
-                for file in self.files:
-                    if file.filename == file_name and file.package == package:
-                        code_files.append(file)
-            return sub_packages, code_files
+            return node['sub_packages'], self.package_index.code_files_of(package)
         else:
             return None, None
 
-    def add_package_notes(self, package: str, notes: str):
+    def add_package_notes(self, package: str, notes: str, input_hash: str = None):
         self.package_notes[package] = notes
+        if input_hash is not None:
+            self.package_input_hashes[package] = input_hash
 
     def find_notes_of_package(self, package: str) -> str:
         if self.package_notes is None:
@@ -370,15 +776,15 @@ class ProjectFiles:
 
     def persist_package_notes(self, file_path: str = None) -> str:
         if file_path is None:
-            file_path = os.path.join(self.root_path, self.default_gist_foler, self.default_package_notes_file)
+            file_path = os.path.join(self.gist_folder_path(), self.default_package_notes_file)
         gist_folder_path = os.path.dirname(file_path)
         if not os.path.exists(gist_folder_path):
             os.makedirs(gist_folder_path)
-        return self.persistence.persist_package_notes(self.package_notes, file_path)
+        return self.persistence.persist_package_notes(self.package_notes, file_path, self.package_input_hashes)
 
     def load_package_notes(self, file_path: str = None) -> dict[str, str]:
         if file_path is None:
-            file_path = os.path.join(self.root_path, self.default_gist_foler, self.default_package_notes_file)
+            file_path = os.path.join(self.gist_folder_path(), self.default_package_notes_file)
         print(f"Loading package notes from {file_path}")
         return self.persistence.load_package_notes(file_path)
 
@@ -386,15 +792,23 @@ class ProjectFiles:
         if files is None:
             files = self.files + self.resource_files
         if gist_file_path is None:
-            gist_file_path = os.path.join(self.root_path, self.default_gist_foler, self.default_codefile_gist_file)
+            gist_file_path = self.gist_file_path or os.path.join(self.root_path, self.default_gist_foler, self.default_codefile_gist_file)
         gist_folder_path = os.path.dirname(gist_file_path)
         if not os.path.exists(gist_folder_path):
             os.makedirs(gist_folder_path)
         return self.persistence.persist_code_files(files, gist_file_path)
 
+    def gist_folder_path(self) -> str:
+        """
+        the folder of the gist store in use, .gist under the project root unless the files were loaded from another gist file (e.g. a module shard)
+        """
+        if self.gist_file_path:
+            return os.path.dirname(self.gist_file_path)
+        return os.path.join(self.root_path, self.default_gist_foler)
+
     def load_code_files(self, gist_file_path: str = None) -> list[CodeFile]:
         if gist_file_path is None:
-            gist_file_path = os.path.join(self.root_path, self.default_gist_foler, self.default_codefile_gist_file)
+            gist_file_path = self.gist_file_path or os.path.join(self.root_path, self.default_gist_foler, self.default_codefile_gist_file)
         return self.persistence.load_code_files(gist_file_path)
 
     def get_file_notes(self) -> str:
@@ -403,15 +817,48 @@ class ProjectFiles:
             file_notes += f"File: {file.filename} : {file.summary}\n\n"
         return file_notes
     
-    def to_tree(self):
-        return print_tree(self.packages)
-
-def print_tree(packages, prefix='', is_last=True):
-    result = ""
+    def to_tree(self, max_tokens: int = None, max_depth: int = None, collapse_leaf_packages: bool = False, elide_tests: bool = False) -> str:
+        """
+        the package tree as text, see render_tree. the result is memoized until the package index changes
+        """
+        key = (self.package_index.revision, max_tokens, max_depth, collapse_leaf_packages, elide_tests)
+        if key not in self._tree_cache:
+            self._tree_cache[key] = render_tree(self.package_index, max_tokens=max_tokens, max_depth=max_depth,
+                                                collapse_leaf_packages=collapse_leaf_packages, elide_tests=elide_tests)
+        return self._tree_cache[key]
+
+def estimate_tree_tokens(text: str) -> int:
+    # about 4 characters per token, close enough for paths and package names without loading a tokenizer
+    return (len(text) + 3) // 4
+
+def _is_test_file(file: CodeFile) -> bool:
+    return "/src/test/" in "/" + file.path.replace(os.sep, "/")
+
+def _tree_without_tests(packages, package_index):
+    tree = {}
+    for package, contents in packages.items():
+        files_by_name = package_index.code_files.get(package, {})
+        files = [name for name in contents["files"] if not all(_is_test_file(f) for f in files_by_name.get(name, []))]
+        sub_packages = _tree_without_tests(contents["sub_packages"], package_index)
+        if files or sub_packages:
+            tree[package] = {"files": files, "sub_packages": sub_packages}
+    return tree
+
+def _count_tree(contents) -> tuple[int, int]:
+    num_files, num_packages = len(contents["files"]), 0
+    for sub_contents in contents["sub_packages"].values():
+        sub_files, sub_packages = _count_tree(sub_contents)
+        num_files += sub_files
+        num_packages += sub_packages + 1
+    return num_files, num_packages
+
+def _tree_depth(packages) -> int:
+    return max((1 + _tree_depth(contents["sub_packages"]) for contents in packages.values()), default=0)
+
+def _render_tree_lines(packages, lines, prefix, is_last, depth, max_depth, collapse_leaf_packages):
     for i, (package, contents) in enumerate(packages.items()):
         is_last_item = i == len(packages) - 1
-        
-        # Determine the appropriate prefix for this level
+        # same layout as print_tree
         if is_last:
             current_prefix = prefix + "└── "
             next_prefix = prefix + "    "
@@ -419,19 +866,60 @@ def print_tree(packages, prefix='', is_last=True):
             current_prefix = prefix + "├── "
             next_prefix = prefix + "│   "
 
-        result += f"{current_prefix}{package}/\n"
-
-        if 'files' in contents and contents['files']:
-            for j, file in enumerate(contents['files']):
-                is_last_file = j == len(contents['files']) - 1 and 'sub_packages' not in contents
-                file_prefix = next_prefix + ("└── " if is_last_file else "├── ")
-                result += f"{file_prefix}{file}\n"
-
-        if 'sub_packages' in contents:
-            result += print_tree(contents['sub_packages'], next_prefix, is_last_item)
-
-    return result
+        if max_depth is not None and depth >= max_depth and contents["sub_packages"]:
+            num_files, num_packages = _count_tree(contents)
+            lines.append(f"{current_prefix}{package}/ ({num_files} files in {num_packages + 1} packages)")
+            continue
+        if collapse_leaf_packages and not contents["sub_packages"]:
+            lines.append(f"{current_prefix}{package}/ ({len(contents['files'])} files)")
+            continue
+
+        lines.append(f"{current_prefix}{package}/")
+        for j, file in enumerate(contents["files"]):
+            is_last_file = j == len(contents["files"]) - 1 and "sub_packages" not in contents
+            lines.append(f"{next_prefix}{'└── ' if is_last_file else '├── '}{file}")
+        _render_tree_lines(contents["sub_packages"], lines, next_prefix, is_last_item, depth + 1, max_depth, collapse_leaf_packages)
+
+def render_tree(package_index, max_tokens: int = None, max_depth: int = None, collapse_leaf_packages: bool = False, elide_tests: bool = False) -> str:
+    """
+    render the package tree of the index, by default the same as print_tree.
+    max_depth collapses the packages below that depth to file and package counts, collapse_leaf_packages shows only the
+    number of files of the packages without sub packages, elide_tests leaves out the files under src/test.
+    with max_tokens the tree is degraded until it fits: tests are elided, then leaf packages collapsed, then the depth reduced,
+    and as a last resort the lines beyond the budget are cut.
+    """
+    packages = _tree_without_tests(package_index.tree, package_index) if elide_tests else package_index.tree
+
+    def render(depth, collapse):
+        lines = []
+        _render_tree_lines(packages, lines, "", True, 1, depth, collapse)
+        return "".join(line + "\n" for line in lines)
+
+    tree = render(max_depth, collapse_leaf_packages)
+    if max_tokens is None or estimate_tree_tokens(tree) <= max_tokens:
+        return tree
+    if not elide_tests:
+        return render_tree(package_index, max_tokens, max_depth, collapse_leaf_packages, elide_tests=True)
+    if not collapse_leaf_packages:
+        tree = render(max_depth, True)
+    depth = min(max_depth or _tree_depth(packages), _tree_depth(packages))
+    while estimate_tree_tokens(tree) > max_tokens and depth > 1:
+        depth -= 1
+        tree = render(depth, True)
+    if estimate_tree_tokens(tree) <= max_tokens:
+        return tree
+    lines, used = [], 0
+    for line in tree.splitlines():
+        used += estimate_tree_tokens(line + "\n")
+        if used > max_tokens:
+            break
+        lines.append(line)
+    return "".join(line + "\n" for line in lines) + "... (the tree is cut to fit the token budget)\n"
 
+def print_tree(packages, prefix='', is_last=True):
+    lines = []
+    _render_tree_lines(packages, lines, prefix, is_last, 1, None, False)
+    return "".join(line + "\n" for line in lines)
 
 
 if __name__ == "__main__":
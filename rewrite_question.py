@@ -1,11 +1,7 @@
 import argparse
 import sys
 from typing import List, Tuple
-# the order of the following imports is important
-# since the initialization of langfuse depends on the os environment variables
-# which are loaded in the config_utils module
 from config_utils import load_config_to_env
-load_config_to_env()
 from llm_client import LLMQueryManager, langfuse_context, observe
 
 system_prompt_rewrite_question = """
@@ -101,6 +97,8 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="rerwrite_question")
     parser.add_argument("--question", type=str, default="", required=True, help="a question about the Java code, for example 'Tell me about the package structure of the project'")
     args = parser.parse_args()
+    # the configuration is loaded by the commands, importing the modules has no side effect
+    load_config_to_env()
     question = args.question
     # one of task or jira should be provided
     if not question:
@@ -0,0 +1,249 @@
+import os
+import sys
+import sqlite3
+import threading
+import argparse
+from collections import defaultdict
+from projectfiles import CodeFile, LazyCodeFile, FilePersistence, DefaultFilePersistence, ProjectFiles
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS code_files (
+    path TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    package TEXT,
+    summary TEXT NOT NULL DEFAULT '',
+    content_hash TEXT NOT NULL DEFAULT '',
+    mtime_ns INTEGER NOT NULL DEFAULT 0,
+    size INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_code_files_package ON code_files(package);
+CREATE INDEX IF NOT EXISTS idx_code_files_filename ON code_files(filename);
+CREATE TABLE IF NOT EXISTS package_notes (
+    package TEXT PRIMARY KEY,
+    notes TEXT NOT NULL DEFAULT '',
+    input_hash TEXT NOT NULL DEFAULT ''
+);
+"""
+
+CODE_FILE_COLUMNS = "filename, path, package, summary, content_hash, mtime_ns, size"
+
+UPSERT_CODE_FILE = f"""
+INSERT INTO code_files ({CODE_FILE_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(path) DO UPDATE SET
+    filename = excluded.filename,
+    package = excluded.package,
+    summary = excluded.summary,
+    content_hash = excluded.content_hash,
+    mtime_ns = excluded.mtime_ns,
+    size = excluded.size
+"""
+
+UPSERT_PACKAGE_NOTES = """
+INSERT INTO package_notes (package, notes, input_hash) VALUES (?, ?, ?)
+ON CONFLICT(package) DO UPDATE SET notes = excluded.notes, input_hash = excluded.input_hash
+"""
+
+
+def _code_file_row(file: CodeFile) -> tuple:
+    return (file.filename, file.path, file.package, file.summary or "", file.content_hash or "", file.mtime_ns or 0, file.size or 0)
+
+
+def _code_file_from_row(row) -> CodeFile:
+    filename, path, package, summary, content_hash, mtime_ns, size = row
+    code_file = CodeFile(filename, path, package)
+    code_file.set_details(summary)
+    if content_hash:
+        code_file.set_fingerprint(content_hash, mtime_ns, size)
+    return code_file
+
+
+class SqliteFilePersistence(FilePersistence):
+    """
+    keep the code files and package notes in a sqlite database, by default .gist/gist.db next to the text gist files.
+    summaries are stored as is, so they may contain any separator, and single files or packages can be read without loading everything.
+    the database is in WAL mode so readers (e.g. several tell_me_about.py sessions) do not block on a running gisting.
+    """
+    default_db_file = "gist.db"
+
+    def __init__(self, db_path: str = None):
+        # if db_path is not set, the database is next to the file path given to each call
+        self.db_path = db_path
+        # sqlite connections can not be shared between threads, keep one per thread and database
+        self._local = threading.local()
+
+    def resolve_db_path(self, file_path: str) -> str:
+        if self.db_path:
+            return self.db_path
+        return os.path.join(os.path.dirname(file_path), self.default_db_file)
+
+    def _connect(self, file_path: str) -> sqlite3.Connection:
+        db_path = self.resolve_db_path(file_path)
+        connections = getattr(self._local, "connections", None)
+        if connections is None:
+            connections = self._local.connections = {}
+        conn = connections.get(db_path)
+        if conn is None:
+            folder = os.path.dirname(db_path)
+            if folder and not os.path.exists(folder):
+                os.makedirs(folder)
+            conn = sqlite3.connect(db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._migrate(conn)
+            connections[db_path] = conn
+        return conn
+
+    @staticmethod
+    def _migrate(conn: sqlite3.Connection):
+        # the databases made before the input hashes of the package notes were recorded
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(package_notes)")}
+        if "input_hash" not in columns:
+            with conn:
+                conn.execute("ALTER TABLE package_notes ADD COLUMN input_hash TEXT NOT NULL DEFAULT ''")
+
+    def close(self):
+        for conn in getattr(self._local, "connections", {}).values():
+            conn.close()
+        self._local.connections = {}
+
+    def _has_rows(self, file_path: str, table: str) -> bool:
+        if not os.path.exists(self.resolve_db_path(file_path)):
+            return False
+        return self._connect(file_path).execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone() is not None
+
+    def code_files_exist(self, gist_file_path) -> bool:
+        return self._has_rows(gist_file_path, "code_files")
+
+    def package_notes_exist(self, file_path) -> bool:
+        return self._has_rows(file_path, "package_notes")
+
+    def persist_package_notes(self, package_notes: dict[str, str], file_path: str, input_hashes: dict[str, str] = None) -> str:
+        input_hashes = input_hashes or {}
+        conn = self._connect(file_path)
+        with conn:
+            conn.execute("DELETE FROM package_notes")
+            conn.executemany(UPSERT_PACKAGE_NOTES, ((package, notes, input_hashes.get(package, "")) for package, notes in package_notes.items()))
+        return self.resolve_db_path(file_path)
+
+    def upsert_package_notes(self, package_notes: dict[str, str], file_path: str, input_hashes: dict[str, str] = None) -> str:
+        input_hashes = input_hashes or {}
+        conn = self._connect(file_path)
+        with conn:
+            conn.executemany(UPSERT_PACKAGE_NOTES, ((package, notes, input_hashes.get(package, "")) for package, notes in package_notes.items()))
+        return self.resolve_db_path(file_path)
+
+    def load_package_input_hashes(self, file_path) -> dict[str, str]:
+        if not os.path.exists(self.resolve_db_path(file_path)):
+            return {}
+        return dict(self._connect(file_path).execute("SELECT package, input_hash FROM package_notes WHERE input_hash != ''"))
+
+    def load_package_notes(self, file_path) -> dict[str, str]:
+        package_notes = defaultdict(str)
+        for package, notes in self._connect(file_path).execute("SELECT package, notes FROM package_notes ORDER BY rowid"):
+            package_notes[package] = notes
+        return package_notes
+
+    def load_package_note(self, file_path: str, package: str) -> str:
+        row = self._connect(file_path).execute("SELECT notes FROM package_notes WHERE package = ?", (package,)).fetchone()
+        return row[0] if row else None
+
+    def persist_code_files(self, files: list[CodeFile], gist_file_path: str) -> str:
+        """
+        replace the stored code files with the given ones, in a single transaction
+        """
+        conn = self._connect(gist_file_path)
+        with conn:
+            conn.execute("DELETE FROM code_files")
+            conn.executemany(UPSERT_CODE_FILE, (_code_file_row(f) for f in files))
+        return self.resolve_db_path(gist_file_path)
+
+    def upsert_code_files(self, files: list[CodeFile], gist_file_path: str) -> str:
+        """
+        insert or update the given code files by path, in a single transaction, the other stored files are kept
+        """
+        conn = self._connect(gist_file_path)
+        with conn:
+            conn.executemany(UPSERT_CODE_FILE, (_code_file_row(f) for f in files))
+        return self.resolve_db_path(gist_file_path)
+
+    def delete_code_files(self, paths: list[str], gist_file_path: str):
+        conn = self._connect(gist_file_path)
+        with conn:
+            conn.executemany("DELETE FROM code_files WHERE path = ?", ((p,) for p in paths))
+
+    def load_code_files(self, gist_file_path: str) -> list[CodeFile]:
+        rows = self._connect(gist_file_path).execute(f"SELECT {CODE_FILE_COLUMNS} FROM code_files ORDER BY rowid")
+        return [_code_file_from_row(row) for row in rows]
+
+    def load_code_files_lazy(self, gist_file_path: str) -> list[CodeFile]:
+        summary_source = SqliteSummarySource(self, gist_file_path)
+        files = []
+        for filename, path, package, content_hash, mtime_ns, size in self._connect(gist_file_path).execute(
+                "SELECT filename, path, package, content_hash, mtime_ns, size FROM code_files ORDER BY rowid"):
+            code_file = LazyCodeFile(filename, path, package, summary_source)
+            if content_hash:
+                code_file.set_fingerprint(content_hash, mtime_ns, size)
+            files.append(code_file)
+        return files
+
+    def load_summary(self, gist_file_path: str, path: str) -> str:
+        row = self._connect(gist_file_path).execute("SELECT summary FROM code_files WHERE path = ?", (path,)).fetchone()
+        return row[0] if row else ""
+
+    def load_code_file(self, gist_file_path: str, path: str) -> CodeFile:
+        row = self._connect(gist_file_path).execute(f"SELECT {CODE_FILE_COLUMNS} FROM code_files WHERE path = ?", (path,)).fetchone()
+        return _code_file_from_row(row) if row else None
+
+    def load_code_files_of_package(self, gist_file_path: str, package: str) -> list[CodeFile]:
+        rows = self._connect(gist_file_path).execute(f"SELECT {CODE_FILE_COLUMNS} FROM code_files WHERE package = ? ORDER BY rowid", (package,))
+        return [_code_file_from_row(row) for row in rows]
+
+
+class SqliteSummarySource:
+    """
+    read the summary of a lazily loaded code file by a point lookup
+    """
+    def __init__(self, persistence: SqliteFilePersistence, gist_file_path: str):
+        self.persistence = persistence
+        self.gist_file_path = gist_file_path
+
+    def read_summary(self, path: str) -> str:
+        return self.persistence.load_summary(self.gist_file_path, path)
+
+
+def migrate_from_text(gist_folder_path: str, db_path: str = None, separator: str = ProjectFiles.default_seporator) -> tuple[int, int]:
+    """
+    one-shot migration of code_files.txt and package_notes.txt in the gist folder into the sqlite database.
+    the text files are left in place. returns the number of code files and package notes migrated.
+    """
+    text_persistence = DefaultFilePersistence(separator)
+    sqlite_persistence = SqliteFilePersistence(db_path)
+    code_files_path = os.path.join(gist_folder_path, ProjectFiles.default_codefile_gist_file)
+    package_notes_path = os.path.join(gist_folder_path, ProjectFiles.default_package_notes_file)
+
+    files = text_persistence.load_code_files(code_files_path) if os.path.exists(code_files_path) else []
+    package_notes = text_persistence.load_package_notes(package_notes_path) if os.path.exists(package_notes_path) else {}
+    input_hashes = text_persistence.load_package_input_hashes(package_notes_path)
+    sqlite_persistence.persist_code_files(files, code_files_path)
+    sqlite_persistence.persist_package_notes(package_notes, package_notes_path, input_hashes)
+    sqlite_persistence.close()
+    return len(files), len(package_notes)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate the text gist files of a project to the sqlite gist store")
+    parser.add_argument("project_root", type=str, help="Path to the project root")
+    args = parser.parse_args()
+
+    root_path = os.path.abspath(args.project_root)
+    gist_folder_path = os.path.join(root_path, ProjectFiles.default_gist_foler)
+    # the gist folder of the project, or the shard of each module of a multi-module project (.gist/modules/<name>)
+    shard_folders = sorted(folder for folder, _, filenames in os.walk(gist_folder_path) if ProjectFiles.default_codefile_gist_file in filenames)
+    if not shard_folders:
+        print(f"Error: no gist files found at {gist_folder_path}, please run gist_files.py first.")
+        sys.exit(1)
+
+    for shard_folder in shard_folders:
+        num_files, num_packages = migrate_from_text(shard_folder)
+        print(f"Migrated {num_files} code files and {num_packages} package notes to {os.path.join(shard_folder, SqliteFilePersistence.default_db_file)}")
@@ -0,0 +1,44 @@
+import re
+
+# the heading of the requests for more information at the end of the replies of the Q&A loop, see functions.py
+_NEXT_STEPS = re.compile(r'(?:\*\*Next Steps\*\*|### Next Steps)', re.IGNORECASE)
+_REQUEST = re.compile(r'^\s*(?:[-*]|\d+\.)?\s*\[')
+_KEY_FINDINGS = re.compile(r'^\s*\*?\*?KEY_FINDINGS', re.IGNORECASE)
+# enough of the start of a line to tell a request or the key findings from the rest
+_MIN_LINE_START = len("**KEY_FINDINGS")
+
+
+def stop_after(tag: str, count: int = 1):
+    """
+    a stop condition for a streamed reply: true once the text so far has count closing tags, e.g. stop_after("</File>")
+    """
+    def stop_condition(text: str) -> bool:
+        return text.count(tag) >= count
+    return stop_condition
+
+def next_steps_complete(text: str) -> bool:
+    """
+    a stop condition for a streamed reply of the Q&A loop: true once the Next Steps section is over, i.e. after its requests
+    a blank line is followed by a line which is neither a request nor the key findings (which are still needed).
+    what follows the section is not used by the loop.
+    """
+    match = _NEXT_STEPS.search(text)
+    if not match:
+        return False
+    lines = text[match.end():].split("\n")
+    if len(lines[-1].strip()) < _MIN_LINE_START:
+        # too little of the last line to tell what it is
+        lines.pop()
+    requested = False
+    blank = False
+    for line in lines:
+        if not line.strip():
+            blank = requested
+        elif _REQUEST.match(line) or "No additional information is needed" in line:
+            requested = True
+            blank = False
+        elif _KEY_FINDINGS.match(line):
+            blank = False
+        elif blank:
+            return True
+    return False
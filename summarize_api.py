@@ -12,11 +12,7 @@ from functions import save_response_to_markdown
 from functions import function_prompt
 import logging
 
-# the order of the following imports is important
-# since the initialization of langfuse depends on the os environment variables
-# which are loaded in the config_utils module
 from config_utils import load_config_to_env
-load_config_to_env()
 
 from llm_client import LLMQueryManager, langfuse_context, observe
 from conversation_reviewer import ConversationReviewer
@@ -184,7 +180,8 @@ def summarize_api(pf: Optional[ProjectFiles], question, last_response="", max_ro
                 iteration_number=str(i),
                 new_information=new_information,
                 key_findings=key_findings,
-                reviewer=reviewer
+                reviewer=reviewer,
+                stop_after_next_steps=True
             )
             if should_conclude:
                 logger.info("The conversation is about to end")
@@ -207,6 +204,8 @@ if __name__ == "__main__":
     parser.add_argument("project_root", type=str, help="Path to the project root")
     parser.add_argument("--max-rounds", type=int, default=8, required= False, help="default 8, maximam rounds of conversation with LLM before stopping the conversation")
     args = parser.parse_args()
+    # the configuration is loaded by the commands, importing the modules has no side effect
+    load_config_to_env()
     # Convert to absolute path if it's a relative path
     root_path = os.path.abspath(args.project_root)
     if not os.path.exists(root_path):
@@ -215,7 +214,7 @@ if __name__ == "__main__":
 
     pf = ProjectFiles(repo_root_path=root_path)
     # load the files and package gists from persistence.
-    pf.from_gist_files()
+    pf.from_gist_files(lazy=True)
    
     max_rounds = args.max_rounds
 
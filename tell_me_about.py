@@ -5,6 +5,7 @@ import re
 import argparse
 import yaml
 from projectfiles import ProjectFiles
+from project_modules import ProjectModules
 import time
 from typing import Union, Optional, List
 from functions import get_file, get_package, get_static_notes
@@ -15,11 +16,7 @@ from functions import function_prompt
 
 import logging
 
-# the order of the following imports is important
-# since the initialization of langfuse depends on the os environment variables
-# which are loaded in the config_utils module
 from config_utils import load_config_to_env
-load_config_to_env()
 
 from rewrite_question import decompose_question, system_prompt_rewrite_question
 
@@ -176,7 +173,8 @@ def answer_question(pf: Optional[ProjectFiles], question, last_response="", max_
                 iteration_number=str(i),
                 new_information=new_information,
                 key_findings=key_findings,
-                reviewer=reviewer
+                reviewer=reviewer,
+                stop_after_next_steps=True
             )
             if should_conclude:
                 logger.info("The conversation is about to end")
@@ -243,8 +241,11 @@ if __name__ == "__main__":
     parser.add_argument("project_root", type=str, help="Path to the project root")
     parser.add_argument("--question", type=str, default="", required=True, help="a question about the Java code, for example 'Tell me about the package structure of the project'")
     parser.add_argument("--max-rounds", type=int, default=8, required=False, help="default 8, maximum rounds of conversation with LLM before stopping the conversation")
+    parser.add_argument("--module", type=str, action="append", default=None, help="Only load this module of a multi-module project, can be repeated. All modules if not set")
     parser.add_argument("--breakdown", action="store_true", help="Flag to break down the question into smaller questions")
     args = parser.parse_args()
+    # the configuration is loaded by the commands, importing the modules has no side effect
+    load_config_to_env()
 
 
 
@@ -253,9 +254,9 @@ if __name__ == "__main__":
     if not os.path.exists(root_path):
         logger.error(f"Error: {root_path} does not exist")
         sys.exit(1)
-    pf = ProjectFiles(repo_root_path=root_path)
-    # load the files and package gists from persistence.
-    pf.from_gist_files()
+    # load the files and package gists from persistence (only the requested modules of a multi-module project),
+    # the file summaries are read only when needed.
+    pf = ProjectModules(root_path).load(args.module, lazy=True)
 
     question = args.question
     # one of task or jira should be provided
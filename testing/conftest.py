@@ -0,0 +1,34 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from projectfiles import CodeFile
+
+
+def _write_file(project_path, rel_path, content="", package="com.a") -> CodeFile:
+    full_path = os.path.join(project_path, rel_path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, "w") as f:
+        f.write(content)
+    return CodeFile(os.path.basename(rel_path), rel_path, package)
+
+def _write_java(project_path, package, class_name, body="") -> CodeFile:
+    rel_path = "/".join(["src/main/java", *package.split("."), f"{class_name}.java"])
+    return _write_file(project_path, rel_path, f"package {package};\n\npublic class {class_name} {{{body}}}\n", package)
+
+
+@pytest.fixture
+def write_file():
+    """
+    write_file(project_path, rel_path, content, package="com.a") writes a file of a test project, with its folders,
+    and returns its CodeFile
+    """
+    return _write_file
+
+@pytest.fixture
+def write_java():
+    """
+    write_java(project_path, package, class_name, body="") writes the class in src/main/java and returns its CodeFile
+    """
+    return _write_java
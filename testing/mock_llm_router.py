@@ -1,3 +1,4 @@
+import threading
 import unittest.mock
 
 class MockLLMInterface:
@@ -30,11 +31,37 @@ class MockLLMFactory:
             raise ValueError("Invalid LLM type")
 
 class MockLLMQueryManager:
-    def __init__(self, use_llm: str, system_prompt: str = None, cached_prompt: str = None):
+    """
+    stands in for LLMQueryManager.query(prompt, cached_prompt, stop_condition), e.g. to gist files without an LLM.
+    the reply is answer(prompt), the mocked LLM by default, streamed by chunks of stream_chunk_size characters until the
+    stop condition is true. the calls (prompt, cached prompt) and the replies are recorded, the queries may be concurrent.
+    """
+    def __init__(self, use_llm: str = "openai", tier: str = "tier1", system_prompt: str = None, cached_prompt: str = None,
+                 answer=None, stream_chunk_size: int = 5):
         self.llm = MockLLMFactory.get_llm(use_llm, system_prompt, cached_prompt)
+        self.answer = answer or self.llm.query
+        self.stream_chunk_size = stream_chunk_size
+        self.calls = []
+        self.replies = []
+        self._lock = threading.Lock()
 
-    def query(self, user_prompt: str) -> str:
-        return self.llm.query(user_prompt)
+    @property
+    def prompts(self) -> list[str]:
+        return [prompt for prompt, _ in self.calls]
+
+    def query(self, user_prompt: str, cached_prompt: str = None, stop_condition=None) -> str:
+        reply = self.answer(user_prompt)
+        if stop_condition is not None:
+            text = ""
+            for i in range(0, len(reply), self.stream_chunk_size):
+                text += reply[i:i + self.stream_chunk_size]
+                if stop_condition(text):
+                    break
+            reply = text
+        with self._lock:
+            self.calls.append((user_prompt, cached_prompt))
+            self.replies.append(reply)
+        return reply
 
 def mock_llm_query_manager():
     return unittest.mock.patch('llm_client.LLMQueryManager', MockLLMQueryManager)
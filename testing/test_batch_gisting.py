@@ -0,0 +1,142 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import re
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from projectfiles import ProjectFiles
+from batch_gisting import BatchClient, AnthropicBatchClient, OpenAIBatchClient, BatchGisting
+
+
+class StandInBatchServer(BaseHTTPRequestHandler):
+    """
+    a local stand-in of the anthropic and openai batch endpoints, a batch ends at the second status check
+    """
+    batches = {}
+    files = {}
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, body, status=200):
+        data = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("content-length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _answer(self, prompt):
+        filename = re.search(r"public class (\w+)", prompt).group(1) + ".java"
+        if "Fail" in filename:
+            return None
+        return f'<File Name="{filename}" Package="p">summary of {filename}</File>'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["content-length"]))
+        if self.path == "/v1/messages/batches":
+            assert self.headers["x-api-key"] == "key"
+            requests = json.loads(body)["requests"]
+            batch_id = f"msgbatch_{len(self.batches)}"
+            self.batches[batch_id] = {"polls": 0, "results": [
+                {"custom_id": r["custom_id"], "answer": self._answer(r["params"]["messages"][0]["content"])} for r in requests]}
+            self._send({"id": batch_id, "processing_status": "in_progress"})
+        elif self.path == "/v1/files":
+            assert self.headers["authorization"] == "Bearer key"
+            content = body.split(b"\r\n\r\n", 2)[2].rsplit(b"\r\n--", 1)[0]
+            file_id = f"file_{len(self.files)}"
+            self.files[file_id] = content
+            self._send({"id": file_id})
+        elif self.path == "/v1/batches":
+            lines = [json.loads(line) for line in self.files[json.loads(body)["input_file_id"]].splitlines()]
+            batch_id = f"batch_{len(self.batches)}"
+            self.batches[batch_id] = {"polls": 0, "results": [
+                {"custom_id": l["custom_id"], "answer": self._answer(l["body"]["messages"][1]["content"])} for l in lines]}
+            self._send({"id": batch_id, "status": "validating"})
+        else:
+            self._send({"error": "not found"}, 404)
+
+    def do_GET(self):
+        base_url = f"http://{self.headers['host']}"
+        match = re.fullmatch(r"/v1/messages/batches/(\w+)(/results)?", self.path)
+        if match:
+            batch = self.batches[match.group(1)]
+            if match.group(2):
+                lines = [{"custom_id": r["custom_id"], "result": {"type": "succeeded", "message": {"content": [{"type": "text", "text": r["answer"]}]}}
+                          if r["answer"] else {"type": "errored", "error": {"type": "invalid_request_error"}}} for r in batch["results"]]
+                self._send("\n".join(json.dumps(l) for l in lines).encode("utf-8"))
+                return
+            batch["polls"] += 1
+            self._send({"id": match.group(1), "processing_status": "ended" if batch["polls"] > 1 else "in_progress",
+                        "results_url": f"{base_url}/v1/messages/batches/{match.group(1)}/results"})
+            return
+        match = re.fullmatch(r"/v1/batches/(\w+)", self.path)
+        if match:
+            batch = self.batches[match.group(1)]
+            batch["polls"] += 1
+            ended = batch["polls"] > 1
+            self._send({"id": match.group(1), "status": "completed" if ended else "in_progress",
+                        "output_file_id": f"output_{match.group(1)}" if ended else None})
+            return
+        match = re.fullmatch(r"/v1/files/output_(\w+)/content", self.path)
+        if match:
+            lines = [{"custom_id": r["custom_id"], "error": None,
+                      "response": {"status_code": 200, "body": {"choices": [{"message": {"content": r["answer"]}}]}}}
+                     if r["answer"] else {"custom_id": r["custom_id"], "response": {"status_code": 400, "body": {}}, "error": None}
+                     for r in self.batches[match.group(1)]["results"]]
+            self._send("\n".join(json.dumps(l) for l in lines).encode("utf-8"))
+            return
+        self._send({"error": "not found"}, 404)
+
+
+@pytest.fixture
+def base_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInBatchServer)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+@pytest.mark.parametrize("client_class", [AnthropicBatchClient, OpenAIBatchClient])
+def test_batch_gisting(tmp_path, base_url, client_class, write_java):
+    project_path = str(tmp_path)
+    for name in ["A", "B", "Fail"]:
+        write_java(project_path, "com.a", name)
+    pf = ProjectFiles(project_path, prefix_list=["src/main/java"], suffix_list=[".java"])
+    pf.from_project()
+
+    client = client_class("key", "model", "system prompt", base_url)
+    client.max_requests_per_batch = 2
+    batch_gisting = BatchGisting(client, project_path)
+    batch_ids = batch_gisting.submit(pf.files)
+    assert len(batch_ids) == 2
+    assert [b["batch_id"] for b in batch_gisting.load_state()] == batch_ids
+    # changed after it was submitted, its summary is of the content sent
+    with open(os.path.join(project_path, "src/main/java/com/a/B.java"), "a") as f:
+        f.write("// changed\n")
+
+    # nothing is collected before the batches ended
+    assert batch_gisting.collect([pf]) == ([], [])
+    assert batch_gisting.wait(poll_interval=0.01, timeout=5)
+    gisted, failed = batch_gisting.collect([pf])
+    assert sorted(f.filename for f in gisted) == ["A.java", "B.java"]
+    assert failed == ["src/main/java/com/a/Fail.java"]
+    assert pf.find_codefile_by_name("A.java").summary == "summary of A.java"
+    assert not pf.is_code_file_changed(pf.find_codefile_by_name("A.java"))
+    assert pf.is_code_file_changed(pf.find_codefile_by_name("B.java"))
+    assert not pf.find_codefile_by_name("Fail.java").summary
+    # the collected batches are dropped
+    assert batch_gisting.load_state() == []
+    assert not os.path.exists(batch_gisting.state_path)
+
+
+def test_batch_client_must_implement_all_methods():
+    class SubmitOnlyClient(BatchClient):
+        def submit(self, requests):
+            return "batch"
+    # fails when created, not when the results are collected
+    with pytest.raises(TypeError):
+        SubmitOnlyClient("key", "model", "system prompt", "http://localhost")
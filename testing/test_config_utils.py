@@ -3,8 +3,10 @@ import os
 from pathlib import Path
 from unittest.mock import patch, mock_open
 import sys
+import subprocess
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from config_utils import load_config_to_env
+import config_utils
+from config_utils import load_config_to_env, ensure_config_loaded
 
 class TestConfigUtils(unittest.TestCase):
 
@@ -46,5 +48,34 @@ class TestConfigUtils(unittest.TestCase):
                 with self.assertRaises(Exception):  # You might want to catch a more specific exception if possible
                     load_config_to_env()
 
+    def test_ensure_config_loaded_once(self):
+        mock_file = mock_open(read_data="llm:\n  use: anthropic\n")
+        with patch.object(config_utils, '_loaded_config_path', None):
+            with patch('builtins.open', mock_file):
+                with patch.object(Path, 'exists', return_value=True):
+                    ensure_config_loaded()
+                    self.assertEqual(os.environ.get('LLM_USE'), 'anthropic')
+                    os.environ['LLM_USE'] = 'openai'
+                    # loaded already, the environment is left as it is
+                    ensure_config_loaded()
+            self.assertEqual(mock_file.call_count, 1)
+            self.assertEqual(os.environ.get('LLM_USE'), 'openai')
+
+    def test_ensure_config_loaded_without_file(self):
+        with patch.object(config_utils, '_loaded_config_path', None):
+            with patch.object(Path, 'exists', return_value=False):
+                ensure_config_loaded()
+        self.assertIsNone(os.environ.get('LLM_USE'))
+
+    def test_import_commands_without_side_effect(self):
+        # neither the configuration, the tracing, an LLM SDK nor a query manager at import
+        script = ("import sys, gist_packages, tell_me_about, config_utils, llm_client.langfuse_setup as langfuse_setup\n"
+                  "assert gist_packages.query_manager is None\n"
+                  "assert config_utils._loaded_config_path is None and langfuse_setup._observe is None\n"
+                  "assert not [m for m in ('openai', 'anthropic', 'vertexai', 'langfuse', 'tiktoken') if m in sys.modules]\n")
+        repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+        result = subprocess.run([sys.executable, "-c", script], cwd=repo_root, capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -47,4 +47,16 @@ def test_read_files():
     file_names = ["src/main/resources/application.yaml"]
     content = read_files(pf, file_names)
     print(content)
-    assert content != ""
\ No newline at end of file
+    assert content != ""
+
+def test_read_files_by_path():
+    root_path = os.path.join(os.path.dirname(__file__), '..')
+    project_path = os.path.join(root_path, "data/travel-service-dev")
+    pf = ProjectFiles(project_path)
+    pf.from_project()
+
+    path = "src/main/java/com/iky/travel/config/MongoConfig.java"
+    content, files_found, files_not_found = read_files(pf, [path])
+    assert files_found == ["MongoConfig.java"]
+    assert f'path="{path}"' in content
+    assert files_not_found == []
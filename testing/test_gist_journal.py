@@ -0,0 +1,59 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from projectfiles import ProjectFiles
+from gist_journal import GistJournal
+
+
+def _project(write_java, project_path):
+    for name in ["A", "B", "C"]:
+        write_java(project_path, "com.a", name)
+    pf = ProjectFiles(project_path, prefix_list=["src/main/java"], suffix_list=[".java"])
+    pf.from_project()
+    return pf
+
+def test_journal_resume(tmp_path, write_java):
+    project_path = str(tmp_path)
+    pf = _project(write_java, project_path)
+    journal = GistJournal.of_gist_file(pf.gist_file_path, fsync_every=1)
+    assert journal.journal_path == os.path.join(project_path, ".gist", "code_files.journal")
+    assert not journal.exists()
+
+    # the run is interrupted after the first two files
+    with journal:
+        for file in pf.files[:2]:
+            file.set_summary(f"summary | of {file.filename}\nwith lines")
+            pf.refresh_fingerprint(file)
+            journal.record(file)
+    assert journal.exists()
+    # a torn last line is ignored
+    with open(journal.journal_path, "a") as f:
+        f.write('{"path": "src/main/java/com/a/C.ja')
+
+    pf = ProjectFiles(project_path, prefix_list=["src/main/java"], suffix_list=[".java"])
+    pf.from_project()
+    resumed = GistJournal.of_gist_file(pf.gist_file_path).apply(pf.files)
+    assert [f.filename for f in resumed] == [f.filename for f in pf.files[:2]]
+    assert resumed[0].summary == f"summary | of {resumed[0].filename}\nwith lines"
+    assert not any(pf.is_code_file_changed(f) for f in resumed)
+    assert not pf.files[2].summary
+
+    # a file changed after it was journaled has to be gisted again
+    write_java(project_path, "com.a", resumed[1].filename[:-len(".java")], body=" int changed; ")
+    assert pf.is_code_file_changed(resumed[1])
+
+def test_journal_last_entry_wins_and_remove(tmp_path, write_java):
+    project_path = str(tmp_path)
+    pf = _project(write_java, project_path)
+    journal = GistJournal.of_gist_file(pf.gist_file_path)
+    file = pf.files[0]
+    with journal:
+        for summary in ["first summary", "second summary"]:
+            file.set_summary(summary)
+            journal.record(file)
+    assert journal.replay()[os.path.normpath(file.path)]["summary"] == "second summary"
+    journal.remove()
+    assert not journal.exists()
+    assert journal.replay() == {}
@@ -0,0 +1,123 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+import random
+import threading
+import pytest
+from gisting_engine import GistingEngine, is_rate_limit_error
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+def test_results_in_order_with_bounded_concurrency():
+    lock = threading.Lock()
+    in_flight = [0, 0]  # current, max
+
+    def gist(item):
+        with lock:
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight[1], in_flight[0])
+        time.sleep(random.uniform(0.001, 0.01))
+        with lock:
+            in_flight[0] -= 1
+        return f"summary of {item}"
+
+    progress = []
+    engine = GistingEngine(gist, max_concurrency=4, progress_callback=lambda completed, total, index, item, result, error: progress.append((completed, total, index, error)))
+    items = list(range(50))
+    assert engine.run(items) == [f"summary of {i}" for i in items]
+    assert 1 < in_flight[1] <= 4
+    assert [p[0] for p in progress] == list(range(1, 51))
+    assert sorted(p[2] for p in progress) == items
+    assert all(p[1] == 50 and p[3] is None for p in progress)
+
+def test_rate_limited_items_are_retried_and_concurrency_decreased():
+    attempts = {}
+    lock = threading.Lock()
+
+    def gist(item):
+        with lock:
+            attempts[item] = attempts.get(item, 0) + 1
+            first_attempt = attempts[item] == 1
+        if item % 5 == 0 and first_attempt:
+            raise RateLimitError("429 Too Many Requests")
+        return item * 2
+
+    engine = GistingEngine(gist, max_concurrency=8, initial_concurrency=8, base_delay=0.01)
+    assert engine.run(list(range(20))) == [i * 2 for i in range(20)]
+    assert engine.rate_limited_count == 4
+    assert engine.concurrency < 8
+    assert not engine.errors
+
+def test_errors_are_reported_and_the_others_done():
+    def gist(item):
+        if item == 3:
+            raise ValueError("bad file")
+        return item
+
+    failed = []
+    engine = GistingEngine(gist, max_concurrency=2,
+                           progress_callback=lambda completed, total, index, item, result, error: error and failed.append(index))
+    assert engine.run(list(range(6))) == [0, 1, 2, None, 4, 5]
+    assert failed == [3]
+    assert isinstance(engine.errors[3], ValueError)
+
+def test_is_rate_limit_error():
+    assert is_rate_limit_error(RateLimitError())
+    assert is_rate_limit_error(Exception("Error code: 429 - rate limit exceeded"))
+    assert not is_rate_limit_error(ValueError("bad file"))
+
+def test_admit_stops_sending_items():
+    admitted = []
+
+    def admit(item):
+        if len(admitted) >= 5:
+            return False
+        admitted.append(item)
+        return True
+
+    engine = GistingEngine(lambda item: item, max_concurrency=3, admit=admit)
+    assert engine.run(list(range(10))) == [0, 1, 2, 3, 4, None, None, None, None, None]
+    assert engine.not_run == [5, 6, 7, 8, 9]
+    assert not engine.errors
+
+def test_items_wait_for_their_dependencies():
+    # 0 and 1 are the leaves, 2 depends on them, 3 on 2; 4 depends on 5 which fails, 6 on 4
+    done = []
+    lock = threading.Lock()
+
+    def gist(item):
+        time.sleep(random.uniform(0.001, 0.01))
+        if item == 5:
+            raise ValueError("failed")
+        with lock:
+            done.append(item)
+        return item
+
+    engine = GistingEngine(gist, max_concurrency=4)
+    results = engine.run(list(range(7)), {2: [0, 1], 3: [2], 4: [5], 6: [4]})
+    assert results == [0, 1, 2, 3, None, None, None]
+    assert done.index(2) > max(done.index(0), done.index(1))
+    assert done.index(3) > done.index(2)
+    assert list(engine.errors) == [5]
+    assert sorted(engine.blocked) == [4, 6]
+
+def test_skipped_items_are_not_sent():
+    sent = []
+
+    def gist(item):
+        sent.append(item)
+        return f"summary of {item}"
+
+    progress = []
+    engine = GistingEngine(gist, max_concurrency=2, skip=lambda item: "unchanged" if item % 2 else None,
+                           progress_callback=lambda completed, total, index, item, result, error: progress.append((index, result)))
+    # 1 is skipped, 2 depends on it
+    assert engine.run([0, 1, 2, 3], {2: [1]}) == ["summary of 0", "unchanged", "summary of 2", "unchanged"]
+    assert sorted(sent) == [0, 2]
+    assert sorted(engine.skipped) == [1, 3]
+    assert sorted(progress) == [(0, "summary of 0"), (1, "unchanged"), (2, "summary of 2"), (3, "unchanged")]
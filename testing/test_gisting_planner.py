@@ -0,0 +1,92 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from projectfiles import ProjectFiles
+from java_structure import estimate_code_tokens
+from gisting_planner import plan_gisting, plan_file, java_output_tokens, config_output_tokens, chunk_output_tokens
+from gisting_prompts import build_gisting_prompt, pack_small_files, get_cached_instructions
+
+
+@pytest.fixture
+def project():
+    project_path = os.path.join(os.path.dirname(__file__), '..', "data/travel-service-dev")
+    pf = ProjectFiles(project_path, prefix_list=["src/main/java", "src/main/resources"], suffix_list=[".java"],
+                      resource_suffix_list=[".yaml", ".yml"])
+    pf.from_project()
+    return project_path, pf
+
+def test_plan_file(project, tmp_path):
+    project_path, pf = project
+    java_file = max(pf.files, key=lambda f: os.path.getsize(os.path.join(project_path, f.path)))
+    input_tokens, output_tokens, calls = plan_file((project_path, (java_file.filename, java_file.path, java_file.package),
+                                                    "full", 1500, 12000, estimate_code_tokens, False))
+    assert input_tokens == estimate_code_tokens(build_gisting_prompt(project_path, java_file))
+    assert (output_tokens, calls) == (java_output_tokens, 1)
+    skeleton_tokens, _, _ = plan_file((project_path, (java_file.filename, java_file.path, java_file.package),
+                                       "skeleton", 1500, 12000, estimate_code_tokens, False))
+    assert skeleton_tokens < input_tokens
+
+    # a large file is planned as its parts and the reduce call
+    folder = tmp_path / "src/main/java/com/a"
+    folder.mkdir(parents=True)
+    (folder / "Large.java").write_text("public class Large {\n" + "".join(f"    void m{i}() {{ call{i}(); }}\n" for i in range(2000)) + "}\n")
+    input_tokens, output_tokens, calls = plan_file((str(tmp_path), ("Large.java", "src/main/java/com/a/Large.java", "com.a"),
+                                                    "full", 1500, 4000, estimate_code_tokens, False))
+    assert calls > 3
+    assert output_tokens == java_output_tokens + chunk_output_tokens * (calls - 1)
+    assert plan_file((str(tmp_path), ("Gone.java", "src/main/java/com/a/Gone.java", "com.a"),
+                      "full", 1500, 4000, estimate_code_tokens, False)) == (0, 0, 0)
+
+def test_plan_gisting(project):
+    project_path, pf = project
+    files = pf.files + pf.resource_files
+    plan = plan_gisting(project_path, files, system_prompt="x" * 400, count_tokens=estimate_code_tokens,
+                        concurrency=8, max_calls=1000, period=60, max_tokens_per_min=10000)
+    assert plan.files == plan.calls == len(files)
+    prompts = sum(estimate_code_tokens(build_gisting_prompt(project_path, f)) for f in files)
+    assert plan.input_tokens == prompts + 100 * len(files)
+    assert plan.output_tokens == java_output_tokens * len(pf.files) + config_output_tokens * len(pf.resource_files)
+    assert plan.cost == pytest.approx((plan.input_tokens * 3 + plan.output_tokens * 15) / 1_000_000)
+    assert "tokens per minute" in plan.bound
+    assert plan.seconds == pytest.approx((plan.input_tokens + plan.output_tokens) / 10000 * 60)
+    assert f"{plan.files} files" in plan.report()
+
+    # with a single call at a time, the latency of the calls bounds the run
+    slow = plan_gisting(project_path, files, count_tokens=estimate_code_tokens, concurrency=1)
+    assert "1 calls at the same time" in slow.bound
+    # the counting in a pool of processes gives the same plan
+    pooled = plan_gisting(project_path, files * 4, count_tokens=estimate_code_tokens, max_workers=2)
+    assert pooled.input_tokens == 4 * plan_gisting(project_path, files, count_tokens=estimate_code_tokens).input_tokens
+
+    batch = plan_gisting(project_path, files, system_prompt="x" * 400, count_tokens=estimate_code_tokens, batch=True)
+    assert batch.cost == pytest.approx(plan.cost / 2)
+    assert batch.seconds is None
+    assert "up to 24 hours" in batch.report()
+
+def test_plan_packed_and_cached(project):
+    project_path, pf = project
+    files = pf.files + pf.resource_files
+    system_prompt = "x" * 400
+    plan = plan_gisting(project_path, files, system_prompt=system_prompt, count_tokens=estimate_code_tokens)
+
+    # the packs are planned as the prompts gist_files.packed_code_gisting sends: fewer calls and system prompts
+    units = pack_small_files(project_path, files, small_file_tokens=1000, max_pack_tokens=8000)
+    assert len(units) < len(files)
+    packed = plan_gisting(project_path, files, system_prompt=system_prompt, count_tokens=estimate_code_tokens, units=units)
+    assert (packed.files, packed.calls) == (len(files), len(units))
+    assert packed.output_tokens == plan.output_tokens
+    assert packed.input_tokens < plan.input_tokens
+    assert packed.cost < plan.cost
+
+    # with the cached instructions, the prompts only name the instructions and the prefix is read from the cache
+    cached_prompt = get_cached_instructions()
+    cached = plan_gisting(project_path, files, system_prompt=system_prompt, count_tokens=estimate_code_tokens,
+                          cached_prompt=cached_prompt, cache_read_price_ratio=0.1)
+    prefix_tokens = estimate_code_tokens(system_prompt + "\n" + cached_prompt)
+    assert cached.cached_tokens == (len(files) - 1) * prefix_tokens
+    assert cached.cost == pytest.approx(((cached.input_tokens - cached.cached_tokens) * 3 + cached.cached_tokens * 0.3
+                                         + cached.output_tokens * 15) / 1_000_000)
+    assert cached.cost < plan.cost
+    assert "read from the prompt cache" in cached.report()
@@ -0,0 +1,64 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from java_structure import estimate_code_tokens
+from gist_files import code_gisting, packed_code_gisting
+from gisting_prompts import (build_gisting_prompt, get_cached_instructions, can_cache_instructions, cached_instructions_prefix_tokens,
+                             system_prompt, instructions_java, instructions_test, instructions_config, instructions)
+from mock_llm_router import MockLLMQueryManager
+
+
+def _answer(prompt):
+    return '<File Name="x" Package="y">summary</File>'
+
+def test_instructions_in_the_cached_prompt(tmp_path, write_file):
+    project_path = str(tmp_path)
+    java_file = write_file(project_path, "src/main/java/com/a/A.java", "class A {}\n")
+    test_file = write_file(project_path, "src/test/java/com/a/ATest.java", "class ATest {}\n")
+    config_file = write_file(project_path, "src/main/resources/application.yml", "server:\n  port: 8080\n")
+
+    query_manager = MockLLMQueryManager(answer=_answer)
+    for code_file in [java_file, test_file, config_file]:
+        assert code_gisting(query_manager, project_path, code_file, verbose=False, cached_instructions=True) == "summary"
+    # one cached prompt with the guidelines of all the file types, the prompts name the guidelines of their file
+    cached_instructions = get_cached_instructions()
+    assert [cached for _, cached in query_manager.calls] == [cached_instructions] * 3
+    assert all(file_instructions in cached_instructions for file_instructions in [instructions_java, instructions_test, instructions_config, instructions])
+    for (prompt, _), guidelines in zip(query_manager.calls, ["main Java files", "test Java files", "configuration files"]):
+        assert instructions_java not in prompt and instructions_config not in prompt
+        assert f"Guidelines for {guidelines} given in the system prompt" in prompt
+
+    # the prompts of the same file type differ by the content only
+    other = write_file(project_path, "src/main/java/com/a/B.java", "class B {}\n")
+    code_gisting(query_manager, project_path, other, verbose=False, cached_instructions=True)
+    assert query_manager.calls[-1][1] == cached_instructions
+    assert query_manager.calls[-1][0] == query_manager.calls[0][0].replace("class A", "class B")
+
+    # a pack too
+    packed_code_gisting(query_manager, project_path, [java_file, other], verbose=False, cached_instructions=True)
+    assert query_manager.calls[-1][1] == cached_instructions
+    assert instructions_java not in query_manager.calls[-1][0]
+
+def test_cached_prefix_size():
+    # the providers do not cache a prefix below their minimum, the guidelines of one file type are not enough
+    assert estimate_code_tokens(system_prompt + instructions_java) < 1024
+    tokens = cached_instructions_prefix_tokens()
+    # with a margin, the estimate of about 4 characters per token is above the count of the tokenizers for English
+    assert tokens >= 1024 * 1.25
+    assert can_cache_instructions("anthropic", "claude-3-5-sonnet-20240620") == (True, tokens, 1024)
+    assert can_cache_instructions("openai", "gpt-4o") == (True, tokens, 1024)
+    # the Haiku models and gemini need a larger prefix, the option falls back to the instructions in the prompts
+    assert can_cache_instructions("anthropic", "claude-3-haiku-20240307") == (False, tokens, 2048)
+    assert not can_cache_instructions("gemini", "gemini-1.5-flash")[0]
+    assert not can_cache_instructions(None)[0]
+
+def test_instructions_in_the_prompt_by_default(tmp_path, write_file):
+    project_path = str(tmp_path)
+    java_file = write_file(project_path, "src/main/java/com/a/A.java", "class A {}\n")
+    query_manager = MockLLMQueryManager(answer=_answer)
+    code_gisting(query_manager, project_path, java_file, verbose=False)
+    prompt, cached = query_manager.calls[0]
+    assert cached is None
+    assert instructions_java in prompt
+    assert prompt == build_gisting_prompt(project_path, java_file)
@@ -0,0 +1,90 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+import pytest
+from projectfiles import CodeFile, ProjectFiles
+from gisting_scheduler import role_weight, reference_counts, rank_files, GistingBudget, ProgressivePersister
+
+
+@pytest.fixture
+def project(tmp_path, write_file):
+    project_path = str(tmp_path)
+    main = "src/main/java/com/a"
+    write_file(project_path, f"{main}/web/TripController.java",
+               "package com.a.web;\nimport com.a.service.TripService;\nimport com.a.model.TripDto;\npublic class TripController {}\n")
+    write_file(project_path, f"{main}/web/Helper.java", "package com.a.web;\npublic class Helper { TripController c; }\n")
+    write_file(project_path, f"{main}/service/TripService.java",
+               "package com.a.service;\nimport com.a.model.TripDto;\nimport static com.a.util.Dates.today;\npublic class TripService {}\n")
+    write_file(project_path, f"{main}/service/TripServiceImpl.java", "package com.a.service;\npublic class TripServiceImpl implements TripService {}\n")
+    write_file(project_path, f"{main}/model/TripDto.java", "package com.a.model;\npublic class TripDto {}\n")
+    write_file(project_path, f"{main}/util/Dates.java", "package com.a.util;\npublic class Dates {}\n")
+    write_file(project_path, "src/test/java/com/a/service/TripServiceTest.java",
+               "package com.a.service;\nimport com.a.model.TripDto;\npublic class TripServiceTest { TripService s; }\n")
+    write_file(project_path, "src/main/resources/application.yml", "server:\n  port: 8080\n")
+    write_file(project_path, "src/main/resources/logback.xml", "<configuration/>\n")
+    pf = ProjectFiles(project_path, prefix_list=["src/main/java", "src/test/java", "src/main/resources"], suffix_list=[".java"],
+                      resource_suffix_list=[".yml", ".xml"])
+    pf.from_project()
+    return project_path, pf
+
+def test_role_weight():
+    assert role_weight(CodeFile("TripController.java", "src/main/java/com/a/TripController.java", "com.a")) > \
+        role_weight(CodeFile("TripService.java", "src/main/java/com/a/TripService.java", "com.a")) > \
+        role_weight(CodeFile("Trip.java", "src/main/java/com/a/Trip.java", "com.a")) > \
+        role_weight(CodeFile("TripDto.java", "src/main/java/com/a/TripDto.java", "com.a")) > \
+        role_weight(CodeFile("TripControllerTest.java", "svc/src/test/java/com/a/TripControllerTest.java", "com.a"))
+    assert role_weight(CodeFile("application.yml", "src/main/resources/application.yml", None)) > \
+        role_weight(CodeFile("logback.xml", "src/main/resources/logback.xml", None))
+
+def test_reference_counts(project):
+    project_path, pf = project
+    referenced, package_dependents = reference_counts(project_path, pf.files)
+    main = "src/main/java/com/a"
+    # imported by the controller, the service and the test
+    assert referenced[f"{main}/model/TripDto.java"] == 3
+    # imported by the controller, named by the impl and the test of the same package
+    assert referenced[f"{main}/service/TripService.java"] == 3
+    # a static import
+    assert referenced[f"{main}/util/Dates.java"] == 1
+    assert referenced[f"{main}/web/TripController.java"] == 1
+    assert f"{main}/service/TripServiceImpl.java" not in referenced
+    assert package_dependents == {"com.a.model": 2, "com.a.service": 1, "com.a.util": 1}
+
+def test_rank_files(project):
+    project_path, pf = project
+    ranked = [f.filename for f in rank_files(project_path, pf.files + pf.resource_files)]
+    assert ranked[:2] == ["TripService.java", "TripController.java"]
+    assert ranked.index("application.yml") < ranked.index("logback.xml")
+    assert ranked.index("TripServiceImpl.java") < ranked.index("TripDto.java")
+    assert ranked[-1] == "TripServiceTest.java"
+    assert sorted(ranked) == sorted(f.filename for f in pf.files + pf.resource_files)
+
+def test_budget():
+    budget = GistingBudget(max_tokens=100)
+    assert budget.admit(60)
+    assert not budget.admit(60)
+    assert budget.admit(40)
+    assert budget.tokens == 100
+    assert GistingBudget().admit(10 ** 9)
+    assert not GistingBudget(max_seconds=0).admit(1)
+
+def test_budget_admit_files(project):
+    project_path, pf = project
+    sizes = [os.path.getsize(os.path.join(project_path, f.path)) for f in pf.files[:2]]
+    budget = GistingBudget(max_tokens=(sum(sizes) + 3) // 4)
+    assert budget.admit_files(project_path, pf.files[:2] + [CodeFile("Gone.java", "src/main/java/Gone.java", "com")])
+    assert not budget.admit_files(project_path, pf.files[2:3])
+
+def test_progressive_persister(project):
+    project_path, pf = project
+    persister = ProgressivePersister([pf], interval=3600)
+    pf.files[0].set_summary("summary")
+    persister.file_gisted(pf)
+    assert not os.path.exists(pf.gist_file_path or os.path.join(project_path, ".gist", "code_files.txt"))
+    persister.interval = 0
+    persister.file_gisted(pf)
+    loaded = {f.path: f for f in pf.load_code_files()}
+    assert loaded[pf.files[0].path].summary == "summary"
+    assert len(loaded) == len(pf.files) + len(pf.resource_files)
@@ -0,0 +1,192 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import re
+import pytest
+from projectfiles import CodeFile
+from java_structure import estimate_code_tokens, mask_comments_and_literals, split_members, split_java_source, extract_java_skeleton, javadoc_first_sentence
+from mock_llm_router import MockLLMQueryManager
+
+
+def _method(i):
+    return f'''
+    /**
+     * handles the case {i} {{ with a brace in the comment
+     */
+    public String handle{i}(String value) {{
+        if (value.equals("}}{i}")) {{
+            return value + '}}';
+        }}
+        return "case {i}"; // }}
+    }}
+'''
+
+def _large_class(methods=40, inner_methods=30):
+    inner = "".join(_method(1000 + i) for i in range(inner_methods))
+    return ("package com.a;\n\nimport java.util.List;\nimport java.util.Map;\n\n"
+            "@Service\npublic class Large extends Base implements Handler {\n"
+            "    private static final int[] SIZES = {1, 2, 3};\n"
+            "    private final Runnable task = new Runnable() { public void run() {} };\n"
+            + "".join(_method(i) for i in range(methods))
+            + "\n    static class Inner {\n" + inner + "    }\n}\n")
+
+def _without_class_lines(chunks):
+    # the "// in" lines start a chunk, or follow the end of a member inside a chunk
+    return "".join(re.sub(r"\n// in [^\n]*\n", "", re.sub(r"^// in [^\n]*\n", "", chunk)) for chunk in chunks)
+
+def test_mask_comments_and_literals():
+    source = 'int a = 1; // { x\n/* } */ String s = "{\\"}"; char c = \'}\';\n'
+    masked = mask_comments_and_literals(source)
+    assert len(masked) == len(source)
+    assert masked.count("\n") == source.count("\n")
+    assert "{" not in masked and "}" not in masked
+    assert masked.startswith("int a = 1;")
+
+def test_split_members():
+    source = "int a = 1;\nint[] b = {1, 2};\nvoid f() { if (x) { y(); } }\nRunnable r = () -> { };\n"
+    masked = mask_comments_and_literals(source)
+    members = [source[s:e].strip() for s, e in split_members(masked, 0, len(source))]
+    assert members == ["int a = 1;", "int[] b = {1, 2};", "void f() { if (x) { y(); } }", "Runnable r = () -> { };"]
+
+def test_small_source_is_one_chunk():
+    source = _large_class(methods=1, inner_methods=1)
+    assert split_java_source(source, max_chunk_tokens=10000) == [source]
+
+def test_split_along_class_and_method_boundaries():
+    source = _large_class()
+    max_tokens = 800
+    chunks = split_java_source(source, max_chunk_tokens=max_tokens)
+    assert len(chunks) > 5
+    assert all(estimate_code_tokens(chunk) <= max_tokens for chunk in chunks)
+    # the imports are in the first chunk, each method is whole in one of the chunks
+    assert "import java.util.Map;" in chunks[0]
+    for i in list(range(40)) + list(range(1000, 1030)):
+        assert sum(f"public String handle{i}(" in chunk for chunk in chunks) == 1
+        assert any(_method(i).strip() in chunk for chunk in chunks)
+    # the chunks name the class they are in
+    assert any("// in @Service public class Large extends Base implements Handler > static class Inner\n" in chunk for chunk in chunks)
+    # nothing but the "// in" lines is added
+    assert _without_class_lines(chunks) == source
+
+def test_oversized_method_is_split_along_lines():
+    body = "".join(f"        call{i}();\n" for i in range(400))
+    source = "public class Long {\n    void run() {\n" + body + "    }\n}\n"
+    chunks = split_java_source(source, max_chunk_tokens=500)
+    assert len(chunks) > 1
+    assert all(estimate_code_tokens(chunk) <= 500 for chunk in chunks)
+    assert _without_class_lines(chunks) == source
+
+
+def _answer(prompt):
+    part = re.search(r"Given below part (\d+) of", prompt)
+    if part:
+        return f"summary of part {part.group(1)}"
+    return '<File Name="Large.java" Package="com.a">combined</File>'
+
+
+def test_chunked_code_gisting(tmp_path, write_file):
+    from gist_files import code_gisting
+    code_file = write_file(str(tmp_path), "src/main/java/com/a/Large.java", _large_class())
+
+    query_manager = MockLLMQueryManager(answer=_answer)
+    assert code_gisting(query_manager, str(tmp_path), code_file, verbose=False, chunk_threshold=1600) == "combined"
+    parts = [p for p in query_manager.prompts if "Given below part" in p]
+    assert len(parts) == len(query_manager.prompts) - 1 > 1
+    reduce_prompt = query_manager.prompts[-1]
+    assert f"the {len(parts)} parts of the Java file Large.java" in reduce_prompt
+    assert all(f"summary of part {i + 1}" in reduce_prompt for i in range(len(parts)))
+
+    # below the threshold, the file is gisted in a single prompt
+    query_manager = MockLLMQueryManager(answer=_answer)
+    code_gisting(query_manager, str(tmp_path), code_file, verbose=False, chunk_threshold=0)
+    assert len(query_manager.prompts) == 1
+    assert "Given below full file content" in query_manager.prompts[0]
+
+
+SERVICE_SOURCE = """package com.a.service;
+
+import java.util.List;
+import org.springframework.stereotype.Service;
+
+/**
+ * Books the trips of the customers. Also cancels them.
+ *
+ * @author someone
+ */
+@Service
+@RequiredArgsConstructor
+public class BookingService implements Booking {
+    // the repository
+    private final BookingRepository repository;
+    private static final String PREFIX = "{booking}";
+
+    static {
+        init();
+    }
+
+    /**
+     * Books a trip
+     * for the customer.
+     * @param customerId the customer
+     */
+    @Transactional
+    @GetMapping("/book/{id}")
+    public Booking book(@PathVariable("id") String customerId,
+                        List<Trip> trips) throws BookingException {
+        if (trips.isEmpty()) { throw new BookingException("}"); }
+        return repository.save(new Booking(customerId, trips));
+    }
+
+    enum Status { BOOKED, CANCELLED }
+
+    interface Listener {
+        /** Called after a booking. */
+        void onBooked(Booking booking);
+    }
+}
+"""
+
+def test_javadoc_first_sentence():
+    assert javadoc_first_sentence("/**\n * Books a trip\n * for the customer. Then more.\n * @param x\n */") == "Books a trip for the customer."
+    assert javadoc_first_sentence("/** see {@link Foo#bar()} and the 1.2 version */") == "see {@link Foo#bar()} and the 1.2 version"
+    assert javadoc_first_sentence("/* not a javadoc */") == ""
+
+def test_extract_java_skeleton():
+    assert extract_java_skeleton(SERVICE_SOURCE) == """package com.a.service;
+import java.util.List;
+import org.springframework.stereotype.Service;
+/** Books the trips of the customers. */
+@Service @RequiredArgsConstructor public class BookingService implements Booking {
+    private final BookingRepository repository;
+    private static final String PREFIX = "{booking}";
+    static { ... }
+    /** Books a trip for the customer. */
+    @Transactional @GetMapping("/book/{id}") public Booking book(@PathVariable("id") String customerId, List<Trip> trips) throws BookingException;
+    enum Status {
+        BOOKED, CANCELLED
+    }
+    interface Listener {
+        /** Called after a booking. */
+        void onBooked(Booking booking);
+    }
+}
+"""
+
+def test_skeleton_prompt(tmp_path):
+    from gisting_prompts import build_gisting_prompt
+    folder = tmp_path / "src/main/java/com/a/service"
+    folder.mkdir(parents=True)
+    (folder / "BookingService.java").write_text(SERVICE_SOURCE)
+    code_file = CodeFile("BookingService.java", "src/main/java/com/a/service/BookingService.java", "com.a.service")
+
+    full = build_gisting_prompt(str(tmp_path), code_file)
+    skeleton = build_gisting_prompt(str(tmp_path), code_file, content_mode="skeleton")
+    assert "repository.save(" in full
+    assert "repository.save(" not in skeleton
+    assert extract_java_skeleton(SERVICE_SOURCE) in skeleton
+    assert len(skeleton) < len(full)
+    excerpt = build_gisting_prompt(str(tmp_path), code_file, content_mode="skeleton-excerpt", excerpt_tokens=20)
+    assert "the first part of the full file content" in excerpt
+    assert "package com.a.service;\n\nimport java.util.List;\n" in excerpt
+    assert "repository.save(" not in excerpt
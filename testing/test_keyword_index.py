@@ -0,0 +1,86 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from functions import efficient_file_search
+from keyword_index import KeywordIndex, tokenize, default_file_extensions
+
+
+def _project(write_file, project_path):
+    write_file(project_path, "src/main/java/com/a/OrderService.java",
+               "package com.a;\n\npublic class OrderService {\n    Order findById(Long id) { return repo.findById(id); }\n}\n")
+    write_file(project_path, "src/main/java/com/a/OrderController.java",
+               '@GetMapping("/api/v1/orders/{id}")\npublic class OrderController { OrderService orderService; }\n')
+    write_file(project_path, "src/main/resources/application.yml", "spring:\n  datasource:\n    url: jdbc:h2:mem:orders\n")
+    write_file(project_path, "README.md", "OrderService is not searched in markdown\n")
+
+def test_tokenize():
+    assert tokenize("OrderService.findById(id_1);") == {"orderservice", "findbyid", "id_1"}
+
+def test_search(tmp_path, write_file):
+    project_path = str(tmp_path)
+    _project(write_file, project_path)
+    index = KeywordIndex(project_path)
+    assert index.update() == (3, 0)
+    # a token, the part of a token, across tokens, ignoring the case
+    assert index.search("OrderService") == ["src/main/java/com/a/OrderController.java", "src/main/java/com/a/OrderService.java"]
+    assert index.search("derServ") == ["src/main/java/com/a/OrderController.java", "src/main/java/com/a/OrderService.java"]
+    assert index.search("repo.findById") == ["src/main/java/com/a/OrderService.java"]
+    assert index.search("/API/v1/orders") == ["src/main/java/com/a/OrderController.java"]
+    assert index.search("jdbc:h2") == ["src/main/resources/application.yml"]
+    # all the tokens are in the file, but not the keyword
+    assert index.search("findById repo") == []
+    assert index.search("PaymentService") == []
+    assert index.search("OrderService", [".yml"]) == []
+    # the index cannot answer
+    assert index.search("{}") is None
+    assert index.search("OrderService", [".md"]) is None
+
+def test_same_as_file_search():
+    project_path = os.path.join(os.path.dirname(__file__), '..', "data/travel-service-dev")
+    index = KeywordIndex(project_path, index_path=os.devnull)
+    index.update()
+    for keyword in ["Controller", "city", "findBy", "@RestController", "spring.datasource", "import java.util", "notInTheProject"]:
+        expected = efficient_file_search(project_path, keyword, file_extensions=default_file_extensions)
+        # efficient_file_search also reads the build output folders, which are not indexed
+        expected = [path for path in expected if path in index.files]
+        assert index.search(keyword) == sorted(expected), keyword
+
+def test_incremental_update(tmp_path, write_file):
+    project_path = str(tmp_path)
+    _project(write_file, project_path)
+    index = KeywordIndex(project_path)
+    index.update()
+    index_path = index.save()
+    assert index_path == os.path.join(project_path, ".gist", "keyword_index.json")
+
+    index = KeywordIndex(project_path).load()
+    assert index.update() == (0, 0)
+    # a changed file is tokenized again, a touched one is not, a removed one is dropped
+    write_file(project_path, "src/main/java/com/a/OrderService.java", "public class OrderService { PaymentClient client; }\n")
+    os.utime(os.path.join(project_path, "src/main/resources/application.yml"), ns=(1, 1))
+    os.remove(os.path.join(project_path, "src/main/java/com/a/OrderController.java"))
+    write_file(project_path, "src/main/java/com/b/PaymentClient.java", "public interface PaymentClient {}\n")
+    assert index.update() == (2, 1)
+    assert index.search("PaymentClient") == ["src/main/java/com/a/OrderService.java", "src/main/java/com/b/PaymentClient.java"]
+    assert index.search("findById") == []
+    assert index.search("OrderController") == []
+
+    index.save()
+    reloaded = KeywordIndex(project_path).load()
+    assert reloaded.update() == (0, 0)
+    assert sorted(reloaded.files) == sorted(index.files)
+    assert reloaded.search("PaymentClient") == index.search("PaymentClient")
+    assert reloaded.search("jdbc") == ["src/main/resources/application.yml"]
+
+def test_outdated_index_is_rebuilt(tmp_path, write_file):
+    project_path = str(tmp_path)
+    _project(write_file, project_path)
+    index = KeywordIndex(project_path, file_extensions=[".java"])
+    index.update()
+    index.save()
+    # indexed with other extensions
+    index = KeywordIndex(project_path).load()
+    assert index.files == {}
+    assert index.update() == (3, 0)
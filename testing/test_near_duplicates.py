@@ -0,0 +1,84 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from projectfiles import CodeFile, ProjectFiles
+from near_duplicates import (normalized_tokens, shingles, jaccard, MinHasher, find_near_duplicates, derive_summary, share_gists)
+
+
+def test_normalized_tokens():
+    a = "package com.a.city;\n// the city\npublic class CityAddException extends RuntimeException {}\n"
+    b = "package com.a.trip;\n/* trips */\npublic class TripAddException extends RuntimeException {}\n"
+    assert normalized_tokens(a, "CityAddException") == normalized_tokens(b, "TripAddException")
+    assert "$NAME" in normalized_tokens(a, "CityAddException")
+
+def test_package_replaced_in_statements_only():
+    source = ("package com.a.service;\nimport com.a.service.model.Trip;\nimport com.a.model.City;\n"
+              "public class TripService { Service service; com.a.service.Other other; }\n")
+    tokens = normalized_tokens(source, "TripService")
+    assert " ".join(tokens).startswith("package $ PACKAGE ; import $ PACKAGE . model . Trip ; import com . a . model . City ;")
+    # the identifiers named like a segment of the package are kept
+    assert tokens.count("service") == 2 and "$NAME" in tokens
+
+def test_minhash_estimates_jaccard():
+    a = set(range(0, 1000))
+    b = set(range(200, 1200))
+    hasher = MinHasher(num_perm=256)
+    signature_a, signature_b = hasher.signature(a), hasher.signature(b)
+    estimate = sum(x == y for x, y in zip(signature_a, signature_b)) / 256
+    assert jaccard(a, b) == pytest.approx(2 / 3)
+    assert estimate == pytest.approx(2 / 3, abs=0.1)
+
+def test_find_near_duplicates():
+    project_path = os.path.join(os.path.dirname(__file__), '..', "data/travel-service-dev")
+    pf = ProjectFiles(project_path, prefix_list=["src/main/java"], suffix_list=[".java"])
+    files = pf.get_files_from_folder(os.path.join(project_path, "src/main/java"))
+    fingerprints = {}
+    clusters = find_near_duplicates(project_path, files, fingerprints=fingerprints)
+    assert len(clusters) == 1
+    # the fingerprints of the contents compared
+    for file in clusters[0]:
+        file.set_fingerprint(*fingerprints[file.path])
+        assert not pf.is_code_file_changed(file)
+    names = sorted(f.filename for f in clusters[0])
+    assert names == ["CityAddException.java", "CityAlreadyExistsException.java", "CityNotFoundException.java",
+                     "CityUpdateException.java", "RedisException.java"]
+    # the one with a different constructor is not a near-duplicate
+    assert "CityDeleteException.java" not in names
+    # more bands of fewer rows find the less similar pairs too
+    assert len(find_near_duplicates(project_path, files, threshold=0.5, bands=32)[0]) == 6
+
+def test_no_clusters_through_chains(tmp_path, write_file):
+    def source(name, first, last):
+        methods = "".join(f"    void m{i}() {{ call{i}(x{i}); }}\n" for i in range(first, last))
+        return f"package com.a;\npublic class {name} {{\n{methods}}}\n"
+    # A is like B and B is like C, A is not like C
+    files = [write_file(str(tmp_path), f"src/main/java/com/a/{name}.java", source(name, first, last))
+             for name, first, last in [("A", 0, 40), ("B", 6, 44), ("C", 12, 48)]]
+    clusters = find_near_duplicates(str(tmp_path), files, threshold=0.75, bands=32)
+    assert [[f.filename for f in cluster] for cluster in clusters] == [["A.java", "B.java"]]
+
+def test_share_gists():
+    representative = CodeFile("CityAddException.java", "src/main/java/com/a/city/CityAddException.java", "com.a.city")
+    member = CodeFile("TripAddException.java", "src/main/java/com/a/trip/TripAddException.java", "com.a.trip")
+    other = CodeFile("X.java", "src/main/java/com/a/X.java", "com.a")
+    other_member = CodeFile("Y.java", "src/main/java/com/a/Y.java", "com.a")
+    representative.set_summary("<Purpose>CityAddException of com.a.city, see CityAddException.java; not a CityAddExceptionHandler</Purpose>")
+
+    # a summary of a previous run is not shared
+    other.set_summary("<Purpose>X of a previous run</Purpose>")
+    assert share_gists([[representative, member], [other, other_member]], set()) == []
+    assert not member.summary
+
+    derived = []
+    assert share_gists([[representative, member], [other, other_member]], {representative.path}, derived.append) == [member]
+    assert derived == [member]
+    assert member.summary.endswith("<Purpose>TripAddException of com.a.trip, see TripAddException.java; not a CityAddExceptionHandler</Purpose>")
+    assert "Derived from the gist of src/main/java/com/a/city/CityAddException.java" in member.summary
+    assert not other_member.summary
+
+def test_derive_summary_same_package():
+    a = CodeFile("A.java", "p/A.java", "com.a")
+    b = CodeFile("B.java", "p/B.java", "com.a")
+    assert derive_summary("A in com.a", a, b).endswith("\nB in com.a")
@@ -0,0 +1,211 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+import threading
+from projectfiles import ProjectFiles, CodeFile
+from package_gisting import (package_dag, gist_packages_concurrently, group_entries, cap_notes, map_reduce_package,
+                             estimate_notes_tokens)
+
+
+def _project_files(tmp_path, packages):
+    pf = ProjectFiles(str(tmp_path), prefix_list=["src/main/java"], suffix_list=[".java"])
+    files = []
+    for package in packages:
+        file = CodeFile("X.java", f"src/main/java/{package.replace('.', '/')}/X.java", package)
+        file.set_summary(f"summary of a file of {package}")
+        files.append(file)
+    pf.from_files(files)
+    return pf
+
+def test_package_dag(tmp_path):
+    pf = _project_files(tmp_path, ["com.a.x", "com.a.y", "com.b"])
+    nodes, dependencies = package_dag(pf.packages)
+    names = [node[0] for node in nodes]
+    assert sorted(names) == ["com", "com.a", "com.a.x", "com.a.y", "com.b"]
+    for index, needed in dependencies.items():
+        # the sub packages come first
+        assert all(i < index for i in needed)
+        assert sorted(names[i] for i in needed) == sorted(nodes[index][1])
+
+def test_gist_packages_concurrently(tmp_path):
+    pf = _project_files(tmp_path, ["com.a.x", "com.a.y", "com.b.x", "com.b.y"])
+    lock = threading.Lock()
+    in_flight = [0, 0]  # current, max
+    inputs = {}
+
+    def package_gisting(package, subpackage_notes, filenotes):
+        with lock:
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight[1], in_flight[0])
+        time.sleep(0.02)
+        with lock:
+            in_flight[0] -= 1
+            inputs[package] = subpackage_notes
+        return f"notes of {package}"
+
+    pf.package_gisting_func = package_gisting
+    engine = gist_packages_concurrently(pf, max_concurrency=4, persist_interval=0, verbose=False)
+    assert not engine.errors and not engine.blocked
+    assert {package: notes for package, notes in pf.package_notes.items()} == {
+        package: f"notes of {package}" for package in ["com", "com.a", "com.b", "com.a.x", "com.a.y", "com.b.x", "com.b.y"]}
+    # the leaves are gisted at the same time, a package has the notes of its sub packages
+    assert in_flight[1] > 1
+    assert "Sub package: com.a.x : notes of com.a.x" in inputs["com.a"]
+    assert "Sub package: com.a : notes of com.a" in inputs["com"]
+    # persisted while gisting
+    assert os.path.exists(os.path.join(str(tmp_path), ".gist", "package_notes.txt"))
+
+def test_failed_package_blocks_the_packages_above(tmp_path):
+    pf = _project_files(tmp_path, ["com.a.x", "com.b"])
+
+    def package_gisting(package, subpackage_notes, filenotes):
+        if package == "com.a.x":
+            raise ValueError("failed")
+        return f"notes of {package}"
+
+    pf.package_gisting_func = package_gisting
+    engine = gist_packages_concurrently(pf, persist_interval=None, verbose=False)
+    assert len(engine.errors) == 1
+    assert len(engine.blocked) == 2
+    assert dict(pf.package_notes) == {"com.b": "notes of com.b"}
+
+def test_incremental_package_gisting(tmp_path):
+    pf = _project_files(tmp_path, ["com.a.x", "com.a.y", "com.b"])
+    gisted = []
+
+    def package_gisting(package, subpackage_notes, filenotes):
+        gisted.append(package)
+        # the notes of com.a do not change with the files below it
+        return f"notes of {package}" if package == "com.a" else f"notes of {package} from {hash(filenotes + subpackage_notes)}"
+
+    pf.package_gisting_func = package_gisting
+    gist_packages_concurrently(pf, persist_interval=None, verbose=False)
+    assert sorted(gisted) == ["com", "com.a", "com.a.x", "com.a.y", "com.b"]
+    pf.persist_package_notes()
+
+    # reloaded with the hashes, nothing changed
+    pf = _project_files(tmp_path, ["com.a.x", "com.a.y", "com.b"])
+    pf.package_notes = pf.load_package_notes()
+    pf.package_input_hashes = pf.persistence.load_package_input_hashes(os.path.join(pf.gist_folder_path(), pf.default_package_notes_file))
+    pf.package_gisting_func = package_gisting
+    gisted.clear()
+    engine = gist_packages_concurrently(pf, persist_interval=None, verbose=False, incremental=True)
+    assert gisted == []
+    assert len(engine.skipped) == 5
+
+    # a file of com.a.x changed: com.a.x and com.a are gisted again, the notes of com.a are the same so com is not
+    pf.find_codefile_by_name("X.java", "com.a.x").set_summary("a new summary")
+    engine = gist_packages_concurrently(pf, persist_interval=None, verbose=False, incremental=True)
+    assert gisted == ["com.a.x", "com.a"]
+
+    # a file of com.b changed: com.b and com are gisted again
+    gisted.clear()
+    pf.find_codefile_by_name("X.java", "com.b").set_summary("a new summary")
+    gist_packages_concurrently(pf, persist_interval=None, verbose=False, incremental=True)
+    assert gisted == ["com.b", "com"]
+
+def test_package_input_hashes_sidecar(tmp_path):
+    pf = _project_files(tmp_path, ["com.a"])
+    pf.add_package_notes("com", "notes of com")
+    pf.add_package_notes("com.a", "notes of com.a", "hash of com.a")
+    pf.persist_package_notes()
+    file_path = os.path.join(pf.gist_folder_path(), pf.default_package_notes_file)
+    assert os.path.exists(os.path.join(pf.gist_folder_path(), "package_notes.hashes"))
+    assert pf.persistence.load_package_input_hashes(file_path) == {"com.a": "hash of com.a"}
+    assert dict(pf.load_package_notes(file_path)) == {"com": "notes of com", "com.a": "notes of com.a"}
+
+def test_group_entries():
+    entries = ["a" * 40, "b" * 40, "c" * 40, "d" * 200, "e" * 4]
+    # 10 tokens each, the large entry is alone
+    assert [[e[0] for e in group] for group in group_entries(entries, 25)] == [["a", "b"], ["c"], ["d"], ["e"]]
+
+def test_cap_notes():
+    notes = "first paragraph " * 5 + "\n\n" + "second paragraph " * 20
+    assert cap_notes(notes) == notes
+    assert cap_notes(notes, 1000) == notes
+    # cut at the end of the paragraph, or in the middle of a long one
+    assert cap_notes(notes, 30) == ("first paragraph " * 5).rstrip() + "\n..."
+    assert cap_notes("x" * 1000, 10) == "x" * 40 + "\n..."
+
+def test_map_reduce_package():
+    file_entries = [f"File: F{i}.java : {'summary ' * 20}\n\n" for i in range(20)]
+    subpackage_entries = [f"Sub package: com.a.s{i} : {'notes ' * 20}\n\n" for i in range(4)]
+    lock = threading.Lock()
+    calls = []
+
+    def package_gisting(package, subpackage_notes, filenotes):
+        with lock:
+            calls.append((package, subpackage_notes, filenotes))
+        return f"notes of {package}"
+
+    reduced = []
+
+    def reduce(package, partial_notes):
+        reduced.append(partial_notes)
+        return f"combined notes of {package}"
+
+    # fits in one prompt
+    assert map_reduce_package("com.a", subpackage_entries, file_entries, package_gisting, reduce) == "notes of com.a"
+    assert len(calls) == 1 and not reduced
+
+    calls.clear()
+    notes = map_reduce_package("com.a", subpackage_entries, file_entries, package_gisting, reduce, max_input_tokens=300)
+    assert notes == "combined notes of com.a"
+    # the groups are within the limit, each entry is in one of them
+    assert len(calls) > 2
+    assert all(estimate_notes_tokens(sub + files) <= 300 for _, sub, files in calls)
+    calls.sort(key=lambda call: int(call[0].split()[2]))
+    assert [package for package, _, _ in calls] == [f"com.a (part {i + 1} of {len(calls)})" for i in range(len(calls))]
+    assert "".join(sub for _, sub, _ in calls) == "".join(subpackage_entries)
+    assert "".join(files for _, _, files in calls) == "".join(file_entries)
+    assert len(reduced) == 1 and reduced[0].count("Part ") == len(calls)
+
+def test_map_reduce_package_in_levels():
+    file_entries = [f"File: F{i}.java : {'summary ' * 20}\n\n" for i in range(40)]
+    reduced = []
+
+    def reduce(package, partial_notes):
+        reduced.append(partial_notes)
+        return f"combined notes of {partial_notes.count('Part ')} parts"
+
+    # the notes of the parts are capped, and combined by groups until they fit in one prompt
+    notes = map_reduce_package("com.a", [], file_entries, lambda package, sub, files: "notes of a part " * 40, reduce,
+                               max_input_tokens=200, max_notes_tokens=60)
+    assert len(reduced) > 1
+    assert all(estimate_notes_tokens(partial_notes) <= 200 for partial_notes in reduced)
+    assert notes == f"combined notes of {reduced[-1].count('Part ')} parts"
+
+def test_map_reduce_package_large_parts():
+    file_entries = [f"File: F{i}.java : {'summary ' * 20}\n\n" for i in range(40)]
+    reduced = []
+
+    def reduce(package, partial_notes):
+        reduced.append(partial_notes)
+        return "combined notes " * 100
+
+    # the notes of the parts are not capped and each fills a prompt, they are cut so the reduces fit
+    notes = map_reduce_package("com.a", [], file_entries, lambda package, sub, files: "notes of a part " * 100, reduce,
+                               max_input_tokens=200)
+    assert notes == "combined notes " * 100
+    assert len(reduced) > 1
+    assert all(estimate_notes_tokens(partial_notes) <= 200 for partial_notes in reduced)
+
+def test_large_package_gisted_in_parts(tmp_path):
+    pf = _project_files(tmp_path, ["com.a", "com.b"])
+    for i in range(10):
+        file = CodeFile(f"Dto{i}.java", f"src/main/java/com/a/Dto{i}.java", "com.a")
+        file.set_summary("a data transfer object " * 10)
+        pf.add_file(file)
+    calls = []
+
+    def package_gisting(package, subpackage_notes, filenotes):
+        calls.append(package)
+        return f"notes of {package} " * 100
+
+    pf.package_gisting_func = package_gisting
+    engine = gist_packages_concurrently(pf, persist_interval=None, verbose=False, max_input_tokens=150, max_notes_tokens=50)
+    assert not engine.errors
+    assert any(package.startswith("com.a (part ") for package in calls)
+    assert all(estimate_notes_tokens(notes) <= 52 for notes in pf.package_notes.values())
@@ -0,0 +1,89 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import pytest
+from projectfiles import CodeFile, ProjectFiles
+from package_index import PackageIndex
+
+
+def _files():
+    return [CodeFile("A.java", "src/main/java/com/a/A.java", "com.a"),
+            CodeFile("B.java", "src/main/java/com/a/b/B.java", "com.a.b"),
+            CodeFile("C.java", "src/main/java/com/a/b/c/C.java", "com.a.b.c"),
+            CodeFile("package-info.java", "src/main/java/com/a/package-info.java", "com.a"),
+            CodeFile("package-info.java", "src/test/java/com/a/package-info.java", "com.a")]
+
+def test_tree_same_as_package_structure():
+    project_path = os.path.join(os.path.dirname(__file__), '..', "data/travel-service-dev")
+    pf = ProjectFiles(project_path, prefix_list=["src/main/java"], suffix_list=[".java"])
+    files = pf.get_files_from_folder(os.path.join(project_path, "src/main/java"))
+    index = PackageIndex(files)
+    assert json.dumps(index.tree) == json.dumps(pf.generate_package_structure(files))
+    for file in files:
+        assert file.filename in index.node(file.package)["files"]
+        assert file in index.code_files_of(file.package)
+    assert index.node("com.iky") is index.tree["com"]["sub_packages"]["com.iky"]
+    assert index.node("com.unknown") is None
+
+def test_add_and_remove_file():
+    files = _files()
+    index = PackageIndex(files)
+    assert index.code_files_of("com.a") == [files[0], files[3], files[4]]
+    assert index.find_code_file("com.a", "package-info.java") is files[3]
+    revision = index.revision
+
+    d = CodeFile("D.java", "src/main/java/com/d/D.java", "com.d")
+    index.add_file(d)
+    assert index.tree["com"]["sub_packages"]["com.d"]["files"] == ["D.java"]
+    assert index.revision > revision
+
+    # removing the last file of a package drops the emptied packages up to the first non empty one
+    assert index.remove_file(files[2])
+    assert "com.a.b.c" not in index
+    assert "com.a.b.c" not in index.node("com.a.b")["sub_packages"]
+    assert index.remove_file(files[1])
+    assert "com.a.b" not in index
+    assert "com.a" in index
+    assert not index.remove_file(files[1])
+
+    assert index.remove_file(files[3])
+    assert index.node("com.a")["files"] == ["A.java", "package-info.java"]
+    assert index.find_code_file("com.a", "package-info.java") is files[4]
+    assert index.subtree("com.d") == {"com.d": index.node("com.d")}
+    assert json.dumps(index.tree) == json.dumps(PackageIndex([files[0], files[4], d]).tree)
+
+def test_remove_to_empty():
+    files = _files() + [CodeFile("Main.java", "src/main/java/Main.java", "")]
+    index = PackageIndex(files)
+    assert index.node("")["files"] == ["Main.java"]
+    # the default package is pruned as the others, the index stays the same as one built from the remaining files
+    assert index.remove_file(files[-1])
+    assert "" not in index and "" not in index.tree
+    assert index.tree == PackageIndex(files[:-1]).tree
+    for file in files[:-1]:
+        assert index.remove_file(file)
+    assert index.tree == {} and len(index) == 0 and index.code_files == {}
+
+def test_project_files_add_and_remove_file():
+    pf = ProjectFiles("/tmp/project", prefix_list=["src/main/java"], suffix_list=[".java"])
+    files = _files()
+    pf.from_files(list(files))
+    subpackages, code_files = pf.find_subpackages_and_codefiles("com.a")
+    assert list(subpackages) == ["com.a.b"]
+    assert [f.path for f in code_files] == [files[0].path, files[3].path, files[4].path]
+
+    pf.remove_file(files[3])
+    assert pf.find_codefile_by_name("package-info.java") is files[4]
+    assert pf.find_codefile_by_path(files[3].path) is None
+    pf.remove_file(files[1])
+    pf.remove_file(files[2])
+    assert pf.find_package_node("com.a.b") is None
+    assert pf.packages["com"]["sub_packages"]["com.a"]["sub_packages"] == {}
+
+    e = CodeFile("E.java", "src/main/java/com/a/b/E.java", "com.a.b")
+    pf.add_file(e)
+    assert pf.find_codefile_by_name("E.java", "com.a.b") is e
+    assert pf.find_subpackages_and_codefiles("com.a.b") == ({}, [e])
+    assert e in pf.files
@@ -0,0 +1,79 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import re
+from projectfiles import CodeFile
+from gisting_prompts import pack_small_files, split_file_summaries
+from gist_files import packed_code_gisting
+from mock_llm_router import MockLLMQueryManager
+
+
+def _answer(answered=None):
+    """
+    answers the packed prompts with the summaries of the files it is told, the single file prompts with a summary of the class.
+    the replies end with a remark, after the stop condition of the prompt.
+    """
+    def answer(prompt):
+        # the prompt tells the format of the sources with <Source Name="...">
+        names = [name for name in re.findall(r'<Source Name="([^"]+)"', prompt) if name != "..."]
+        if names:
+            reply = "\n".join(f'<File Name="{name}" Package="com.a">packed summary of {name}</File>'
+                              for name in names if answered is None or name in answered)
+        else:
+            name = re.search(r"class (\w+)", prompt).group(1)
+            reply = f'<File Name="{name}.java" Package="com.a">single summary of {name}</File>'
+        return reply + "\nI hope these summaries help."
+    return answer
+
+
+def test_split_file_summaries():
+    response = ('<File Name="A.java" Package="com.a">a</File>\n'
+                '<File Name="B.java"  Path="src/test/java/B.java">\n<TestScenarios>b</TestScenarios>\n</File>')
+    assert split_file_summaries(response) == {"A.java": "a", "B.java": "\n<TestScenarios>b</TestScenarios>\n"}
+
+def test_pack_small_files(tmp_path, write_file):
+    project_path = str(tmp_path)
+    small = [write_file(project_path, f"src/main/java/com/a/E{i}.java", f"class E{i} {{}}\n") for i in range(8)]
+    large = write_file(project_path, "src/main/java/com/a/Large.java", "class Large {\n" + "    int x;\n" * 400 + "}\n")
+    test = write_file(project_path, "src/test/java/com/a/ETest.java", "class ETest {}\n")
+    same_name = write_file(project_path, "src/main/java/com/b/E0.java", "class E0 {}\n")
+    units = pack_small_files(project_path, small[:3] + [large, test] + small[3:] + [same_name])
+    assert [[f.path for f in unit] for unit in units] == [
+        [f.path for f in small[:6]],
+        [large.path],
+        [test.path],
+        [f.path for f in small[6:]] + [same_name.path],
+    ]
+    # no two files of the same name in a pack
+    assert all(len({f.filename for f in unit}) == len(unit) for unit in units)
+    assert sorted(f.path for unit in units for f in unit) == sorted(f.path for f in small + [large, test, same_name])
+
+def test_pack_keeps_same_names_apart(tmp_path, write_file):
+    project_path = str(tmp_path)
+    a = write_file(project_path, "src/main/java/com/a/E.java", "class E {}\n")
+    b = write_file(project_path, "src/main/java/com/b/E.java", "class E {}\n")
+    assert [len(unit) for unit in pack_small_files(project_path, [a, b])] == [1, 1]
+
+def test_packed_code_gisting(tmp_path, write_file):
+    project_path = str(tmp_path)
+    files = [write_file(project_path, f"src/main/java/com/a/E{i}.java", f"class E{i} {{}}\n") for i in range(3)]
+    gone = CodeFile("Gone.java", "src/main/java/com/a/Gone.java", "com.a")
+
+    query_manager = MockLLMQueryManager(answer=_answer())
+    assert packed_code_gisting(query_manager, project_path, files + [gone], verbose=False) == \
+        ["packed summary of E0.java", "packed summary of E1.java", "packed summary of E2.java", ""]
+    assert len(query_manager.prompts) == 1
+    assert "the full content of 3 files" in query_manager.prompts[0]
+    # the reply stops once the summary of the last file is closed
+    assert "hope" not in query_manager.replies[0]
+    assert query_manager.replies[0].count("</File>") == 3
+
+    # the files missing from the reply are gisted alone
+    query_manager = MockLLMQueryManager(answer=_answer(answered={"E1.java"}))
+    assert packed_code_gisting(query_manager, project_path, files, verbose=False) == \
+        ["single summary of E0", "packed summary of E1.java", "single summary of E2"]
+    assert len(query_manager.prompts) == 3
+    # the pack reply is not stopped when some files are missing, the single file replies are
+    assert "hope" in query_manager.replies[0]
+    assert all("hope" not in reply for reply in query_manager.replies[1:])
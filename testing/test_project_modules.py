@@ -0,0 +1,138 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from projectfiles import ProjectFiles
+from project_modules import ProjectModules, discover_modules, find_gradle_modules, find_maven_modules
+from project_scanner import ProjectScanner
+from sqlite_persistence import SqliteFilePersistence, migrate_from_text
+
+
+def _pom(*modules):
+    module_elements = "".join(f"<module>{m}</module>" for m in modules)
+    return f'<project xmlns="http://maven.apache.org/POM/4.0.0"><modules>{module_elements}</modules></project>'
+
+def _maven_project(write_file, project_path):
+    write_file(project_path, "pom.xml", _pom("api", "services"))
+    write_file(project_path, "api/pom.xml", _pom())
+    write_file(project_path, "api/src/main/java/com/a/api/Api.java", "package com.a.api;")
+    write_file(project_path, "services/pom.xml", _pom("orders", "../api"))
+    write_file(project_path, "services/orders/pom.xml", _pom())
+    write_file(project_path, "services/orders/src/main/java/com/a/orders/Order.java", "package com.a.orders;")
+    write_file(project_path, "services/orders/src/main/resources/application.yml", "a: 1")
+
+def test_single_module_project():
+    project_path = os.path.join(os.path.dirname(__file__), '..', "data/travel-service-dev")
+    project_modules = ProjectModules(project_path)
+    assert not project_modules.is_multi_module()
+    assert project_modules.gist_file_path(project_modules.modules[0]) == os.path.join(project_path, ".gist", "code_files.txt")
+    pf = project_modules.load(lazy=True)
+    assert len(pf.files) > 0
+
+def test_find_maven_modules(tmp_path, write_file):
+    project_path = str(tmp_path)
+    _maven_project(write_file, project_path)
+    assert find_maven_modules(project_path) == ["api", "services", "services/orders"]
+    # the aggregator "services" has no source root
+    assert [m.path for m in discover_modules(project_path)] == ["api", "services/orders"]
+
+def test_find_gradle_modules(tmp_path, write_file):
+    project_path = str(tmp_path)
+    write_file(project_path, "settings.gradle", "rootProject.name = 'shop'\n"
+                                            "include ':app', ':libs:core'\n"
+                                            "// include ':old'\n"
+                                            "include(\"tools\")\n"
+                                            "project(':tools').projectDir = file('build-tools/tools')\n")
+    assert find_gradle_modules(project_path) == ["app", "libs/core", "build-tools/tools"]
+
+def test_module_shards(tmp_path, write_file):
+    project_path = str(tmp_path)
+    _maven_project(write_file, project_path)
+    project_modules = ProjectModules(project_path, prefix_list=["src/main/java", "src/main/resources"])
+    assert project_modules.is_multi_module()
+    assert project_modules.gist_file_path(project_modules.select(["services/orders"])[0]) == \
+        os.path.join(project_path, ".gist", "modules", "services", "orders", "code_files.txt")
+    with pytest.raises(ValueError):
+        project_modules.select(["unknown"])
+
+    scanned = dict((module.name, pf) for module, pf in project_modules.from_project(suffix_list=[".java"]))
+    assert [f.path for f in scanned["api"].files] == ["api/src/main/java/com/a/api/Api.java"]
+    assert scanned["api"].files[0].package == "com.a.api"
+    assert [f.path for f in scanned["services/orders"].resource_files] == ["services/orders/src/main/resources/application.yml"]
+
+    for name, pf in scanned.items():
+        for file in pf.files + pf.resource_files:
+            file.set_summary(f"summary of {file.filename}")
+        pf.persist_code_files()
+        pf.package_notes["com.a"] = f"notes of {name}"
+        pf.persist_package_notes()
+    assert os.path.exists(os.path.join(project_path, ".gist", "modules", "api", "package_notes.txt"))
+    assert not os.path.exists(os.path.join(project_path, ".gist", "code_files.txt"))
+
+    pf = ProjectModules(project_path).load(lazy=True)
+    assert sorted(f.filename for f in pf.files) == ["Api.java", "Order.java"]
+    assert pf.find_codefile_by_name("Order.java", "com.a.orders").summary == "summary of Order.java"
+    assert pf.find_notes_of_package("com.a") == "notes of api\n\nnotes of services/orders"
+
+    pf = ProjectModules(project_path).load(["api"])
+    assert [f.filename for f in pf.files] == ["Api.java"]
+    assert pf.find_notes_of_package("com.a") == "notes of api"
+
+def test_ignored_files_are_scanned_unless_asked(tmp_path, write_file):
+    project_path = str(tmp_path)
+    _maven_project(write_file, project_path)
+    # e.g. generated sources checked in but ignored
+    write_file(project_path, "api/.gitignore", "Generated*.java\n")
+    write_file(project_path, "api/src/main/java/com/a/api/GeneratedApi.java", "package com.a.api;")
+    project_modules = ProjectModules(project_path, prefix_list=["src/main/java"])
+    api = dict((module.name, pf) for module, pf in project_modules.from_project(["api"], suffix_list=[".java"]))["api"]
+    assert sorted(f.filename for f in api.files) == ["Api.java", "GeneratedApi.java"]
+    api = dict((module.name, pf) for module, pf in project_modules.from_project(["api"], suffix_list=[".java"],
+                                                                              scanner=ProjectScanner(project_path)))["api"]
+    assert [f.filename for f in api.files] == ["Api.java"]
+
+def test_modules_of_a_project_gisted_as_a_whole(tmp_path, write_file):
+    project_path = str(tmp_path)
+    _maven_project(write_file, project_path)
+    pf = ProjectFiles(project_path, prefix_list=["api/src/main/java", "services/orders/src/main/java", "services/orders/src/main/resources"],
+                      suffix_list=[".java"])
+    pf.from_project()
+    for file in pf.files + pf.resource_files:
+        file.set_summary(f"summary of {file.filename}")
+    pf.persist_code_files()
+    assert pf.gist_file_path == os.path.join(project_path, ".gist", "code_files.txt")
+
+    # the modules without shard take the summaries of the gist of the whole project
+    project_modules = ProjectModules(project_path, prefix_list=["src/main/java", "src/main/resources"])
+    scanned = dict((module.name, pf) for module, pf in project_modules.from_project(suffix_list=[".java"]))
+    assert [f.summary for f in scanned["api"].files] == ["summary of Api.java"]
+    assert [f.summary for f in scanned["services/orders"].resource_files] == ["summary of application.yml"]
+    assert all(pf.loaded_gist_file_path == os.path.join(project_path, ".gist", "code_files.txt") for pf in scanned.values())
+    assert not scanned["api"].find_files_to_gist()
+
+    # a module gisted again is loaded from its shard, the others still from the gist of the whole project
+    orders = scanned["services/orders"]
+    orders.files[0].set_summary("new summary of Order.java")
+    orders.persist_code_files()
+    pf = ProjectModules(project_path).load()
+    assert sorted(f.summary for f in pf.files) == ["new summary of Order.java", "summary of Api.java"]
+    assert [f.summary for f in pf.resource_files] == ["summary of application.yml"]
+
+def test_module_shard_in_sqlite(tmp_path, write_file):
+    project_path = str(tmp_path)
+    _maven_project(write_file, project_path)
+    project_modules = ProjectModules(project_path, prefix_list=["src/main/java", "src/main/resources"])
+    for _, pf in project_modules.from_project(suffix_list=[".java"]):
+        for file in pf.files + pf.resource_files:
+            file.set_summary(f"summary of {file.filename}")
+        pf.persist_code_files()
+    # only the shard of the api module is migrated
+    api = project_modules.select(["api"])[0]
+    migrate_from_text(os.path.dirname(project_modules.gist_file_path(api)))
+    os.remove(project_modules.gist_file_path(api))
+
+    assert isinstance(project_modules.project_files(api).persistence, SqliteFilePersistence)
+    assert project_modules.is_gisted(api)
+    pf = ProjectModules(project_path).load()
+    assert sorted(f.summary for f in pf.files) == ["summary of Api.java", "summary of Order.java"]
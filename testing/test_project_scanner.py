@@ -0,0 +1,73 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from projectfiles import ProjectFiles
+from project_scanner import GitIgnore, ProjectScanner
+
+
+def _paths(files):
+    return [f.path for f in files]
+
+def test_scan_same_as_walk():
+    project_path = os.path.join(os.path.dirname(__file__), '..', "data/travel-service-dev")
+    pf = ProjectFiles(project_path)
+    java_files, resource_files = pf.get_files_of_project(), pf.get_resource_files()
+    assert len(java_files) > 0 and len(resource_files) > 0
+
+    scanned_files, scanned_resource_files = ProjectScanner(project_path).scan(pf.prefix_list, pf.suffix_list, pf.resource_suffix_list)
+    assert _paths(scanned_files) == _paths(java_files)
+    assert [f.package for f in scanned_files] == [f.package for f in java_files]
+    assert _paths(scanned_resource_files) == _paths(resource_files)
+    assert all(f.package == "resources" for f in scanned_resource_files)
+
+def test_from_project_with_scanner(tmp_path, write_file):
+    project_path = str(tmp_path)
+    write_file(project_path, "src/main/java/com/a/A.java")
+    write_file(project_path, "src/main/resources/application.yml")
+    pf = ProjectFiles(project_path, prefix_list=["src/main/java", "src/main/resources"], suffix_list=[".java"],
+                      scanner=ProjectScanner(project_path))
+    pf.from_project()
+    assert _paths(pf.files) == ["src/main/java/com/a/A.java"]
+    assert pf.files[0].package == "com.a"
+    assert _paths(pf.resource_files) == ["src/main/resources/application.yml"]
+    assert pf.find_codefile_by_name("A.java", "com.a") is pf.files[0]
+
+def test_scan_ignores_build_output_but_not_packages(tmp_path, write_file):
+    project_path = str(tmp_path)
+    write_file(project_path, "src/main/java/com/a/target/Target.java")
+    write_file(project_path, "src/main/java/com/a/build/Builder.java")
+    write_file(project_path, "target/generated-sources/src/main/java/com/a/Gen.java")
+    write_file(project_path, "module/build/src/main/java/com/a/Out.java")
+    scanner = ProjectScanner(project_path)
+    assert sorted(scanner.find_files(project_path, (".java",))) == [
+        "src/main/java/com/a/build/Builder.java", "src/main/java/com/a/target/Target.java"]
+
+def test_scan_gitignore(tmp_path, write_file):
+    project_path = str(tmp_path)
+    write_file(project_path, ".gitignore", "# build\n*.generated.java\nsrc/main/java/com/a/tmp/\n")
+    write_file(project_path, "src/main/java/com/a/A.java")
+    write_file(project_path, "src/main/java/com/a/A.generated.java")
+    write_file(project_path, "src/main/java/com/a/tmp/T.java")
+    write_file(project_path, "src/main/java/com/b/.gitignore", "*.java\n!Keep.java\n")
+    write_file(project_path, "src/main/java/com/b/Drop.java")
+    write_file(project_path, "src/main/java/com/b/Keep.java")
+    files, _ = ProjectScanner(project_path).scan(["src/main/java"], [".java"], [])
+    assert sorted(_paths(files)) == ["src/main/java/com/a/A.java", "src/main/java/com/b/Keep.java"]
+
+    files, _ = ProjectScanner(project_path, use_gitignore=False).scan(["src/main/java"], [".java"], [])
+    assert len(files) == 5
+
+@pytest.mark.parametrize("pattern, path, is_dir, expected", [
+    ("target/", "target", True, True),
+    ("target/", "target", False, None),
+    ("target/", "a/target", True, True),
+    ("/target", "a/target", True, None),
+    ("docs/*.md", "docs/a.md", False, True),
+    ("docs/*.md", "docs/sub/a.md", False, None),
+    ("**/gen/*.java", "a/b/gen/A.java", False, True),
+    ("*.log", "a/b.log", False, True),
+])
+def test_gitignore_match(pattern, path, is_dir, expected):
+    assert GitIgnore([pattern]).match(path, is_dir) is expected
@@ -105,6 +105,19 @@ def test_code_file_json():
     cf2 = CodeFile.from_json(json_str)
     assert cf.filename == cf2.filename
 
+def test_code_file_compact():
+    cf = CodeFile("CityDTO.java", "src/main/java/com/iky/travel/domain/dto/CityDTO.java", "com.iky.travel.domain.dto")
+    cf2 = CodeFile("City.java", "src/main/java/com/iky/travel/domain/dto/City.java", "".join(["com.iky.travel.", "domain.dto"]))
+    assert not hasattr(cf, "__dict__")
+    assert cf.path == "src/main/java/com/iky/travel/domain/dto/CityDTO.java"
+    # the package strings are shared
+    assert cf.package is cf2.package
+    cf.path = "CityDTO.java"
+    assert cf.path == "CityDTO.java"
+    data = json.loads(cf.to_json())
+    assert data["path"] == "CityDTO.java"
+    assert data["package"] == "com.iky.travel.domain.dto"
+
 def test_packages_json():
     packages = {
         "com": {
@@ -309,6 +322,119 @@ def test_find_codefile_by_name_resources():
     print(codefile)
     assert codefile is not None
 
+def test_find_codefile_by_path():
+    root_path = os.path.join(os.path.dirname(__file__), '..')
+    project_path = os.path.join(root_path, "data/travel-service-dev")
+    pf = ProjectFiles(project_path)
+    pf.from_project()
+    codefile = pf.find_codefile_by_path("src/main/java/com/iky/travel/config/MongoConfig.java")
+    assert codefile is not None
+    assert codefile.filename == "MongoConfig.java"
+    assert codefile.package == "com.iky.travel.config"
+    # leading ./ is normalized
+    assert pf.find_codefile_by_path("./src/main/resources/application.yaml") is not None
+    assert pf.find_codefile_by_path("src/main/java/com/iky/travel/config/NoSuchFile.java") is None
+
+def test_find_codefile_indexes_from_files():
+    pf = ProjectFiles("some/root")
+    first = CodeFile("Foo.java", "src/main/java/com/a/Foo.java", "com.a")
+    second = CodeFile("Foo.java", "src/main/java/com/b/Foo.java", "com.b")
+    pf.from_files([first, second])
+    # without package, the first file wins
+    assert pf.find_codefile_by_name("Foo.java") is first
+    assert pf.find_codefile_by_name("Foo.java", "com.b") is second
+    assert pf.find_codefile_by_name("Foo.java", "com.c") is None
+    assert pf.find_codefile_by_path("src/main/java/com/b/Foo.java") is second
+    subpackages, codefiles = pf.find_subpackages_and_codefiles("com.b")
+    assert subpackages == {}
+    assert codefiles == [second]
+
+def test_find_codefile_indexes_from_gist_files():
+    root_path = os.path.join(os.path.dirname(__file__), '..')
+    project_path = os.path.join(root_path, "data/travel-service-dev")
+    pf = ProjectFiles(project_path)
+    pf.from_gist_files()
+    for file in pf.files + pf.resource_files:
+        assert pf.find_codefile_by_path(file.path) is file
+        assert pf.find_codefile_by_name(file.filename, file.package) is file
+
+def test_persist_code_files_fingerprint(tmp_path, write_java):
+    project_path = str(tmp_path)
+    write_java(project_path, "com.a", "A")
+    pf = ProjectFiles(project_path, prefix_list=["src/main/java"], suffix_list=[".java"])
+    pf.from_project()
+    file = pf.find_codefile_by_name("A.java")
+    file.set_summary("summary of A")
+    pf.refresh_fingerprint(file)
+    gist_file_path = pf.persist_code_files()
+    files = pf.load_code_files(gist_file_path)
+    assert len(files) == 1
+    assert files[0].summary == "summary of A"
+    assert files[0].content_hash == file.content_hash
+    assert files[0].mtime_ns == file.mtime_ns
+    assert files[0].size == file.size
+
+def test_find_files_to_gist_incremental(tmp_path, write_java):
+    project_path = str(tmp_path)
+    for name in ["A", "B", "C"]:
+        write_java(project_path, "com.a", name)
+    pf = ProjectFiles(project_path, prefix_list=["src/main/java"], suffix_list=[".java"])
+    pf.from_project()
+    for file in pf.files:
+        file.set_summary(f"summary of {file.filename}")
+        pf.refresh_fingerprint(file)
+    pf.persist_code_files()
+
+    # B is edited, C is deleted, D is new, A is only touched
+    write_java(project_path, "com.a", "B", body=" int x; ")
+    os.remove(os.path.join(project_path, "src/main/java/com/a/C.java"))
+    write_java(project_path, "com.a", "D")
+    a_path = os.path.join(project_path, "src/main/java/com/a/A.java")
+    os.utime(a_path, ns=(0, 0))
+
+    pf2 = ProjectFiles(project_path, prefix_list=["src/main/java"], suffix_list=[".java"])
+    pf2.from_project()
+    assert [f.filename for f in pf2.removed_files] == ["C.java"]
+    assert pf2.find_codefile_by_name("A.java").summary == "summary of A.java"
+    to_gist = sorted(f.filename for f in pf2.find_files_to_gist())
+    assert to_gist == ["B.java", "D.java"]
+    # the touched file got its new mtime recorded, so it is not hashed again
+    assert pf2.find_codefile_by_name("A.java").mtime_ns == 0
+
+def test_from_gist_files_lazy():
+    root_path = os.path.join(os.path.dirname(__file__), '..')
+    project_path = os.path.join(root_path, "data/travel-service-dev")
+    eager = ProjectFiles(project_path)
+    eager.from_gist_files()
+    pf = ProjectFiles(project_path)
+    pf.from_gist_files(lazy=True)
+    assert [f.path for f in pf.files] == [f.path for f in eager.files]
+    assert [f.path for f in pf.resource_files] == [f.path for f in eager.resource_files]
+    # nothing is decoded until a summary is needed
+    assert not any(f.is_summary_loaded() for f in pf.files + pf.resource_files)
+    codefile = pf.find_codefile_by_name("CityController.java")
+    assert codefile.summary == eager.find_codefile_by_name("CityController.java").summary
+    assert codefile.is_summary_loaded()
+    assert pf.get_file_notes() == eager.get_file_notes()
+
+def test_lazy_gist_file_survives_rewrite(tmp_path, write_java):
+    project_path = str(tmp_path)
+    write_java(project_path, "com.a", "A")
+    pf = ProjectFiles(project_path, prefix_list=["src/main/java"], suffix_list=[".java"])
+    pf.from_project()
+    pf.files[0].set_summary("first summary")
+    pf.persist_code_files()
+
+    lazy = ProjectFiles(project_path, prefix_list=["src/main/java"], suffix_list=[".java"])
+    lazy.from_gist_files(lazy=True)
+    # the gist file is replaced while the lazy project still maps the old one
+    pf.files[0].set_summary("second summary")
+    pf.persist_code_files()
+    assert lazy.files[0].summary == "first summary"
+
+    lazy.files[0].set_summary("set by caller")
+    assert lazy.files[0].summary == "set by caller"
+
 #def test_update_and_get_file_summary():
 #    root_path = os.path.join(os.path.dirname(__file__), '..')
 #    project_path = os.path.join(root_path, "data/travel-service-dev")
@@ -325,4 +451,29 @@ def test_find_codefile_by_name_resources():
 #    retrieved_summary = pf.get_file_summary(test_file_path)
 #    assert retrieved_summary is not None
 #   assert retrieved_summary['summary'] == test_summary
-#   assert retrieved_summary['filename'] == "TravelController.java"
\ No newline at end of file
+#   assert retrieved_summary['filename'] == "TravelController.java"
+def test_to_tree_budget(tmp_path, write_java):
+    project_path = str(tmp_path)
+    for package in ["com.a.b.c", "com.a.b.d", "com.a.e"]:
+        for i in range(20):
+            write_java(project_path, package, f"Class{i}")
+    test_folder = os.path.join(project_path, "src/test/java/com/a/t")
+    os.makedirs(test_folder)
+    with open(os.path.join(test_folder, "ATest.java"), "w") as f:
+        f.write("package com.a.t;")
+    pf = ProjectFiles(project_path, prefix_list=["src/main/java", "src/test/java"], suffix_list=[".java"])
+    pf.from_project()
+
+    full_tree = pf.to_tree()
+    assert "Class19.java" in full_tree and "ATest.java" in full_tree
+    assert pf.to_tree(elide_tests=True).count("\n") == full_tree.count("\n") - 2
+    assert "com.a.e/ (20 files)" in pf.to_tree(collapse_leaf_packages=True)
+    assert "com.a.b/ (40 files in 3 packages)" in pf.to_tree(max_depth=3)
+
+    small_tree = pf.to_tree(max_tokens=60)
+    assert len(small_tree) // 4 <= 60
+    assert "ATest.java" not in small_tree and "Class1.java" not in small_tree
+    # memoized until the package index changes
+    assert pf.to_tree(max_tokens=60) is small_tree
+    pf.remove_file(pf.find_codefile_by_name("ATest.java"))
+    assert "com.a.t" not in pf.to_tree()
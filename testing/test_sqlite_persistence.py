@@ -0,0 +1,118 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import shutil
+import sqlite3
+from projectfiles import CodeFile, ProjectFiles
+from sqlite_persistence import SqliteFilePersistence, migrate_from_text
+
+def _code_file(name, package, summary):
+    code_file = CodeFile(f"{name}.java", f"src/main/java/{package.replace('.', '/')}/{name}.java", package)
+    code_file.set_summary(summary)
+    return code_file
+
+def test_persist_and_load_code_files(tmp_path):
+    persistence = SqliteFilePersistence()
+    gist_file_path = str(tmp_path / "code_files.txt")
+    # summaries with the separator of the text format and "key: value" lines are kept as is
+    files = [
+        _code_file("A", "com.a", "A | B\nNote: not a new key"),
+        _code_file("B", "com.b", "summary of B"),
+    ]
+    files[0].set_fingerprint("abc", 123, 45)
+    db_path = persistence.persist_code_files(files, gist_file_path)
+    assert db_path == str(tmp_path / "gist.db")
+
+    loaded = persistence.load_code_files(gist_file_path)
+    assert [f.path for f in loaded] == [f.path for f in files]
+    assert loaded[0].summary == "A | B\nNote: not a new key"
+    assert (loaded[0].content_hash, loaded[0].mtime_ns, loaded[0].size) == ("abc", 123, 45)
+
+    # point lookups
+    assert persistence.load_code_file(gist_file_path, files[1].path).summary == "summary of B"
+    assert persistence.load_code_file(gist_file_path, "no/such/File.java") is None
+    assert [f.filename for f in persistence.load_code_files_of_package(gist_file_path, "com.a")] == ["A.java"]
+
+def test_upsert_code_files(tmp_path):
+    persistence = SqliteFilePersistence(str(tmp_path / "store.db"))
+    gist_file_path = str(tmp_path / "code_files.txt")
+    persistence.persist_code_files([_code_file("A", "com.a", "old A"), _code_file("B", "com.a", "B")], gist_file_path)
+    persistence.upsert_code_files([_code_file("A", "com.a", "new A"), _code_file("C", "com.a", "C")], gist_file_path)
+    loaded = persistence.load_code_files(gist_file_path)
+    assert [(f.filename, f.summary) for f in loaded] == [("A.java", "new A"), ("B.java", "B"), ("C.java", "C")]
+    persistence.delete_code_files([loaded[1].path], gist_file_path)
+    assert len(persistence.load_code_files(gist_file_path)) == 2
+
+def test_package_notes(tmp_path):
+    persistence = SqliteFilePersistence()
+    file_path = str(tmp_path / "package_notes.txt")
+    assert not persistence.package_notes_exist(file_path)
+    persistence.persist_package_notes({"com.a": "notes | of a", "com.b": "notes of b"}, file_path)
+    assert persistence.package_notes_exist(file_path)
+    assert dict(persistence.load_package_notes(file_path)) == {"com.a": "notes | of a", "com.b": "notes of b"}
+    assert persistence.load_package_note(file_path, "com.b") == "notes of b"
+    assert persistence.load_package_note(file_path, "com.c") is None
+
+def test_package_input_hashes(tmp_path):
+    persistence = SqliteFilePersistence()
+    file_path = str(tmp_path / "package_notes.txt")
+    assert persistence.load_package_input_hashes(file_path) == {}
+    persistence.persist_package_notes({"com.a": "notes of a", "com.b": "notes of b"}, file_path, {"com.a": "hash of a"})
+    assert persistence.load_package_input_hashes(file_path) == {"com.a": "hash of a"}
+    persistence.upsert_package_notes({"com.b": "new notes of b"}, file_path, {"com.b": "hash of b"})
+    assert persistence.load_package_input_hashes(file_path) == {"com.a": "hash of a", "com.b": "hash of b"}
+
+def test_package_notes_table_migrated(tmp_path):
+    # a store made before the input hashes were recorded
+    conn = sqlite3.connect(str(tmp_path / "gist.db"))
+    conn.execute("CREATE TABLE package_notes (package TEXT PRIMARY KEY, notes TEXT NOT NULL DEFAULT '')")
+    conn.execute("INSERT INTO package_notes VALUES ('com.a', 'notes of a')")
+    conn.commit()
+    conn.close()
+    persistence = SqliteFilePersistence()
+    file_path = str(tmp_path / "package_notes.txt")
+    assert dict(persistence.load_package_notes(file_path)) == {"com.a": "notes of a"}
+    assert persistence.load_package_input_hashes(file_path) == {}
+    persistence.persist_package_notes({"com.a": "notes of a"}, file_path, {"com.a": "hash of a"})
+    assert persistence.load_package_input_hashes(file_path) == {"com.a": "hash of a"}
+
+def test_wal_mode(tmp_path):
+    persistence = SqliteFilePersistence()
+    gist_file_path = str(tmp_path / "code_files.txt")
+    persistence.persist_code_files([_code_file("A", "com.a", "A")], gist_file_path)
+    conn = sqlite3.connect(str(tmp_path / "gist.db"))
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    # another connection can read while the store is open
+    assert conn.execute("SELECT count(*) FROM code_files").fetchone()[0] == 1
+    conn.close()
+
+def test_migrate_from_text(tmp_path):
+    root_path = os.path.join(os.path.dirname(__file__), '..')
+    project_path = os.path.join(root_path, "data/travel-service-dev")
+    text_pf = ProjectFiles(project_path)
+    text_pf.from_gist_files()
+
+    # copy the sources and the text gist files, then migrate
+    shutil.copytree(os.path.join(project_path, "src"), tmp_path / "src")
+    shutil.copytree(os.path.join(project_path, ".gist"), tmp_path / ".gist")
+    num_files, num_packages = migrate_from_text(str(tmp_path / ".gist"))
+    assert num_files == len(text_pf.files) + len(text_pf.resource_files)
+    assert num_packages == len(text_pf.package_notes)
+
+    # the sqlite store is picked up by default once it exists
+    pf = ProjectFiles(str(tmp_path))
+    assert isinstance(pf.persistence, SqliteFilePersistence)
+    pf.from_gist_files()
+    assert [f.path for f in pf.files] == [f.path for f in text_pf.files]
+    assert pf.find_codefile_by_name("CityController.java").summary == text_pf.find_codefile_by_name("CityController.java").summary
+    assert dict(pf.package_notes) == dict(text_pf.package_notes)
+
+def test_load_code_files_lazy(tmp_path):
+    persistence = SqliteFilePersistence()
+    gist_file_path = str(tmp_path / "code_files.txt")
+    persistence.persist_code_files([_code_file("A", "com.a", "summary of A"), _code_file("B", "com.b", "summary of B")], gist_file_path)
+    files = persistence.load_code_files_lazy(gist_file_path)
+    assert [f.filename for f in files] == ["A.java", "B.java"]
+    assert not files[1].is_summary_loaded()
+    assert files[1].summary == "summary of B"
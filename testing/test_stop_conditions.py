@@ -0,0 +1,49 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from stop_conditions import stop_after, next_steps_complete
+
+
+def _stopped_at(reply, stop_condition, chunk_size=4):
+    """
+    the text of the reply streamed by chunks until the stop condition is true
+    """
+    text = ""
+    for i in range(0, len(reply), chunk_size):
+        text += reply[i:i + chunk_size]
+        if stop_condition(text):
+            break
+    return text
+
+def test_stop_after():
+    reply = '<File Name="A.java" Package="com.a">a</File>\n<File Name="B.java" Package="com.a">b</File>\nThat is all.'
+    # the reply stops with the chunk closing the tag
+    text = _stopped_at(reply, stop_after("</File>"))
+    assert text.count("</File>") == 1 and "B.java" not in text
+    text = _stopped_at(reply, stop_after("</File>", 2))
+    assert text.count("</File>") == 2 and "That is all." not in text
+    assert _stopped_at(reply, stop_after("</File>", 3)) == reply
+
+def test_next_steps_complete():
+    reply = ("The class A calls B.\n\n**Next Steps**\n"
+             "[I need to search <keyword>OrderService</keyword>]\n"
+             "[I need content of files: <file>A.java</file>,\n<file>B.java</file>]\n\n"
+             "Let me know once you have them, I will then explain the flow in detail.\n")
+    text = _stopped_at(reply, next_steps_complete)
+    assert "<file>B.java</file>]" in text
+    assert "explain the flow" not in text
+
+def test_next_steps_keep_key_findings():
+    reply = ("**Next Steps**\n[I need info about packages: <package>com.a</package>]\n\n"
+             "KEY_FINDINGS:\n- [ARCHITECTURE] A calls B\n- [DATA_FLOW] B writes the orders\n\n"
+             "Anything else can wait.\n")
+    text = _stopped_at(reply, next_steps_complete)
+    assert "[DATA_FLOW] B writes the orders" in text
+    assert "can wait" not in text
+
+def test_next_steps_not_complete():
+    # no Next Steps, or the section is the end of the reply
+    assert not next_steps_complete("The class A calls B.\n\nIt is done.\n")
+    reply = "The class A calls B.\n\n### Next Steps\nNo additional information is needed.\n"
+    assert _stopped_at(reply, next_steps_complete) == reply
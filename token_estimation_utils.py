@@ -1,10 +1,18 @@
-import tiktoken
 import os
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+
+@lru_cache(maxsize=None)
+def get_encoding(encoding_name: str = "cl100k_base"):
+    """The tiktoken encoding, loaded once per process."""
+    # imported on first use, tiktoken is slow to import and most commands only count tokens once they query the LLM
+    import tiktoken
+    return tiktoken.get_encoding(encoding_name)
 
 def estimate_tokens(text: str, encoding_name: str = "cl100k_base") -> int:
     """Estimate the number of tokens in a given text."""
-    encoding = tiktoken.get_encoding(encoding_name)
-    return len(encoding.encode(text))
+    # special tokens in the text (e.g. "<|endoftext|>" in a source file) are counted as plain text
+    return len(get_encoding(encoding_name).encode(text, disallowed_special=()))
 
 def estimate_file_tokens(file_path: str, encoding_name: str = "cl100k_base") -> int:
     """Estimate the number of tokens in a file."""
@@ -12,21 +20,22 @@ def estimate_file_tokens(file_path: str, encoding_name: str = "cl100k_base") ->
         content = file.read()
     return estimate_tokens(content, encoding_name)
 
-def estimate_project_tokens(project_root: str, file_extensions: list[str], encoding_name: str = "cl100k_base") -> dict:
-    """Estimate tokens for all files with specified extensions in a project."""
-    total_tokens = 0
-    file_token_counts = {}
+def estimate_files_tokens(file_paths: list[str], encoding_name: str = "cl100k_base", max_workers: int = None) -> dict:
+    """Estimate the tokens of the files, counted in a pool of processes since the encoding is CPU bound."""
+    if len(file_paths) < 64:
+        return {file_path: estimate_file_tokens(file_path, encoding_name) for file_path in file_paths}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        counts = executor.map(estimate_file_tokens, file_paths, [encoding_name] * len(file_paths), chunksize=32)
+        return dict(zip(file_paths, counts))
 
-    for root, _, files in os.walk(project_root):
-        for file in files:
-            if any(file.endswith(ext) for ext in file_extensions):
-                file_path = os.path.join(root, file)
-                tokens = estimate_file_tokens(file_path, encoding_name)
-                file_token_counts[file_path] = tokens
-                total_tokens += tokens
+def estimate_project_tokens(project_root: str, file_extensions: list[str], encoding_name: str = "cl100k_base", max_workers: int = None) -> dict:
+    """Estimate tokens for all files with specified extensions in a project."""
+    suffixes = tuple(file_extensions)
+    file_paths = [os.path.join(root, file) for root, _, files in os.walk(project_root) for file in files if file.endswith(suffixes)]
+    file_token_counts = estimate_files_tokens(file_paths, encoding_name, max_workers)
 
     return {
-        "total_tokens": total_tokens,
+        "total_tokens": sum(file_token_counts.values()),
         "file_token_counts": file_token_counts
     }
 
@@ -14,7 +14,6 @@ import logging
 from projectfiles import ProjectFiles
 from functions import save_response_to_markdown
 from config_utils import load_config_to_env
-load_config_to_env()
 
 from llm_client import LLMQueryManager, langfuse_context, observe
 from conversation_reviewer import ConversationReviewer
@@ -147,7 +146,8 @@ def trace_api_request(pf: Optional[ProjectFiles], api_request, last_response="",
                 iteration_number=str(i),
                 new_information=new_information,
                 key_findings=key_findings,
-                reviewer=reviewer
+                reviewer=reviewer,
+                stop_after_next_steps=True
             )
             if should_conclude:
                 logger.info("The conversation is about to end")
@@ -173,6 +173,8 @@ if __name__ == "__main__":
     parser.add_argument("--api-request", type=str, required=True, help="The API request to trace, e.g., 'GET /api/v1/city/{cityName}'")
     parser.add_argument("--max-rounds", type=int, default=8, required=False, help="Maximum rounds of conversation with LLM before stopping")
     args = parser.parse_args()
+    # the configuration is loaded by the commands, importing the modules has no side effect
+    load_config_to_env()
 
     root_path = os.path.abspath(args.project_root)
     if not os.path.exists(root_path):
@@ -180,7 +182,7 @@ if __name__ == "__main__":
         sys.exit(1)
     
     pf = ProjectFiles(repo_root_path=root_path)
-    pf.from_gist_files()
+    pf.from_gist_files(lazy=True)
 
     api_request = args.api_request
     if not api_request: